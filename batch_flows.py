@@ -0,0 +1,139 @@
+"""
+Двухфазный пакетный прогон сценариев create → confirm для синхронных тестов.
+
+Фаза 1 — все MAKE_* запросы конкурентно (не больше concurrency в полете).
+Фаза 2 — все CONFIRM_TRANSFER конкурентно через confirm_when_ready с общим дедлайном,
+отсчитанным от конца фазы 1. Ожидание готовности операций перекрывается между кейсами,
+поэтому N кейсов ждут один раз, а не N раз.
+
+Запросы идут через conftest.make_grpc_request: работают политика вызовов, общий канал,
+кассета и обновление session_key.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import data as app_data
+from conftest import make_grpc_request, create_metadata, confirm_when_ready
+
+
+@dataclass
+class FlowResult:
+    """Результат одного сценария create → confirm"""
+    operation_id: str
+    create_response: Any = None
+    confirm_response: Any = None
+    error: Optional[BaseException] = None
+    create_seconds: float = 0.0
+    confirm_seconds: float = 0.0
+    name: Optional[str] = None  # Имя кейса (для пакетных прогонов)
+
+    @property
+    def success(self) -> bool:
+        return (
+            self.error is None
+            and self.create_response is not None and self.create_response.success
+            and self.confirm_response is not None and self.confirm_response.success
+        )
+
+
+def _resolve_metadata(metadata):
+    if metadata is None:
+        return create_metadata()
+    if callable(metadata):
+        return metadata()
+    return metadata
+
+
+def _create(case: dict, result: FlowResult) -> FlowResult:
+    result.error = None
+    try:
+        started = time.perf_counter()
+        result.create_response = make_grpc_request(case["code"], case["data"], _resolve_metadata(case.get("metadata")))
+        result.create_seconds = time.perf_counter() - started
+    except Exception as e:
+        result.error = e
+    return result
+
+
+def _confirm(case: dict, result: FlowResult, deadline: float) -> FlowResult:
+    try:
+        started = time.perf_counter()
+        result.confirm_response = confirm_when_ready(
+            result.operation_id,
+            case.get("metadata"),
+            otp=case.get("otp", app_data.OTP_CODE),
+            timeout=max(0.0, deadline - time.monotonic()),
+        )
+        result.confirm_seconds = time.perf_counter() - started
+    except Exception as e:
+        result.error = e
+    return result
+
+
+def selected_params(request, name: str = "test_data") -> list:
+    """
+    Значения параметра name у тестов модуля request, выбранных в этой сессии
+    (с учетом -k, -m и ID в командной строке): пакет строится только из них
+    """
+    selected = []
+    for item in request.session.items:
+        callspec = getattr(item, "callspec", None)
+        if item.module is request.module and callspec is not None and name in callspec.params:
+            selected.append(callspec.params[name])
+    return selected
+
+
+def create_all(cases: List[dict], concurrency: int = app_data.BATCH_CONCURRENCY,
+               results: Optional[List[FlowResult]] = None) -> List[FlowResult]:
+    """
+    Фаза 1: конкурентно создает операции всех кейсов
+
+    Args:
+        cases: Список словарей {"code", "data" (с operationId), "metadata" (опц.), "otp" (опц.), "name" (опц.)}
+        concurrency: Максимум одновременно выполняемых запросов
+        results: Результаты предыдущей попытки для тех же кейсов (повтор создания, например
+                 с новым session_key); по умолчанию создаются новые
+
+    Returns:
+        List[FlowResult] в порядке cases
+    """
+    if results is None:
+        results = [FlowResult(operation_id=case["data"]["operationId"], name=case.get("name")) for case in cases]
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(cases)))) as executor:
+        return list(executor.map(_create, cases, results))
+
+
+def confirm_all(cases: List[dict], results: List[FlowResult], concurrency: int = app_data.BATCH_CONCURRENCY,
+                timeout: float = app_data.CONFIRM_READY_TIMEOUT) -> List[FlowResult]:
+    """
+    Фаза 2: конкурентно подтверждает все успешно созданные операции
+
+    Args:
+        cases: Те же кейсы, что были переданы в create_all
+        results: Результаты create_all
+        concurrency: Максимум одновременно выполняемых подтверждений
+        timeout: Общий на весь пакет предел ожидания готовности (сек)
+
+    Returns:
+        List[FlowResult] в порядке cases
+    """
+    deadline = time.monotonic() + timeout
+    pending = [
+        (case, result) for case, result in zip(cases, results)
+        if result.error is None and result.create_response is not None and result.create_response.success
+    ]
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending)))) as executor:
+            list(executor.map(lambda item: _confirm(item[0], item[1], deadline), pending))
+    return results
+
+
+# Экспорт для использования в других файлах
+__all__ = [
+    'FlowResult',
+    'selected_params',
+    'create_all',
+    'confirm_all',
+]
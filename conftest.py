@@ -1,9 +1,13 @@
 import sys
 import os
 import uuid
-import grpc
 import json
+import time
 import pytest
+from datetime import datetime
+
+# Раскладка тестов по дорожкам по общим счетам (опция --lanes)
+pytest_plugins = ["lane_scheduler"]
 
 # ===== НАСТРОЙКА PROTOBUF =====
 # Путь к директории с protobuf файлами
@@ -18,39 +22,191 @@ import protofile_pb2_grpc as webTransferApi_pb2_grpc
 # Импорт данных для использования в фикстурах (модульно, чтобы обновлять SESSION_KEY динамически)
 import data as app_data
 from database_collector import DatabaseConfig, DataCollector
+from grpc_channels import ChannelRegistry, CREDENTIALS_INSECURE
+from grpc_metrics import LatencyRecorder, LatencyInterceptor
+from grpc_policy import CallPolicy, RetryBudget
+from grpc_cassette import Cassette, MODES as CASSETTE_MODES, MODE_OFF as CASSETTE_MODE_OFF
+from session_keys import SessionKeyProvider, RankedSessionKeyCache
+from session_leases import SessionLeaseManager
+from fake_server import FakeServer, FakeServerConfig
+
+# Клиентские задержки каждого gRPC вызова по (service, code, status)
+LATENCY_RECORDER = LatencyRecorder()
+
+# Общий реестр каналов: один TCP + TLS handshake на всю сессию вместо одного на запрос
+CHANNEL_REGISTRY = ChannelRegistry(interceptors=[LatencyInterceptor(LATENCY_RECORDER)])
+
+# Дедлайны, повторы и хеджирование для всех вызовов через helper-функции
+CALL_POLICY = CallPolicy(
+    default_timeout=app_data.GRPC_DEFAULT_TIMEOUT,
+    timeouts_by_code=app_data.GRPC_TIMEOUTS_BY_CODE,
+    idempotent_codes=app_data.GRPC_IDEMPOTENT_CODES,
+    max_attempts=app_data.GRPC_RETRY_MAX_ATTEMPTS,
+    backoff_initial=app_data.GRPC_RETRY_BACKOFF_INITIAL,
+    backoff_max=app_data.GRPC_RETRY_BACKOFF_MAX,
+    retry_budget=RetryBudget(app_data.GRPC_RETRY_BUDGET),
+    hedged_codes=app_data.GRPC_HEDGED_CODES,
+    hedge_delay=app_data.GRPC_HEDGE_DELAY,
+)
+
+# Кассета для записи/воспроизведения ответов (включается опцией --grpc-cassette)
+CASSETTE = Cassette()
+
+# Локальный fake-сервер вместо стенда (включается опцией --fake-server)
+FAKE_SERVER = None
+
+# Под pytest-xdist каждый воркер арендует собственный session_key
+SESSION_LEASES = (
+    SessionLeaseManager(app_data.SESSION_LEASE_DIR, app_data.SESSION_LEASE_TTL)
+    if os.environ.get("PYTEST_XDIST_WORKER") else None
+)
+
+# Провайдер session_key: поиск в БД один раз за TTL, повторно — только после INVALID_SESSION_KEY
+SESSION_KEY_PROVIDER = SessionKeyProvider(
+    collector_factory=lambda: DataCollector(DatabaseConfig()),
+    user_ids=app_data.SESSION_KEY_USER_IDS,
+    max_offset=app_data.SESSION_KEY_MAX_OFFSET,
+    ttl=app_data.SESSION_KEY_TTL,
+    lease_manager=SESSION_LEASES,
+)
+
+# Ранжированные session_key конкретных пользователей (для тестов с собственным user_id)
+RANKED_SESSION_KEYS = RankedSessionKeyCache(
+    collector_factory=lambda: DataCollector(DatabaseConfig()),
+    limit_per_user=app_data.SESSION_KEY_RANKED_LIMIT,
+)
+
+
+# ===== PYTEST ХУКИ =====
+
+def pytest_addoption(parser):
+    """Опции записи/воспроизведения gRPC ответов"""
+    group = parser.getgroup("grpc-cassette")
+    group.addoption(
+        "--grpc-cassette", choices=CASSETTE_MODES, default=CASSETTE_MODE_OFF,
+        help="record — записывать ответы в кассету, replay — отвечать из кассеты без сети"
+    )
+    group.addoption(
+        "--grpc-cassette-path", default=os.path.join(os.path.dirname(__file__), 'cassettes', 'grpc_cassette.jsonl.gz'),
+        help="Файл кассеты (.gz — со сжатием)"
+    )
+    group = parser.getgroup("fake-server")
+    group.addoption(
+        "--fake-server", action="store_true", default=False,
+        help="Поднять локальный fake_server.py и направить в него все вызовы (без стенда и БД)"
+    )
+    group.addoption(
+        "--fake-server-config", default=None,
+        help="JSON с параметрами FakeServerConfig (задержки, доля ошибок)"
+    )
+    group = parser.getgroup("grpc-latency")
+    group.addoption(
+        "--grpc-latency-dir", default=None,
+        help="Каталог для grpc_latency_<время>.json (по умолчанию файл не пишется)"
+    )
+
+
+def pytest_configure(config):
+    global FAKE_SERVER
+    config.addinivalue_line("markers", "unit: офлайн unit-тест (tests/unit): без стенда, БД и session_key")
+    if config.getoption("--fake-server"):
+        config_path = config.getoption("--fake-server-config")
+        server_config = FakeServerConfig.from_file(config_path) if config_path else FakeServerConfig()
+        FAKE_SERVER = FakeServer(server_config).start()
+        app_data.GRPC_SERVER_URL = FAKE_SERVER.address
+        app_data.GRPC_CREDENTIALS = CREDENTIALS_INSECURE
+    
+    mode = config.getoption("--grpc-cassette")
+    if mode != CASSETTE_MODE_OFF:
+        CASSETTE.configure(config.getoption("--grpc-cassette-path"), mode)
+    
+    if is_offline():
+        # Без стенда: session_key не ищется в БД, в метаданные идет текущий ключ из data.py
+        SESSION_KEY_PROVIDER.use_static_key(app_data.SESSION_KEY)
+        RANKED_SESSION_KEYS.use_static_key(app_data.SESSION_KEY)
+
+
+def pytest_unconfigure(config):
+    CASSETTE.close()
+    if FAKE_SERVER is not None:
+        FAKE_SERVER.stop()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Воркер xdist передает свои гистограммы задержек контроллеру"""
+    workeroutput = getattr(session.config, "workeroutput", None)
+    if workeroutput is not None:
+        workeroutput["grpc_latency"] = LATENCY_RECORDER.to_dict()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """Контроллер xdist сливает гистограммы завершившегося воркера в общую таблицу"""
+    raw = getattr(node, "workeroutput", {}).get("grpc_latency")
+    if raw:
+        LATENCY_RECORDER.merge_dict(raw)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """
+    В конце сессии выводит таблицу задержек gRPC вызовов; с --grpc-latency-dir сохраняет ее в JSON
+    
+    Под xdist таблицу выводит контроллер: в LATENCY_RECORDER уже слиты данные всех воркеров.
+    """
+    if getattr(config, "workeroutput", None) is not None or not len(LATENCY_RECORDER):
+        return
+    terminalreporter.section("gRPC latency (client-side)")
+    terminalreporter.write_line(LATENCY_RECORDER.format_table())
+    
+    output_dir = config.getoption("--grpc-latency-dir")
+    if not output_dir:
+        return
+    filename = os.path.join(output_dir, f"grpc_latency_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        LATENCY_RECORDER.dump_json(filename)
+        terminalreporter.write_line(f"\n✅ Задержки сохранены в файл: {filename}")
+    except Exception as e:
+        terminalreporter.write_line(f"\n❌ Ошибка сохранения задержек: {e}")
 
 
 # ===== PYTEST ФИКСТУРЫ =====
 
+@pytest.fixture(autouse=True, scope="session")
+def _grpc_channel_registry():
+    """Авто-фикстура: держит общие gRPC каналы открытыми всю сессию и закрывает их в конце"""
+    yield CHANNEL_REGISTRY
+    print(f"\n[grpc_channels] Закрытие каналов: {len(CHANNEL_REGISTRY)}")
+    CHANNEL_REGISTRY.close_all()
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _database_pools():
+    """Авто-фикстура: закрывает общие пулы соединений DataCollector в конце сессии"""
+    yield
+    DataCollector.close_all_pools()
+
+
+@pytest.fixture(scope="session")
+def session_key_provider():
+    """Авто-фикстура: провайдер session_key, общий для всей сессии; в конце снимает аренды ключей"""
+    yield SESSION_KEY_PROVIDER
+    SESSION_KEY_PROVIDER.release()
+
+
 @pytest.fixture(autouse=True, scope="function")
-def _load_session_key_before_test():
-    """Авто-фикстура: перед каждым тестом загружает валидный session_key из БД в app_data.SESSION_KEY.
-    Пробует несколько offset и user_id, если не находит для user_id=134.
-    При ошибке оставляет текущее значение app_data.SESSION_KEY без изменений.
+def _load_session_key_before_test(request, session_key_provider):
+    """Авто-фикстура: перед каждым тестом кладет валидный session_key в app_data.SESSION_KEY.
+    Ключ берется из кеша провайдера; в БД провайдер ходит только при пустом или просроченном кеше.
+    При ошибке оставляет текущее значение app_data.SESSION_KEY без изменений. Unit-тестам ключ не нужен.
     """
+    if request.node.get_closest_marker("unit") is not None:
+        return
     try:
-        config = DatabaseConfig()
-        collector = DataCollector(config)
-        
-        # Список user_id для попыток (можно расширить)
-        user_ids_to_try = [134, 1, 2, 3]
-        max_offset = 5  # Максимальное количество offset для каждого user_id
-        
-        session_key = None
-        
-        # Пробуем найти валидный session_key
-        for user_id in user_ids_to_try:
-            for offset in range(max_offset):
-                session_key = collector.get_valid_session_key(user_id=user_id, offset=offset)
-                if session_key:
-                    app_data.SESSION_KEY = session_key
-                    print(f"[session_key_loader] ✅ Обновлен session_key для user_id={user_id}, offset={offset}: {session_key[:10]}...")
-                    return  # Успешно нашли ключ, выходим
-            # Если для этого user_id не нашли, пробуем следующий
-        
-        # Если не нашли ни одного ключа
-        if not session_key:
-            print(f"[session_key_loader] ⚠️  Не найден валидный session_key для user_ids={user_ids_to_try} с offset до {max_offset}")
+        session_key = session_key_provider.get()
+        if session_key:
+            app_data.SESSION_KEY = session_key
+        else:
             print(f"[session_key_loader] Используется текущий session_key: {app_data.SESSION_KEY[:10] if app_data.SESSION_KEY else 'None'}...")
             
     except Exception as e:
@@ -58,6 +214,7 @@ def _load_session_key_before_test():
         print(f"[session_key_loader] ❌ Ошибка при загрузке session_key: {e}")
         print(f"[session_key_loader] Используется текущий session_key: {app_data.SESSION_KEY[:10] if app_data.SESSION_KEY else 'None'}...")
 
+
 @pytest.fixture
 def grpc_metadata():
     """Фикстура для генерации метаданных запроса"""
@@ -75,47 +232,60 @@ def grpc_metadata():
 def grpc_client():
     """Фикстура для создания gRPC клиента"""
     def _get_client():
-        channel = grpc.secure_channel(
-            app_data.GRPC_SERVER_URL,
-            grpc.ssl_channel_credentials(),
-            options=app_data.GRPC_OPTIONS
-        )
-        return webTransferApi_pb2_grpc.WebTransferApiStub(channel), channel
+        channel = CHANNEL_REGISTRY.get_channel(app_data.GRPC_SERVER_URL, app_data.GRPC_OPTIONS, app_data.GRPC_CREDENTIALS)
+        return get_web_api_stub(webTransferApi_pb2_grpc.WebTransferApiStub), channel
     return _get_client
 
 
 # ===== HELPER ФУНКЦИИ =====
 
-def make_grpc_request(code: str, data: dict, metadata: tuple):
+def get_web_api_stub(stub_cls):
     """
-    Общая функция для выполнения gRPC запроса через WebTransferApi
+    Возвращает закешированный стаб Web*Api поверх общего канала сессии
     
     Args:
-        code: Код операции
-        data: Данные запроса (dict)
-        metadata: Метаданные запроса (tuple)
+        stub_cls: Класс стаба (WebTransferApiStub, WebAccountApiStub, WebPaymentApiStub, ...)
     
     Returns:
-        Response от сервера
+        Экземпляр stub_cls
     """
-    request = webTransferApi_pb2.IncomingWebTransfer(
-        code=code,
-        data=json.dumps(data)
-    )
+    return CHANNEL_REGISTRY.get_stub(stub_cls, app_data.GRPC_SERVER_URL, app_data.GRPC_OPTIONS, app_data.GRPC_CREDENTIALS)
+
+
+def is_offline() -> bool:
+    """True, если сессия идет без стенда и БД (replay кассеты или --fake-server)"""
+    return CASSETTE.replaying or (FAKE_SERVER is not None and FAKE_SERVER.running)
+
+
+def _invoke_with_session_refresh(invoke, metadata: tuple):
+    """
+    Выполняет вызов и при INVALID_SESSION_KEY для общего session_key один раз повторяет его
+    с ключом, заново найденным провайдером. Ключи, переданные тестом явно, не подменяются.
+    """
+    response = invoke(metadata)
+    if error_code(response) != app_data.ERROR_INVALID_SESSION_KEY:
+        return response
     
-    with grpc.secure_channel(
-            app_data.GRPC_SERVER_URL,
-            grpc.ssl_channel_credentials(),
-            options=app_data.GRPC_OPTIONS
-    ) as channel:
-        client = webTransferApi_pb2_grpc.WebTransferApiStub(channel)
-        response = client.makeWebTransfer(request, metadata=metadata)
+    rejected_key = dict(metadata).get('sessionkey')
+    if not rejected_key or rejected_key != app_data.SESSION_KEY:
         return response
+    
+    SESSION_KEY_PROVIDER.invalidate(rejected_key)
+    session_key = SESSION_KEY_PROVIDER.get()
+    if not session_key or session_key == rejected_key:
+        return response
+    
+    print(f"[session_key_loader] INVALID_SESSION_KEY, повтор с новым session_key: {session_key[:10]}...")
+    app_data.SESSION_KEY = session_key
+    refreshed_metadata = tuple(
+        (key, session_key if key == 'sessionkey' else value) for key, value in metadata
+    )
+    return invoke(refreshed_metadata)
 
 
-def make_web_account_request(code: str, data: dict, metadata: tuple):
+def make_grpc_request(code: str, data: dict, metadata: tuple):
     """
-    Общая функция для выполнения gRPC запроса через WebAccountApi
+    Общая функция для выполнения gRPC запроса через WebTransferApi
     
     Args:
         code: Код операции
@@ -125,19 +295,22 @@ def make_web_account_request(code: str, data: dict, metadata: tuple):
     Returns:
         Response от сервера
     """
-    request = webTransferApi_pb2.WebAccountsRequest(
+    request = webTransferApi_pb2.IncomingWebTransfer(
         code=code,
         data=json.dumps(data)
     )
     
-    with grpc.secure_channel(
-            app_data.GRPC_SERVER_URL,
-            grpc.ssl_channel_credentials(),
-            options=app_data.GRPC_OPTIONS
-    ) as channel:
-        client = webTransferApi_pb2_grpc.WebAccountApiStub(channel)
-        response = client.makeWebAccount(request, metadata=metadata)
-        return response
+    if CASSETTE.replaying:
+        return CASSETTE.replay('WebTransferApi', code, data, webTransferApi_pb2.OutgoingWebTransfer)
+    
+    client = get_web_api_stub(webTransferApi_pb2_grpc.WebTransferApiStub)
+    response = _invoke_with_session_refresh(
+        lambda request_metadata: CALL_POLICY.invoke(client.makeWebTransfer, request, request_metadata),
+        metadata
+    )
+    if CASSETTE.recording:
+        CASSETTE.record('WebTransferApi', code, data, response)
+    return response
 
 
 def make_web_account_request(code: str, data: dict, metadata: tuple):
@@ -157,14 +330,17 @@ def make_web_account_request(code: str, data: dict, metadata: tuple):
         data=json.dumps(data)
     )
     
-    with grpc.secure_channel(
-            app_data.GRPC_SERVER_URL,
-            grpc.ssl_channel_credentials(),
-            options=app_data.GRPC_OPTIONS
-    ) as channel:
-        client = webTransferApi_pb2_grpc.WebAccountApiStub(channel)
-        response = client.makeWebAccount(request, metadata=metadata)
-        return response
+    if CASSETTE.replaying:
+        return CASSETTE.replay('WebAccountApi', code, data, webTransferApi_pb2.WebAccountsResponse)
+    
+    client = get_web_api_stub(webTransferApi_pb2_grpc.WebAccountApiStub)
+    response = _invoke_with_session_refresh(
+        lambda request_metadata: CALL_POLICY.invoke(client.makeWebAccount, request, request_metadata),
+        metadata
+    )
+    if CASSETTE.recording:
+        CASSETTE.record('WebAccountApi', code, data, response)
+    return response
 
 
 def create_metadata():
@@ -198,6 +374,89 @@ def confirm_operation(operation_id: str, otp: str = app_data.OTP_CODE):
     return make_grpc_request(app_data.CODE_CONFIRM_TRANSFER, confirm_data, metadata)
 
 
+def error_code(response):
+    """Возвращает код ошибки из ответа сервера или None"""
+    if response is None or response.success:
+        return None
+    error = getattr(response, 'error', None)
+    return getattr(error, 'code', None) or None
+
+
+def confirm_not_ready(operation_id: str, response) -> bool:
+    """
+    Проверяет, отклонен ли CONFIRM_TRANSFER потому, что операция еще не готова
+    
+    Коды из CONFIRM_NOT_READY_ERROR_CODES считаются "не готова" сразу. Для кодов из
+    CONFIRM_READY_CHECK_DB_ERROR_CODES операция не готова, пока в transactions нет ее строки;
+    без стенда (is_offline) и при недоступной БД такая ошибка считается окончательной.
+    Остальные коды окончательные.
+    """
+    code = error_code(response)
+    if code is None:
+        return False
+    if code in app_data.CONFIRM_NOT_READY_ERROR_CODES:
+        return True
+    if code not in app_data.CONFIRM_READY_CHECK_DB_ERROR_CODES or is_offline():
+        return False
+    try:
+        registered = DataCollector(DatabaseConfig()).get_registered_operation_ids([operation_id])
+    except Exception as e:
+        print(f"[confirm_when_ready] ⚠️  Не удалось проверить операцию {operation_id} в БД: {' '.join(str(e).split())}")
+        return False
+    return operation_id not in registered
+
+
+def confirm_when_ready(operation_id: str, metadata=None, otp: str = app_data.OTP_CODE,
+                       timeout: float = app_data.CONFIRM_READY_TIMEOUT):
+    """
+    Подтверждает операцию, как только бэкенд готов ее принять
+    
+    Вместо фиксированного time.sleep между созданием и CONFIRM_TRANSFER сразу
+    отправляет подтверждение и повторяет его с растущей паузой, пока операция не готова
+    (см. confirm_not_ready). Общее ожидание ограничено timeout.
+    
+    Args:
+        operation_id: ID операции для подтверждения
+        metadata: Метаданные (tuple) или функция, возвращающая метаданные;
+                  по умолчанию create_metadata() на каждую попытку
+        otp: OTP код (по умолчанию из data.py)
+        timeout: Жесткий верхний предел ожидания в секундах
+    
+    Returns:
+        Последний Response от сервера
+    """
+    confirm_data = {
+        "operationId": operation_id,
+        "otp": otp
+    }
+    deadline = time.monotonic() + timeout
+    delay = app_data.CONFIRM_READY_INITIAL_DELAY
+    attempt = 0
+    
+    while True:
+        attempt += 1
+        if metadata is None:
+            request_metadata = create_metadata()
+        elif callable(metadata):
+            request_metadata = metadata()
+        else:
+            request_metadata = metadata
+        
+        response = make_grpc_request(app_data.CODE_CONFIRM_TRANSFER, confirm_data, request_metadata)
+        if not confirm_not_ready(operation_id, response):
+            if attempt > 1:
+                print(f"[confirm_when_ready] Операция {operation_id} подтверждена с попытки {attempt}")
+            return response
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"[confirm_when_ready] ⚠️  Операция {operation_id} не готова за {timeout} сек ({error_code(response)})")
+            return response
+        if not CASSETTE.replaying:
+            time.sleep(min(delay, remaining))
+        delay = min(delay * 2, app_data.CONFIRM_READY_MAX_DELAY)
+
+
 def assert_success(response, error_message: str = "Запрос завершился с ошибкой"):
     """
     Проверка успешности ответа от сервера
@@ -214,10 +473,19 @@ def assert_success(response, error_message: str = "Запрос завершил
 __all__ = [
     'webTransferApi_pb2', 
     'webTransferApi_pb2_grpc',
+    'get_web_api_stub',
+    'CASSETTE',
+    'is_offline',
+    'CALL_POLICY',
+    'LATENCY_RECORDER',
+    'RANKED_SESSION_KEYS',
     'make_grpc_request',
     'make_web_account_request',
     'create_metadata',
     'confirm_operation',
+    'confirm_when_ready',
+    'confirm_not_ready',
+    'error_code',
     'assert_success'
 ]
 
@@ -4,6 +4,7 @@ GRPC_OPTIONS = [
     ('grpc.enable_http_proxy', 0),
     ('grpc.keepalive_timeout_ms', 10000)
 ]
+GRPC_CREDENTIALS = 'ssl'  # 'ssl' — стенд, 'insecure' — локальный сервер без TLS (fake_server.py)
 
 # ===== НАСТРОЙКИ ПОДКЛЮЧЕНИЯ ДЛЯ IPC СЕРВИСА =====
 IPC_GRPC_SERVER_URL = 'localhost:1111'  
@@ -39,6 +40,37 @@ CODE_MAKE_DEPOSIT = "MAKE_DEPOSIT"
 CODE_DIGITAL_LOAN_APPLY = "DIGITAL_LOAN_APPLY"
 CODE_DIGITAL_LOAN_CHECK_SERVICE = "DIGITAL_LOAN_CHECK_SERVICE"
 
+# ===== ДЕДЛАЙНЫ, ПОВТОРЫ И ХЕДЖИРОВАНИЕ gRPC ВЫЗОВОВ =====
+GRPC_DEFAULT_TIMEOUT = 30.0  # Дедлайн вызова по умолчанию (сек)
+GRPC_TIMEOUTS_BY_CODE = {
+    CODE_DIGITAL_LOAN_APPLY: 60.0,
+    CODE_DIGITAL_LOAN_CHECK_SERVICE: 10.0,
+}
+GRPC_IDEMPOTENT_CODES = {CODE_DIGITAL_LOAN_CHECK_SERVICE}  # Коды, которые безопасно повторять
+GRPC_RETRY_MAX_ATTEMPTS = 3  # Попыток для идемпотентного кода при UNAVAILABLE/DEADLINE_EXCEEDED
+GRPC_RETRY_BACKOFF_INITIAL = 0.2  # Первая пауза перед повтором (сек)
+GRPC_RETRY_BACKOFF_MAX = 2.0  # Максимальная пауза перед повтором (сек)
+GRPC_RETRY_BUDGET = 20  # Общий лимит повторов и хедж-запросов на прогон
+GRPC_HEDGED_CODES = set()  # Read-коды с хеджированием, например {CODE_DIGITAL_LOAN_CHECK_SERVICE}
+GRPC_HEDGE_DELAY = 1.0  # Через сколько секунд без ответа отправлять хедж-запрос
+
+# ===== ОЖИДАНИЕ ГОТОВНОСТИ ОПЕРАЦИИ К ПОДТВЕРЖДЕНИЮ =====
+CONFIRM_READY_TIMEOUT = 15.0  # Жесткий верхний предел ожидания перед CONFIRM_TRANSFER (сек)
+CONFIRM_READY_INITIAL_DELAY = 0.2  # Первая пауза между попытками подтверждения (сек)
+CONFIRM_READY_MAX_DELAY = 2.0  # Максимальная пауза между попытками (сек)
+# Коды "операция еще не готова", при которых подтверждение повторяется без обращения к БД
+CONFIRM_NOT_READY_ERROR_CODES = (
+    "OPERATION_NOT_FOUND",
+    "OPERATION_NOT_READY",
+    "OPERATION_IN_PROGRESS",
+)
+# Неоднозначные коды: подтверждение повторяется, пока в transactions нет строки операции.
+# Остальные коды (неверный OTP, нехватка средств и т.п.) окончательные — без обращения к БД
+CONFIRM_READY_CHECK_DB_ERROR_CODES = (
+    "INTERNAL_ERROR",
+)
+BATCH_CONCURRENCY = 10  # Сколько create/confirm запросов пакетного прогона держать в полете
+
 # ===== НАСТРОЙКИ УСТРОЙСТВА =====
 DEVICE_TYPE = 'ios'
 USER_AGENT = '12; iPhone12MaxProDan'
@@ -46,6 +78,13 @@ USER_AGENT = '12; iPhone12MaxProDan'
 # ===== ДАННЫЕ СЕССИИ =====
 SESSION_KEY = '7C17ZJOKrOlYPvkoeQ835L'  # TODO: Заполнить session key для gRPC переводов
 ADMIN_SESSION_KEY = '3hOHJw2PlhKYtOeM1QsrLR'  # Session key для Admin API
+SESSION_KEY_USER_IDS = [134, 1, 2, 3]  # user_id для поиска session_key в БД (в порядке приоритета)
+SESSION_KEY_MAX_OFFSET = 5  # Сколько последних ключей проверять для каждого user_id
+SESSION_KEY_TTL = 600  # Время жизни найденного session_key в кеше (сек)
+SESSION_KEY_RANKED_LIMIT = 10  # Сколько последних ключей на user_id держать в ранжированном кеше
+ERROR_INVALID_SESSION_KEY = "INVALID_SESSION_KEY"
+SESSION_LEASE_DIR = None  # Каталог аренд session_key для воркеров xdist (None — во временном каталоге ОС)
+SESSION_LEASE_TTL = 1800  # Через сколько секунд без продления аренда считается брошенной (> SESSION_KEY_TTL)
 
 # ===== OTP КОД =====
 OTP_CODE = "111111"  # TODO: Заполнить OTP код
@@ -1,7 +1,11 @@
 import json
+import time
+import threading
 import psycopg2
+from psycopg2 import pool as pg_pool
 from psycopg2.extras import RealDictCursor
 from typing import Dict, Any, List
+from contextlib import contextmanager
 from dataclasses import dataclass
 
 @dataclass
@@ -11,12 +15,129 @@ class DatabaseConfig:
     host: str = "localhost"
     port: str = "5434"
     database: str = "ibank"
+    min_connections: int = 1  # Минимум соединений в пуле
+    max_connections: int = 10  # Максимум одновременно выданных соединений
+    health_check_idle_seconds: float = 30.0  # Простой, после которого соединение проверяется SELECT 1
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений с блокирующей выдачей и проверкой соединения при выдаче"""
+
+    def __init__(self, config: DatabaseConfig):
+        self.config = config
+        self._pool = pg_pool.ThreadedConnectionPool(
+            config.min_connections,
+            config.max_connections,
+            user=config.user,
+            password=config.password,
+            host=config.host,
+            port=config.port,
+            database=config.database
+        )
+        # ThreadedConnectionPool бросает PoolError при исчерпании, семафор заставляет ждать
+        self._slots = threading.BoundedSemaphore(config.max_connections)
+        self._last_used: Dict[int, float] = {}
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.config.health_check_idle_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        self._slots.acquire()
+        try:
+            for _ in range(self.config.max_connections + 1):
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError("Не удалось получить рабочее соединение из пула")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            broken = bool(conn.closed)
+            if broken:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._last_used.clear()
+        self._pool.closeall()
+
 
 class DataCollector:
+    # Пулы общие для всех экземпляров с одинаковым DatabaseConfig (фикстуры, тесты, jobs)
+    _pools: Dict[tuple, ConnectionPool] = {}
+    _pools_lock = threading.Lock()
+
     def __init__(self, config: DatabaseConfig):
         self.config = config
 
+    def _pool_key(self) -> tuple:
+        return (self.config.user, self.config.password, self.config.host,
+                self.config.port, self.config.database)
+
+    def get_pool(self) -> ConnectionPool:
+        """Возвращает общий пул для этого DatabaseConfig, создавая его при первом обращении"""
+        key = self._pool_key()
+        with DataCollector._pools_lock:
+            connection_pool = DataCollector._pools.get(key)
+            if connection_pool is None:
+                connection_pool = ConnectionPool(self.config)
+                DataCollector._pools[key] = connection_pool
+            return connection_pool
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдает соединение из пула: commit при успехе, rollback при ошибке, затем возврат в пул
+        
+        Пример:
+            with collector.connection() as conn:
+                with conn.cursor() as cur:
+                    ...
+        """
+        connection_pool = self.get_pool()
+        conn = connection_pool.getconn()
+        try:
+            with conn:
+                yield conn
+        finally:
+            connection_pool.putconn(conn)
+
+    @classmethod
+    def close_all_pools(cls):
+        """Закрывает все пулы соединений (вызывается в конце сессии)"""
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for connection_pool in pools:
+            try:
+                connection_pool.close()
+            except Exception as e:
+                print(f"Ошибка при закрытии пула соединений: {str(e)}")
+
     def connect(self) -> psycopg2.extensions.connection:
+        """Отдельное соединение вне пула (закрывается вызывающим кодом)"""
         return psycopg2.connect(
             user=self.config.user,
             password=self.config.password,
@@ -37,7 +158,7 @@ class DataCollector:
             str: JSON строка с данными сессии
         """
         try:
-            with self.connect() as conn:
+            with self.connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute("""
                         SELECT session_key, session_id
@@ -69,7 +190,7 @@ class DataCollector:
             str: Сессионный ключ или None если не найден
         """
         try:
-            with self.connect() as conn:
+            with self.connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute("""
                         SELECT session_key
@@ -88,6 +209,87 @@ class DataCollector:
             print(f"Ошибка при получении сессионного ключа: {str(e)}")
             return None
 
+    def get_valid_session_keys(self, user_ids: List[int], limit_per_user: int = 5) -> List[Dict[str, Any]]:
+        """
+        Получает N последних валидных сессионных ключей для нескольких пользователей одним запросом
+        
+        Args:
+            user_ids: Список ID пользователей (порядок задает приоритет в результате)
+            limit_per_user: Сколько последних ключей вернуть для каждого пользователя
+            
+        Returns:
+            List[Dict]: Строки {user_id, session_key, offset}, отсортированные по порядку user_ids
+                        и по свежести ключа (offset=0 — самый новый); пустой список при ошибке
+        """
+        if not user_ids:
+            return []
+        try:
+            with self.connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("""
+                        SELECT user_id, session_key, rn - 1 AS "offset"
+                        FROM (
+                            SELECT user_id, session_key,
+                                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC) AS rn
+                            FROM sessions
+                            WHERE user_id = ANY(%s) AND is_valid = true
+                        ) ranked
+                        WHERE rn <= %s
+                        ORDER BY user_id, rn
+                    """, (list(user_ids), limit_per_user))
+                    rows = [dict(row) for row in cur.fetchall()]
+        except Exception as e:
+            print(f"Ошибка при получении сессионных ключей: {str(e)}")
+            return []
+        
+        priority = {user_id: index for index, user_id in enumerate(user_ids)}
+        rows.sort(key=lambda row: (priority.get(row['user_id'], len(priority)), row['offset']))
+        return rows
+
+    def get_processing_ids_by_operation_ids(self, operation_ids: List[str]) -> Dict[str, str]:
+        """
+        Получает processing_id (pay_ref_1) для набора операций одним запросом
+        
+        Args:
+            operation_ids: Список operation_id
+            
+        Returns:
+            Dict[str, str]: operation_id -> processing_id только для найденных строк
+        """
+        if not operation_ids:
+            return {}
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                # IN %s с кортежем передает значения нетипизированными литералами,
+                # поэтому сравнение работает и для uuid, и для varchar колонки operation_id
+                cur.execute("""
+                    SELECT operation_id, pay_ref_1
+                    FROM transactions
+                    WHERE operation_id IN %s AND pay_ref_1 IS NOT NULL
+                """, (tuple(operation_ids),))
+                return {str(operation_id): processing_id for operation_id, processing_id in cur.fetchall()}
+
+    def get_registered_operation_ids(self, operation_ids: List[str]) -> set:
+        """
+        Возвращает operation_id, для которых уже есть строка в transactions
+        
+        Args:
+            operation_ids: Список operation_id
+            
+        Returns:
+            set: Найденные operation_id
+        """
+        if not operation_ids:
+            return set()
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT operation_id
+                    FROM transactions
+                    WHERE operation_id IN %s
+                """, (tuple(operation_ids),))
+                return {str(operation_id) for operation_id, in cur.fetchall()}
+
 # Пример использования:
 if __name__ == "__main__":
     config = DatabaseConfig()
@@ -0,0 +1,414 @@
+"""
+Локальный fake-сервер WebTransferApi / WebAccountApi / WebAuthApi для офлайн бенчмарков и профилирования.
+
+Построен на сервисерах из protofiles/protofile_pb2_grpc: принимает MAKE_* коды и
+CONFIRM_TRANSFER, хранит операции по operationId и добавляет к каждому ответу задержку
+из настраиваемого распределения и ошибки с заданной долей. WebAuthApi (authenticate +
+confirmSecondFactor) выдает новые session_key для пула сессий нагрузочного теста. Общий стенд не нужен:
+run_load_test.py и pytest (опция --fake-server) ходят в него без TLS.
+
+Запуск отдельным процессом (рекомендуется для нагрузки — генератор и сервер не делят GIL):
+    python fake_server.py --port 50051 --config fake_server.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent import futures
+from dataclasses import dataclass, field, fields
+from typing import Dict, Optional
+
+import grpc
+
+PROTOBUF_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'protofiles')
+if PROTOBUF_PATH not in sys.path:
+    sys.path.append(PROTOBUF_PATH)
+
+import protofile_pb2 as pb2
+import protofile_pb2_grpc as pb2_grpc
+
+
+CODE_CONFIRM_TRANSFER = "CONFIRM_TRANSFER"
+
+# ===== КОДЫ ОШИБОК FAKE-СЕРВЕРА =====
+ERROR_INVALID_SESSION_KEY = "INVALID_SESSION_KEY"
+ERROR_OPERATION_NOT_FOUND = "OPERATION_NOT_FOUND"
+ERROR_OPERATION_NOT_READY = "OPERATION_NOT_READY"
+ERROR_OPERATION_ALREADY_CONFIRMED = "OPERATION_ALREADY_CONFIRMED"
+ERROR_INVALID_OTP = "INVALID_OTP"
+ERROR_INVALID_REQUEST = "INVALID_REQUEST"
+ERROR_LOGIN_NOT_STARTED = "LOGIN_NOT_STARTED"
+
+# Ответы по умолчанию для кодов, на которые тесты проверяют конкретные поля
+DEFAULT_RESPONSES = {
+    "DIGITAL_LOAN_CHECK_SERVICE": {"isDigitalLoanServiceEnable": True, "isCreditLocked": False},
+    "DIGITAL_LOAN_APPLY": {"requestStatus": "NEW"},
+}
+
+
+# ===== РАСПРЕДЕЛЕНИЯ ЗАДЕРЖЕК =====
+
+class LatencyModel:
+    """
+    Распределение задержки ответа в миллисекундах
+
+    Поддерживаемые распределения (ключ "distribution" в конфиге):
+        fixed:       {"ms": 20}
+        uniform:     {"min_ms": 5, "max_ms": 50}
+        normal:      {"mean_ms": 20, "stddev_ms": 5}
+        lognormal:   {"median_ms": 20, "sigma": 0.5}  — длинный правый хвост, как у реального стенда
+        exponential: {"mean_ms": 20}
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, distribution: str = "fixed", **params):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Неизвестное распределение задержки: {distribution}, ожидается одно из {self.DISTRIBUTIONS}")
+        self.distribution = distribution
+        self.params = params
+
+    @classmethod
+    def from_config(cls, raw: Optional[dict]) -> "LatencyModel":
+        raw = dict(raw or {"distribution": "fixed", "ms": 0})
+        return cls(raw.pop("distribution", "fixed"), **raw)
+
+    def sample(self, rng: random.Random) -> float:
+        """Случайная задержка в мс (не меньше 0)"""
+        p = self.params
+        if self.distribution == "fixed":
+            value = p.get("ms", 0)
+        elif self.distribution == "uniform":
+            value = rng.uniform(p.get("min_ms", 0), p.get("max_ms", 0))
+        elif self.distribution == "normal":
+            value = rng.gauss(p.get("mean_ms", 0), p.get("stddev_ms", 0))
+        elif self.distribution == "lognormal":
+            median = p.get("median_ms", 0)
+            value = median * rng.lognormvariate(0, p.get("sigma", 0)) if median > 0 else 0
+        else:
+            mean = p.get("mean_ms", 0)
+            value = rng.expovariate(1 / mean) if mean > 0 else 0
+        return max(0.0, value)
+
+
+# ===== КОНФИГУРАЦИЯ =====
+
+@dataclass
+class FakeServerConfig:
+    latency: dict = field(default_factory=lambda: {"distribution": "fixed", "ms": 0})  # Задержка по умолчанию
+    latency_by_code: Dict[str, dict] = field(default_factory=dict)  # Задержки для отдельных кодов
+    error_rate: float = 0.0  # Доля ответов success=false с кодом error_code
+    error_rate_by_code: Dict[str, float] = field(default_factory=dict)
+    error_code: str = "INTERNAL_ERROR"
+    unavailable_rate: float = 0.0  # Доля вызовов, завершаемых статусом UNAVAILABLE
+    confirm_ready_after_ms: float = 0.0  # До этого момента CONFIRM_TRANSFER отвечает OPERATION_NOT_READY
+    otp: Optional[str] = None  # Ожидаемый OTP; None — принимается любой
+    session_keys: list = field(default_factory=list)  # Допустимые session_key; пусто — принимается любой
+    responses: Dict[str, dict] = field(default_factory=dict)  # Поля, добавляемые в data ответа по коду
+    max_operations: int = 100000  # Сколько операций хранить (старые вытесняются)
+    max_workers: int = 64  # Потоков сервера: ограничивает число одновременно «спящих» запросов
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, raw: Optional[dict]) -> "FakeServerConfig":
+        known = {f.name for f in fields(cls)}
+        unknown = set(raw or {}) - known
+        if unknown:
+            raise ValueError(f"Неизвестные параметры fake-сервера: {sorted(unknown)}")
+        return cls(**(raw or {}))
+
+    @classmethod
+    def from_file(cls, path: str) -> "FakeServerConfig":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+# ===== ХРАНИЛИЩЕ ОПЕРАЦИЙ =====
+
+class OperationStore:
+    """Операции по operationId: код, время создания и статус (created / confirmed)"""
+
+    def __init__(self, max_operations: int):
+        self.max_operations = max_operations
+        self._lock = threading.Lock()
+        self._operations = OrderedDict()
+
+    def create(self, operation_id: str, code: str, data: dict):
+        with self._lock:
+            self._operations[operation_id] = {
+                "code": code,
+                "data": data,
+                "created_at": time.monotonic(),
+                "status": "created",
+            }
+            self._operations.move_to_end(operation_id)
+            while len(self._operations) > self.max_operations:
+                self._operations.popitem(last=False)
+
+    def get(self, operation_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._operations.get(operation_id)
+
+    def confirm(self, operation_id: str) -> bool:
+        """Помечает операцию подтвержденной; False, если она уже подтверждена"""
+        with self._lock:
+            operation = self._operations[operation_id]
+            if operation["status"] == "confirmed":
+                return False
+            operation["status"] = "confirmed"
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._operations)
+
+
+# ===== ЛОГИКА ОТВЕТОВ =====
+
+class FakeBackend:
+    """Общая для всех сервисеров обработка (code, data, metadata) -> ответ"""
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.operations = OperationStore(config.max_operations)
+        self.default_latency = LatencyModel.from_config(config.latency)
+        self.latency_by_code = {
+            code: LatencyModel.from_config(raw) for code, raw in config.latency_by_code.items()
+        }
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self._pending_logins = set()  # Временные ключи authenticate, ожидающие confirmSecondFactor
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _sleep(self, code: str):
+        model = self.latency_by_code.get(code, self.default_latency)
+        with self._rng_lock:
+            latency_ms = model.sample(self._rng)
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+
+    def _count(self, key: str):
+        with self._counters_lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def handle(self, code: str, raw_data: str, metadata: dict, context, response_cls):
+        """Выполняет запрос и возвращает response_cls(success, data, error)"""
+        self._count(code or "-")
+        self._sleep(code)
+
+        if self.config.unavailable_rate and self._random() < self.config.unavailable_rate:
+            self._count("UNAVAILABLE")
+            context.abort(grpc.StatusCode.UNAVAILABLE, "fake-server: injected UNAVAILABLE")
+
+        if self.config.session_keys and metadata.get('sessionkey') not in self.config.session_keys:
+            return self._error(response_cls, ERROR_INVALID_SESSION_KEY, "Session key is invalid")
+
+        error_rate = self.config.error_rate_by_code.get(code, self.config.error_rate)
+        if error_rate and self._random() < error_rate:
+            return self._error(response_cls, self.config.error_code, "fake-server: injected error")
+
+        try:
+            data = json.loads(raw_data) if raw_data else {}
+        except ValueError:
+            return self._error(response_cls, ERROR_INVALID_REQUEST, "data is not valid JSON")
+
+        if code == CODE_CONFIRM_TRANSFER:
+            return self._confirm(data, response_cls)
+        if code.startswith("MAKE_"):
+            return self._create(code, data, response_cls)
+        body = dict(DEFAULT_RESPONSES.get(code, {}))
+        body.update(self.config.responses.get(code, {}))
+        return self._ok(response_cls, body)
+
+    def _create(self, code: str, data: dict, response_cls):
+        operation_id = data.get("operationId") or str(uuid.uuid4())
+        operation_data = data.get("data") if isinstance(data.get("data"), dict) else {}
+        self.operations.create(operation_id, code, operation_data)
+        body = {"operationId": operation_id, "needsOtp": True, "operationData": dict(operation_data)}
+        body.update(self.config.responses.get(code, {}))
+        return self._ok(response_cls, body)
+
+    def _confirm(self, data: dict, response_cls):
+        operation_id = data.get("operationId")
+        operation = self.operations.get(operation_id) if operation_id else None
+        if operation is None:
+            return self._error(response_cls, ERROR_OPERATION_NOT_FOUND, f"Operation {operation_id} not found")
+        age_ms = (time.monotonic() - operation["created_at"]) * 1000
+        if age_ms < self.config.confirm_ready_after_ms:
+            return self._error(response_cls, ERROR_OPERATION_NOT_READY, f"Operation {operation_id} is not ready")
+        if self.config.otp is not None and data.get("otp") != self.config.otp:
+            return self._error(response_cls, ERROR_INVALID_OTP, "OTP is invalid")
+        if not self.operations.confirm(operation_id):
+            return self._error(response_cls, ERROR_OPERATION_ALREADY_CONFIRMED, f"Operation {operation_id} already confirmed")
+        body = {"operationId": operation_id, "status": "SUCCESS"}
+        body.update(self.config.responses.get(CODE_CONFIRM_TRANSFER, {}))
+        return self._ok(response_cls, body)
+
+    def authenticate(self, username: str) -> str:
+        """Первый шаг логина: временный ключ для confirmSecondFactor"""
+        self._count("authenticate")
+        self._sleep("authenticate")
+        temp_key = f"login-{uuid.uuid4().hex[:16]}"
+        with self._counters_lock:
+            self._pending_logins.add(temp_key)
+        return temp_key
+
+    def confirm_second_factor(self, temp_key: str, otp: str):
+        """
+        Второй шаг логина: новый session_key (добавляется в session_keys, если список задан)
+
+        Returns:
+            (session_key, session_id) или (None, код ошибки)
+        """
+        self._count("confirmSecondFactor")
+        self._sleep("confirmSecondFactor")
+        with self._counters_lock:
+            if temp_key not in self._pending_logins:
+                return None, ERROR_LOGIN_NOT_STARTED
+            self._pending_logins.discard(temp_key)
+        if self.config.otp is not None and otp != self.config.otp:
+            return None, ERROR_INVALID_OTP
+        session_key = uuid.uuid4().hex[:22]
+        if self.config.session_keys:
+            self.config.session_keys.append(session_key)
+        return session_key, uuid.uuid4().hex[:22]
+
+    def _ok(self, response_cls, body: dict):
+        self._count("OK")
+        return response_cls(success=True, data=json.dumps(body, ensure_ascii=False))
+
+    def _error(self, response_cls, error_code: str, message: str):
+        self._count(error_code)
+        response = response_cls(success=False)
+        response.error.code = error_code
+        response.error.data = message
+        return response
+
+
+# ===== СЕРВИСЕРЫ =====
+
+class FakeWebTransferApi(pb2_grpc.WebTransferApiServicer):
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def makeWebTransfer(self, request, context):
+        metadata = dict(context.invocation_metadata())
+        return self.backend.handle(request.code, request.data, metadata, context, pb2.OutgoingWebTransfer)
+
+
+class FakeWebAccountApi(pb2_grpc.WebAccountApiServicer):
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def makeWebAccount(self, request, context):
+        metadata = dict(context.invocation_metadata())
+        return self.backend.handle(request.code, request.data, metadata, context, pb2.WebAccountsResponse)
+
+
+class FakeWebAuthApi(pb2_grpc.WebAuthApiServicer):
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+
+    def authenticate(self, request, context):
+        temp_key = self.backend.authenticate(request.username)
+        return pb2.LoginResponse(
+            success=True,
+            data=pb2.LoginResponseData(sessionKey=temp_key, sessionId=temp_key, state="OTP_REQUIRED"),
+        )
+
+    def confirmSecondFactor(self, request, context):
+        metadata = dict(context.invocation_metadata())
+        session_key, value = self.backend.confirm_second_factor(metadata.get('sessionkey'), request.otp)
+        if session_key is None:
+            response = pb2.ConfirmSecondFactorResponse(success=False)
+            response.error.code = value
+            return response
+        return pb2.ConfirmSecondFactorResponse(
+            success=True, data=pb2.ConfirmSecondFactorResponseData(sessionKey=session_key, sessionId=value)
+        )
+
+
+# ===== СЕРВЕР =====
+
+class FakeServer:
+    """gRPC сервер с FakeWebTransferApi, FakeWebAccountApi и FakeWebAuthApi (без TLS)"""
+
+    def __init__(self, config: Optional[FakeServerConfig] = None, host: str = "localhost", port: int = 0):
+        """
+        Args:
+            config: Настройки задержек/ошибок; по умолчанию — без задержек и ошибок
+            host: Интерфейс для прослушивания
+            port: Порт (0 — любой свободный, фактический порт в self.port после start())
+        """
+        self.config = config or FakeServerConfig()
+        self.host = host
+        self.port = port
+        self.backend = FakeBackend(self.config)
+        self._server = None
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def start(self) -> "FakeServer":
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=self.config.max_workers))
+        pb2_grpc.add_WebTransferApiServicer_to_server(FakeWebTransferApi(self.backend), server)
+        pb2_grpc.add_WebAccountApiServicer_to_server(FakeWebAccountApi(self.backend), server)
+        pb2_grpc.add_WebAuthApiServicer_to_server(FakeWebAuthApi(self.backend), server)
+        port = server.add_insecure_port(f"{self.host}:{self.port}")
+        if not port:
+            raise RuntimeError(f"fake-сервер не смог занять {self.address}")
+        self.port = port
+        server.start()
+        self._server = server
+        print(f"[fake_server] ✅ Запущен на {self.address}")
+        return self
+
+    def stop(self, grace: Optional[float] = None):
+        if self._server is None:
+            return
+        self._server.stop(grace).wait()
+        self._server = None
+        print(f"[fake_server] Остановлен, операций: {len(self.backend.operations)}, ответы: {self.backend.counters}")
+
+    def wait_for_termination(self):
+        self._server.wait_for_termination()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake WebTransferApi/WebAccountApi сервер для офлайн бенчмарков")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--config", help="JSON с параметрами FakeServerConfig")
+    args = parser.parse_args()
+
+    config = FakeServerConfig.from_file(args.config) if args.config else FakeServerConfig()
+    server = FakeServer(config, host=args.host, port=args.port).start()
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        server.stop(grace=1)
+
+
+if __name__ == "__main__":
+    main()
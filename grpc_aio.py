@@ -0,0 +1,251 @@
+"""
+Асинхронный транспорт на grpc.aio — аналоги make_grpc_request, make_web_account_request
+и confirm_operation из conftest, плюс раннер, который гонит сотни сценариев
+create → confirm конкурентно из одного event loop.
+
+Вызовы идут через тот же CALL_POLICY, что и синхронные (дедлайн по коду операции, повторы
+идемпотентных кодов, хеджирование), и так же один раз повторяются при INVALID_SESSION_KEY.
+Кассета (CASSETTE) работает так же: в replay ответы берутся из нее без сети, в record
+ответы дописываются в нее.
+
+Каналы общие (AIO_CHANNEL_REGISTRY) и привязаны к event loop: при прямом использовании
+helper-функций закройте их в конце через `await AIO_CHANNEL_REGISTRY.close_all()`.
+run_flows / run_flows_sync делают это сами.
+"""
+import asyncio
+import json
+import time
+from typing import List
+
+import data as app_data
+from conftest import (webTransferApi_pb2, webTransferApi_pb2_grpc, create_metadata, confirm_not_ready, error_code,
+                      CASSETTE, LATENCY_RECORDER, CALL_POLICY, SESSION_KEY_PROVIDER)
+from batch_flows import FlowResult
+from grpc_channels import AioChannelRegistry
+from grpc_metrics import AioLatencyInterceptor
+
+# Задержки aio вызовов пишутся в тот же LATENCY_RECORDER, что и синхронные
+AIO_CHANNEL_REGISTRY = AioChannelRegistry(interceptors=[AioLatencyInterceptor(LATENCY_RECORDER)])
+
+
+def _get_stub(stub_cls):
+    return AIO_CHANNEL_REGISTRY.get_stub(stub_cls, app_data.GRPC_SERVER_URL, app_data.GRPC_OPTIONS, app_data.GRPC_CREDENTIALS)
+
+
+def _resolve_metadata(metadata):
+    if metadata is None:
+        return create_metadata()
+    if callable(metadata):
+        return metadata()
+    return metadata
+
+
+async def _invoke_with_session_refresh_async(invoke, metadata: tuple):
+    """
+    Асинхронный аналог conftest._invoke_with_session_refresh: при INVALID_SESSION_KEY для общего
+    session_key один раз повторяет вызов с новым ключом (поиск в БД — в отдельном потоке)
+    """
+    response = await invoke(metadata)
+    if error_code(response) != app_data.ERROR_INVALID_SESSION_KEY:
+        return response
+
+    rejected_key = dict(metadata).get('sessionkey')
+    if not rejected_key or rejected_key != app_data.SESSION_KEY:
+        return response
+
+    def refresh():
+        SESSION_KEY_PROVIDER.invalidate(rejected_key)
+        return SESSION_KEY_PROVIDER.get()
+
+    session_key = await asyncio.to_thread(refresh)
+    if not session_key or session_key == rejected_key:
+        return response
+
+    print(f"[session_key_loader] INVALID_SESSION_KEY, повтор с новым session_key: {session_key[:10]}...")
+    app_data.SESSION_KEY = session_key
+    refreshed_metadata = tuple(
+        (key, session_key if key == 'sessionkey' else value) for key, value in metadata
+    )
+    return await invoke(refreshed_metadata)
+
+
+# ===== HELPER ФУНКЦИИ =====
+
+async def make_grpc_request_async(code: str, data: dict, metadata: tuple):
+    """
+    Асинхронный gRPC запрос через WebTransferApi
+    
+    Args:
+        code: Код операции
+        data: Данные запроса (dict)
+        metadata: Метаданные запроса (tuple)
+    
+    Returns:
+        Response от сервера
+    """
+    request = webTransferApi_pb2.IncomingWebTransfer(
+        code=code,
+        data=json.dumps(data)
+    )
+    
+    if CASSETTE.replaying:
+        return CASSETTE.replay('WebTransferApi', code, data, webTransferApi_pb2.OutgoingWebTransfer)
+    
+    client = _get_stub(webTransferApi_pb2_grpc.WebTransferApiStub)
+    response = await _invoke_with_session_refresh_async(
+        lambda request_metadata: CALL_POLICY.invoke_async(client.makeWebTransfer, request, request_metadata),
+        metadata
+    )
+    if CASSETTE.recording:
+        CASSETTE.record('WebTransferApi', code, data, response)
+    return response
+
+
+async def make_web_account_request_async(code: str, data: dict, metadata: tuple):
+    """
+    Асинхронный gRPC запрос через WebAccountApi
+    
+    Args:
+        code: Код операции
+        data: Данные запроса (dict)
+        metadata: Метаданные запроса (tuple)
+    
+    Returns:
+        Response от сервера
+    """
+    request = webTransferApi_pb2.WebAccountsRequest(
+        code=code,
+        data=json.dumps(data)
+    )
+    
+    if CASSETTE.replaying:
+        return CASSETTE.replay('WebAccountApi', code, data, webTransferApi_pb2.WebAccountsResponse)
+    
+    client = _get_stub(webTransferApi_pb2_grpc.WebAccountApiStub)
+    response = await _invoke_with_session_refresh_async(
+        lambda request_metadata: CALL_POLICY.invoke_async(client.makeWebAccount, request, request_metadata),
+        metadata
+    )
+    if CASSETTE.recording:
+        CASSETTE.record('WebAccountApi', code, data, response)
+    return response
+
+
+async def confirm_operation_async(operation_id: str, otp: str = app_data.OTP_CODE, metadata=None):
+    """
+    Асинхронное подтверждение операции через OTP
+    
+    Args:
+        operation_id: ID операции для подтверждения
+        otp: OTP код (по умолчанию из data.py)
+        metadata: Метаданные (tuple) или функция, возвращающая метаданные; по умолчанию create_metadata()
+    
+    Returns:
+        Response от сервера
+    """
+    confirm_data = {
+        "operationId": operation_id,
+        "otp": otp
+    }
+    return await make_grpc_request_async(app_data.CODE_CONFIRM_TRANSFER, confirm_data, _resolve_metadata(metadata))
+
+
+async def confirm_when_ready_async(operation_id: str, metadata=None, otp: str = app_data.OTP_CODE,
+                                   timeout: float = app_data.CONFIRM_READY_TIMEOUT):
+    """
+    Асинхронный аналог conftest.confirm_when_ready: повторяет CONFIRM_TRANSFER с растущей
+    паузой, пока операция не готова (conftest.confirm_not_ready), но не дольше timeout
+    
+    Returns:
+        Последний Response от сервера
+    """
+    deadline = time.monotonic() + timeout
+    delay = app_data.CONFIRM_READY_INITIAL_DELAY
+    while True:
+        response = await confirm_operation_async(operation_id, otp, metadata)
+        # Проверка по БД блокирующая — в отдельном потоке, чтобы не останавливать цикл событий
+        if not await asyncio.to_thread(confirm_not_ready, operation_id, response):
+            return response
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return response
+        if not CASSETTE.replaying:
+            await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, app_data.CONFIRM_READY_MAX_DELAY)
+
+
+# ===== РАННЕР СЦЕНАРИЕВ CREATE → CONFIRM =====
+
+async def run_flow(code: str, data: dict, metadata=None, otp: str = app_data.OTP_CODE) -> FlowResult:
+    """
+    Один сценарий: создание операции кодом code и подтверждение по data["operationId"]
+    
+    Args:
+        code: Код операции создания (MAKE_*)
+        data: Данные запроса, обязательно с operationId
+        metadata: Метаданные (tuple) или функция, возвращающая метаданные; по умолчанию create_metadata()
+        otp: OTP код
+    
+    Returns:
+        FlowResult
+    """
+    result = FlowResult(operation_id=data["operationId"])
+    try:
+        started = time.perf_counter()
+        result.create_response = await make_grpc_request_async(code, data, _resolve_metadata(metadata))
+        result.create_seconds = time.perf_counter() - started
+        if not result.create_response.success:
+            return result
+        
+        started = time.perf_counter()
+        result.confirm_response = await confirm_when_ready_async(result.operation_id, metadata, otp)
+        result.confirm_seconds = time.perf_counter() - started
+    except Exception as e:
+        result.error = e
+    return result
+
+
+async def run_flows(flows: List[dict], concurrency: int = 100) -> List[FlowResult]:
+    """
+    Конкурентно выполняет сценарии create → confirm, держа в полете не больше concurrency
+    
+    Args:
+        flows: Список словарей {"code", "data", "metadata" (опц.), "otp" (опц.)}
+        concurrency: Максимум одновременно выполняемых сценариев
+    
+    Returns:
+        List[FlowResult] в порядке flows
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _bounded(flow: dict) -> FlowResult:
+        async with semaphore:
+            return await run_flow(
+                flow["code"], flow["data"],
+                metadata=flow.get("metadata"),
+                otp=flow.get("otp", app_data.OTP_CODE)
+            )
+
+    try:
+        return await asyncio.gather(*(_bounded(flow) for flow in flows))
+    finally:
+        await AIO_CHANNEL_REGISTRY.close_all()
+
+
+def run_flows_sync(flows: List[dict], concurrency: int = 100) -> List[FlowResult]:
+    """Синхронная обертка над run_flows для вызова из тестов и скриптов"""
+    return asyncio.run(run_flows(flows, concurrency))
+
+
+# Экспорт для использования в других файлах
+__all__ = [
+    'AIO_CHANNEL_REGISTRY',
+    'make_grpc_request_async',
+    'make_web_account_request_async',
+    'confirm_operation_async',
+    'confirm_when_ready_async',
+    'FlowResult',
+    'run_flow',
+    'run_flows',
+    'run_flows_sync',
+]
@@ -0,0 +1,179 @@
+"""
+Запись и воспроизведение gRPC ответов (кассета) для helper-функций conftest.
+
+В режиме record каждый запрос (service, code, data) и ответ (success, data, error)
+дописывается строкой JSON в файл кассеты (.gz — со сжатием). operationId и requestId
+заменяются плейсхолдерами, поэтому при replay запрос с новыми UUID находит свою запись,
+а в ответ подставляются текущие значения. В режиме replay сеть не используется.
+
+Записи сопоставляются по (test nodeid, service, code, нормализованные data) в порядке
+записи, поэтому можно воспроизводить как весь прогон, так и отдельные тесты.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from collections import defaultdict, deque
+from typing import Optional
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+MODES = (MODE_OFF, MODE_RECORD, MODE_REPLAY)
+
+# Поля, значения которых генерируются заново в каждом прогоне
+NORMALIZED_KEYS = ("operationId", "requestId")
+
+
+class CassetteMissError(LookupError):
+    """В кассете нет записи для запроса в режиме replay"""
+
+
+def _current_test_id() -> Optional[str]:
+    """nodeid текущего теста из PYTEST_CURRENT_TEST ('path::name (call)' -> 'path::name')"""
+    current = os.environ.get("PYTEST_CURRENT_TEST")
+    if not current:
+        return None
+    test_id = current.rsplit(" ", 1)[0]
+    if os.environ.get("PYTEST_XDIST_WORKER"):
+        # --dist loadgroup дописывает к nodeid группу: 'path::name[id]@lane0'
+        test_id = re.sub(r"@[\w.-]+$", "", test_id)
+    return test_id
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def normalize(data, substitutions: Optional[dict] = None):
+    """
+    Заменяет значения NORMALIZED_KEYS на плейсхолдеры вида <operationId:0>
+
+    Returns:
+        (нормализованные данные, {плейсхолдер: исходное значение})
+    """
+    substitutions = {} if substitutions is None else substitutions
+    if isinstance(data, dict):
+        result = {}
+        for key, value in data.items():
+            if key in NORMALIZED_KEYS and isinstance(value, str) and value:
+                placeholder = next((p for p, v in substitutions.items() if v == value), None)
+                if placeholder is None:
+                    placeholder = f"<{key}:{len(substitutions)}>"
+                    substitutions[placeholder] = value
+                result[key] = placeholder
+            else:
+                result[key] = normalize(value, substitutions)[0]
+        return result, substitutions
+    if isinstance(data, list):
+        return [normalize(item, substitutions)[0] for item in data], substitutions
+    return data, substitutions
+
+
+def _substitute(text: str, substitutions: dict, reverse: bool = False) -> str:
+    for placeholder, value in substitutions.items():
+        text = text.replace(placeholder, value) if reverse else text.replace(value, placeholder)
+    return text
+
+
+class Cassette:
+    """Кассета gRPC взаимодействий"""
+
+    def __init__(self, path: Optional[str] = None, mode: str = MODE_OFF):
+        self._lock = threading.Lock()
+        self._interactions = defaultdict(deque)
+        self._file = None
+        self.path = None
+        self.mode = MODE_OFF
+        if path:
+            self.configure(path, mode)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == MODE_RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    def configure(self, path: str, mode: str):
+        """Включает режим mode для файла path (record перезаписывает файл)"""
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим кассеты: {mode}, ожидается один из {MODES}")
+        self.close()
+        self.path = path
+        self.mode = mode
+        if mode == MODE_REPLAY:
+            self._load()
+        elif mode == MODE_RECORD:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = _open(path, "w")
+
+    def _load(self):
+        self._interactions.clear()
+        with _open(self.path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._interactions[self._key(entry["test"], entry["service"], entry["code"], entry["request"])].append(entry["response"])
+        print(f"[grpc_cassette] Загружено {sum(len(q) for q in self._interactions.values())} записей из {self.path}")
+
+    @staticmethod
+    def _key(test_id, service: str, code: str, normalized_data) -> str:
+        return json.dumps([test_id, service, code, normalized_data], sort_keys=True, ensure_ascii=False)
+
+    def record(self, service: str, code: str, data: dict, response):
+        """Дописывает взаимодействие в кассету"""
+        normalized, substitutions = normalize(data)
+        error = None
+        if response.HasField("error"):
+            error = {"code": response.error.code, "data": _substitute(response.error.data, substitutions)}
+        entry = {
+            "test": _current_test_id(),
+            "service": service,
+            "code": code,
+            "request": normalized,
+            "response": {
+                "success": response.success,
+                "data": _substitute(response.data, substitutions),
+                "error": error,
+            },
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def replay(self, service: str, code: str, data: dict, response_cls):
+        """
+        Возвращает записанный ответ response_cls для запроса с подставленными текущими ID
+
+        Raises:
+            CassetteMissError: записи для запроса нет (или записи для него исчерпаны)
+        """
+        normalized, substitutions = normalize(data)
+        key = self._key(_current_test_id(), service, code, normalized)
+        with self._lock:
+            queue = self._interactions.get(key)
+            if not queue:
+                raise CassetteMissError(f"Нет записи в кассете {self.path} для {service}/{code}: {normalized}")
+            recorded = queue.popleft()
+        response = response_cls(
+            success=recorded["success"],
+            data=_substitute(recorded["data"], substitutions, reverse=True),
+        )
+        if recorded.get("error") is not None:
+            response.error.code = recorded["error"]["code"]
+            response.error.data = _substitute(recorded["error"]["data"], substitutions, reverse=True)
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,136 @@
+"""
+Реестр gRPC каналов на всю pytest-сессию.
+
+Канал создается один раз на ключ (target, options, credentials) и переиспользуется
+всеми вызовами, стабы (WebTransferApiStub, WebAccountApiStub и остальные Web*Api)
+кешируются поверх него. Это убирает TCP + TLS handshake на каждый запрос.
+"""
+import threading
+
+import grpc
+
+
+# ===== ТИПЫ КРЕДЕНШЕЛОВ =====
+CREDENTIALS_SSL = "ssl"
+CREDENTIALS_INSECURE = "insecure"
+
+
+def _options_key(options) -> tuple:
+    """Нормализует options канала в хешируемый ключ"""
+    return tuple(tuple(option) for option in (options or ()))
+
+
+class ChannelRegistry:
+    """Потокобезопасный реестр каналов и стабов"""
+
+    def __init__(self, interceptors=None):
+        """
+        Args:
+            interceptors: Клиентские интерсепторы, которые ставятся на каждый канал реестра
+        """
+        self.interceptors = list(interceptors or [])
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._raw_channels = {}
+        self._stubs = {}
+
+    def _create_channel(self, target: str, options: tuple, credentials: str):
+        """Возвращает (канал для вызовов, исходный канал для закрытия)"""
+        if credentials == CREDENTIALS_INSECURE:
+            channel = grpc.insecure_channel(target, options=list(options))
+        elif credentials == CREDENTIALS_SSL:
+            channel = grpc.secure_channel(target, grpc.ssl_channel_credentials(), options=list(options))
+        else:
+            raise ValueError(f"Неизвестный тип credentials: {credentials}")
+        if self.interceptors:
+            return grpc.intercept_channel(channel, *self.interceptors), channel
+        return channel, channel
+
+    def get_channel(self, target: str, options=None, credentials: str = CREDENTIALS_SSL):
+        """
+        Возвращает общий канал для (target, options, credentials), создавая его при первом обращении
+
+        Args:
+            target: Адрес сервера (host:port)
+            options: Опции канала
+            credentials: CREDENTIALS_SSL или CREDENTIALS_INSECURE
+
+        Returns:
+            grpc.Channel
+        """
+        key = (target, _options_key(options), credentials)
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel, raw_channel = self._create_channel(target, key[1], credentials)
+                self._channels[key] = channel
+                self._raw_channels[key] = raw_channel
+            return channel
+
+    def get_stub(self, stub_cls, target: str, options=None, credentials: str = CREDENTIALS_SSL):
+        """
+        Возвращает закешированный стаб stub_cls поверх общего канала
+
+        Args:
+            stub_cls: Класс стаба (например, WebTransferApiStub)
+            target: Адрес сервера (host:port)
+            options: Опции канала
+            credentials: CREDENTIALS_SSL или CREDENTIALS_INSECURE
+
+        Returns:
+            Экземпляр stub_cls
+        """
+        channel = self.get_channel(target, options, credentials)
+        key = (target, _options_key(options), credentials, stub_cls)
+        with self._lock:
+            stub = self._stubs.get(key)
+            if stub is None:
+                stub = stub_cls(channel)
+                self._stubs[key] = stub
+            return stub
+
+    def close_all(self):
+        """Закрывает все открытые каналы и сбрасывает кеш стабов"""
+        with self._lock:
+            channels = list(self._raw_channels.values())
+            self._channels.clear()
+            self._raw_channels.clear()
+            self._stubs.clear()
+        for channel in channels:
+            try:
+                channel.close()
+            except Exception as e:
+                print(f"[grpc_channels] ⚠️  Ошибка при закрытии канала: {e}")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._channels)
+
+
+class AioChannelRegistry(ChannelRegistry):
+    """Реестр grpc.aio каналов: каналы привязаны к event loop, в котором созданы"""
+
+    def _create_channel(self, target: str, options: tuple, credentials: str):
+        interceptors = self.interceptors or None
+        if credentials == CREDENTIALS_INSECURE:
+            channel = grpc.aio.insecure_channel(target, options=list(options), interceptors=interceptors)
+        elif credentials == CREDENTIALS_SSL:
+            channel = grpc.aio.secure_channel(
+                target, grpc.ssl_channel_credentials(), options=list(options), interceptors=interceptors
+            )
+        else:
+            raise ValueError(f"Неизвестный тип credentials: {credentials}")
+        return channel, channel
+
+    async def close_all(self):
+        """Закрывает все aio каналы (вызывать из того же event loop) и сбрасывает кеш стабов"""
+        with self._lock:
+            channels = list(self._raw_channels.values())
+            self._channels.clear()
+            self._raw_channels.clear()
+            self._stubs.clear()
+        for channel in channels:
+            try:
+                await channel.close()
+            except Exception as e:
+                print(f"[grpc_channels] ⚠️  Ошибка при закрытии aio канала: {e}")
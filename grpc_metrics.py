@@ -0,0 +1,250 @@
+"""
+Клиентские метрики gRPC: интерсептор, который замеряет каждый вызов, и гистограммы
+задержек по (service, code, status) с перцентилями p50/p90/p99/max.
+
+LatencyHistogram — HDR-подобная лог-линейная гистограмма (относительная ошибка < 1%),
+которую можно сливать (merge) и сериализовать (to_dict / from_dict).
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+import grpc
+
+
+# ===== ГИСТОГРАММА =====
+
+class LatencyHistogram:
+    """Лог-линейная гистограмма задержек в миллисекундах с разрешением 1 мкс"""
+
+    SUB_BUCKET_BITS = 7  # 2^7 подкорзин на октаву: относительная ошибка ~0.8%
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us: Optional[int] = None
+
+    @classmethod
+    def _index(cls, value_us: int) -> int:
+        if value_us < (1 << cls.SUB_BUCKET_BITS):
+            return value_us
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS
+        return (shift << cls.SUB_BUCKET_BITS) + (value_us >> shift)
+
+    @classmethod
+    def _bounds(cls, index: int):
+        if index < (1 << cls.SUB_BUCKET_BITS):
+            return index, index
+        shift = index >> cls.SUB_BUCKET_BITS
+        mantissa = index & ((1 << cls.SUB_BUCKET_BITS) - 1)
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, latency_ms: float, count: int = 1):
+        """Добавляет значение задержки (мс)"""
+        value_us = max(0, int(round(latency_ms * 1000)))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total_us += value_us * count
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = value_us if self.max_us is None else max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram"):
+        """Добавляет в гистограмму все значения другой гистограммы"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total_us += other.total_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        if other.max_us is not None:
+            self.max_us = other.max_us if self.max_us is None else max(self.max_us, other.max_us)
+
+    def percentile(self, percent: float) -> float:
+        """Значение перцентиля в мс (0 для пустой гистограммы)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(-(-percent * self.count // 100)))  # ceil
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = self._bounds(index)
+                value_us = min((low + high) / 2, self.max_us)
+                return max(value_us, self.min_us) / 1000
+        return self.max_us / 1000
+
+    @property
+    def mean(self) -> float:
+        return self.total_us / self.count / 1000 if self.count else 0.0
+
+    @property
+    def max(self) -> float:
+        return (self.max_us or 0) / 1000
+
+    @property
+    def min(self) -> float:
+        return (self.min_us or 0) / 1000
+
+    def cdf(self):
+        """Список (верхняя граница корзины в мс, накопленная доля) — для сравнения распределений"""
+        points = []
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            points.append((self._bounds(index)[1] / 1000, seen / self.count))
+        return points
+
+    def summary(self, percentiles=(50, 90, 99)) -> dict:
+        """Словарь count/min/mean/pXX/max в мс"""
+        result = {"count": self.count, "min_ms": round(self.min, 3), "mean_ms": round(self.mean, 3)}
+        for percent in percentiles:
+            result[f"p{percent:g}_ms".replace(".", "_")] = round(self.percentile(percent), 3)
+        result["max_ms"] = round(self.max, 3)
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "total_us": self.total_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+        }
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in raw.get("counts", {}).items()}
+        histogram.count = raw.get("count", 0)
+        histogram.total_us = raw.get("total_us", 0)
+        histogram.min_us = raw.get("min_us")
+        histogram.max_us = raw.get("max_us")
+        return histogram
+
+
+# ===== СБОРЩИК ЗАДЕРЖЕК =====
+
+class LatencyRecorder:
+    """Потокобезопасный набор гистограмм по ключу (service, code, status)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[tuple, LatencyHistogram] = {}
+
+    def record(self, service: str, code: str, status: str, latency_ms: float):
+        key = (service, code, status)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(latency_ms)
+
+    def __len__(self):
+        with self._lock:
+            return sum(histogram.count for histogram in self._histograms.values())
+
+    def rows(self) -> List[dict]:
+        """Строки сводки, отсортированные по service, code, status"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+        return [
+            dict(service=service, code=code, status=status, **histogram.summary())
+            for (service, code, status), histogram in items
+        ]
+
+    def format_table(self) -> str:
+        """Сводная таблица задержек для вывода в консоль"""
+        header = f"{'service':<16} {'code':<32} {'status':<18} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+        lines = [header, "-" * len(header)]
+        for row in self.rows():
+            lines.append(
+                f"{row['service']:<16} {row['code']:<32} {row['status']:<18} {row['count']:>6} "
+                f"{row['p50_ms']:>9.1f} {row['p90_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        """Сводка и сырые гистограммы (для JSON и передачи между процессами)"""
+        with self._lock:
+            histograms = [
+                {"service": service, "code": code, "status": status, "histogram": histogram.to_dict()}
+                for (service, code, status), histogram in sorted(self._histograms.items())
+            ]
+        return {"summary": self.rows(), "histograms": histograms}
+
+    def merge_dict(self, raw: dict):
+        """Добавляет гистограммы из to_dict() другого процесса (воркера xdist)"""
+        with self._lock:
+            for item in raw.get("histograms", []):
+                key = (item["service"], item["code"], item["status"])
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram()
+                histogram.merge(LatencyHistogram.from_dict(item["histogram"]))
+
+    def dump_json(self, path: str):
+        """Сохраняет сводку и сырые гистограммы в JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+# ===== ИНТЕРСЕПТОРЫ =====
+
+def _split_method(method) -> str:
+    """'/WebTransferApi/makeWebTransfer' -> 'WebTransferApi'"""
+    if isinstance(method, bytes):
+        method = method.decode()
+    parts = method.strip("/").split("/")
+    return parts[0].split(".")[-1] if parts else method
+
+
+def _status_name(code) -> str:
+    return code.name if code is not None else "UNKNOWN"
+
+
+class LatencyInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Замеряет каждый unary-unary вызов и пишет задержку в LatencyRecorder"""
+
+    def __init__(self, recorder: LatencyRecorder):
+        self.recorder = recorder
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        service = _split_method(client_call_details.method)
+        code = getattr(request, 'code', '') or '-'
+        started = time.perf_counter()
+        call = continuation(client_call_details, request)
+
+        def _done(future):
+            latency_ms = (time.perf_counter() - started) * 1000
+            try:
+                status = _status_name(future.code())
+            except Exception:
+                status = "UNKNOWN"
+            self.recorder.record(service, code, status, latency_ms)
+
+        call.add_done_callback(_done)
+        return call
+
+
+class AioLatencyInterceptor(grpc.aio.UnaryUnaryClientInterceptor):
+    """Аналог LatencyInterceptor для grpc.aio каналов"""
+
+    def __init__(self, recorder: LatencyRecorder):
+        self.recorder = recorder
+
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        service = _split_method(client_call_details.method)
+        code = getattr(request, 'code', '') or '-'
+        started = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        try:
+            await call
+        except grpc.RpcError:
+            pass  # Ошибку получит вызывающий код, здесь нужен только статус
+        status = _status_name(await call.code())
+        self.recorder.record(service, code, status, (time.perf_counter() - started) * 1000)
+        return call
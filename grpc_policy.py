@@ -0,0 +1,187 @@
+"""
+Политика gRPC вызовов: дедлайны по коду операции, повторы UNAVAILABLE/DEADLINE_EXCEEDED
+для идемпотентных кодов в пределах бюджета на прогон и хеджирование для read-кодов.
+
+Повторяются только коды из idempotent_codes: MAKE_* и CONFIRM_TRANSFER при повторе могут
+создать или подтвердить операцию дважды.
+
+invoke_async — то же для методов стабов grpc.aio.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import grpc
+
+
+RETRYABLE_STATUS_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+
+
+class RetryBudget:
+    """Общий на прогон лимит повторов и хедж-запросов"""
+
+    def __init__(self, max_retries: int):
+        self.max_retries = max_retries
+        self._used = 0
+        self._lock = threading.Lock()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def try_acquire(self) -> bool:
+        """Забирает один повтор из бюджета; False, если бюджет исчерпан"""
+        with self._lock:
+            if self._used >= self.max_retries:
+                return False
+            self._used += 1
+            return True
+
+
+class CallPolicy:
+    """Оборачивает вызов unary-метода стаба дедлайном, повторами и хеджированием"""
+
+    def __init__(self, default_timeout: Optional[float] = 30.0, timeouts_by_code: Optional[Dict[str, float]] = None,
+                 idempotent_codes: Iterable[str] = (), max_attempts: int = 3,
+                 backoff_initial: float = 0.2, backoff_max: float = 2.0,
+                 retry_budget: Optional[RetryBudget] = None,
+                 hedged_codes: Iterable[str] = (), hedge_delay: float = 1.0):
+        """
+        Args:
+            default_timeout: Дедлайн по умолчанию в секундах (None — без дедлайна)
+            timeouts_by_code: Дедлайны для отдельных кодов операций
+            idempotent_codes: Коды, которые безопасно повторять
+            max_attempts: Максимум попыток для идемпотентного кода (включая первую)
+            backoff_initial: Первая пауза перед повтором (сек), далее удваивается
+            backoff_max: Максимальная пауза перед повтором (сек)
+            retry_budget: Общий бюджет повторов; по умолчанию без ограничения
+            hedged_codes: Read-коды, для которых через hedge_delay отправляется второй запрос
+            hedge_delay: Через сколько секунд без ответа отправлять хедж-запрос
+        """
+        self.default_timeout = default_timeout
+        self.timeouts_by_code = dict(timeouts_by_code or {})
+        self.idempotent_codes = set(idempotent_codes)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.retry_budget = retry_budget
+        self.hedged_codes = set(hedged_codes)
+        self.hedge_delay = hedge_delay
+
+    @classmethod
+    def from_config(cls, raw: Optional[dict]) -> "CallPolicy":
+        """Строит политику из секции call_policy в config.json нагрузочного теста"""
+        raw = raw or {}
+        budget = raw.get("retry_budget")
+        return cls(
+            default_timeout=raw.get("default_timeout", 30.0),
+            timeouts_by_code=raw.get("timeouts_by_code"),
+            idempotent_codes=raw.get("idempotent_codes", ()),
+            max_attempts=raw.get("max_attempts", 1),
+            backoff_initial=raw.get("backoff_initial", 0.2),
+            backoff_max=raw.get("backoff_max", 2.0),
+            retry_budget=RetryBudget(budget) if budget is not None else None,
+            hedged_codes=raw.get("hedged_codes", ()),
+            hedge_delay=raw.get("hedge_delay", 1.0),
+        )
+
+    def timeout_for(self, code: str) -> Optional[float]:
+        return self.timeouts_by_code.get(code, self.default_timeout)
+
+    def _can_retry(self) -> bool:
+        return self.retry_budget is None or self.retry_budget.try_acquire()
+
+    def invoke(self, method, request, metadata, code: Optional[str] = None):
+        """
+        Выполняет вызов method(request) по политике
+
+        Args:
+            method: Unary-метод стаба (например, stub.makeWebTransfer)
+            request: Protobuf запрос
+            metadata: Метаданные вызова
+            code: Код операции; по умолчанию request.code
+
+        Returns:
+            Response от сервера
+        """
+        code = code or getattr(request, 'code', '')
+        timeout = self.timeout_for(code)
+        if code in self.hedged_codes:
+            return self._invoke_hedged(method, request, metadata, timeout)
+
+        attempts = self.max_attempts if code in self.idempotent_codes else 1
+        delay = self.backoff_initial
+        for attempt in range(1, attempts + 1):
+            try:
+                return method(request, metadata=metadata, timeout=timeout)
+            except grpc.RpcError as e:
+                if attempt == attempts or e.code() not in RETRYABLE_STATUS_CODES or not self._can_retry():
+                    raise
+                print(f"[grpc_policy] {code}: {e.code().name}, повтор {attempt + 1}/{attempts} через {delay} сек")
+                time.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    async def invoke_async(self, method, request, metadata, code: Optional[str] = None):
+        """Асинхронный аналог invoke для unary-метода стаба grpc.aio"""
+        code = code or getattr(request, 'code', '')
+        timeout = self.timeout_for(code)
+        if code in self.hedged_codes:
+            return await self._invoke_hedged_async(method, request, metadata, timeout)
+
+        attempts = self.max_attempts if code in self.idempotent_codes else 1
+        delay = self.backoff_initial
+        for attempt in range(1, attempts + 1):
+            try:
+                return await method(request, metadata=metadata, timeout=timeout)
+            except grpc.RpcError as e:
+                if attempt == attempts or e.code() not in RETRYABLE_STATUS_CODES or not self._can_retry():
+                    raise
+                print(f"[grpc_policy] {code}: {e.code().name}, повтор {attempt + 1}/{attempts} через {delay} сек")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    async def _invoke_hedged_async(self, method, request, metadata, timeout):
+        """Как _invoke_hedged: второй запрос через hedge_delay, возвращается первый успешный ответ"""
+        tasks = [asyncio.ensure_future(method(request, metadata=metadata, timeout=timeout))]
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+        if not done and self._can_retry():
+            tasks.append(asyncio.ensure_future(method(request, metadata=metadata, timeout=timeout)))
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return tasks[0].result()  # Все запросы завершились ошибкой — пробрасываем первую
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _invoke_hedged(self, method, request, metadata, timeout):
+        """Первый запрос сразу, второй — через hedge_delay; возвращается первый успешный ответ"""
+        done = threading.Event()
+        futures = [method.future(request, metadata=metadata, timeout=timeout)]
+        futures[0].add_done_callback(lambda _: done.set())
+
+        if not done.wait(self.hedge_delay) and self._can_retry():
+            hedge = method.future(request, metadata=metadata, timeout=timeout)
+            hedge.add_done_callback(lambda _: done.set())
+            futures.append(hedge)
+
+        while True:
+            done.wait()
+            finished = [future for future in futures if future.done()]
+            for future in finished:
+                if future.exception() is None:
+                    for other in futures:
+                        if other is not future:
+                            other.cancel()
+                    return future.result()
+            if len(finished) == len(futures):
+                return futures[0].result()  # Все запросы завершились ошибкой — пробрасываем первую
+            done.clear()
+            if all(future.done() for future in futures):
+                done.set()
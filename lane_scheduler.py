@@ -0,0 +1,197 @@
+"""
+Pytest-плагин: раскладка тестов по последовательным «дорожкам» (lanes) по общим ресурсам.
+
+Почти все сценарии списывают деньги с нескольких одних и тех же счетов, поэтому наивный
+параллельный прогон ловит блокировки на бэкенде и ложные «недостаточно средств».
+Плагин читает у каждого теста счета списания и пользователя сессии, объединяет тесты
+с общими ресурсами (union-find) в одну дорожку и помечает их xdist_group: с
+`pytest -n auto --dist loadgroup --lanes` дорожка выполняется одним воркером
+последовательно, а независимые дорожки — параллельно.
+
+Ресурсы теста:
+    - маркер @pytest.mark.debit_accounts(17420, 17439) — явный список счетов;
+      пустой маркер — тест не списывает средства;
+    - иначе — account_id_debit / account_debit_id / user_id из параметров теста
+      (в том числе из словарей test_data); без счета в параметрах — ACCOUNT_ID_DEBIT;
+    - без user_id в параметрах тест работает в общей сессии (ключ из SESSION_KEY_USER_IDS),
+      поэтому его пользователь — SESSION_KEY_USER_IDS[0];
+    - маркер @pytest.mark.lane("имя") — тесты с одним именем всегда в одной дорожке
+      (например, модуль с общей пакетной фикстурой);
+    - unit-тесты (маркер unit, tests/unit) к стенду не ходят и ресурсов не занимают.
+"""
+from collections import OrderedDict
+from typing import Dict, List
+
+import pytest
+
+import data as app_data
+
+# Ключи параметров со счетом списания и пользователем сессии
+DEBIT_ACCOUNT_KEYS = ("account_id_debit", "account_debit_id")
+USER_ID_KEYS = ("user_id",)
+
+# Состояние плагина на pytest.Config
+LANES_PLAN_KEY = pytest.StashKey["OrderedDict[str, list]"]()
+LANES_REPORTED_KEY = pytest.StashKey[bool]()
+
+
+# ===== РЕСУРСЫ ТЕСТА =====
+
+def _param_values(item) -> List:
+    callspec = getattr(item, "callspec", None)
+    return list(callspec.params.items()) if callspec else []
+
+
+def item_resources(item) -> List[str]:
+    """Ресурсы теста вида 'account:17420', 'user:134', 'lane:swift'"""
+    if item.get_closest_marker("unit") is not None:
+        return []
+    resources = []
+    accounts_marker = item.get_closest_marker("debit_accounts")
+    if accounts_marker is not None:
+        resources.extend(f"account:{account}" for account in accounts_marker.args)
+
+    found_account = found_user = False
+    for name, value in _param_values(item):
+        candidates = value.items() if isinstance(value, dict) else [(name, value)]
+        for key, candidate in candidates:
+            if candidate is None:
+                continue
+            if key in DEBIT_ACCOUNT_KEYS:
+                found_account = True
+                if accounts_marker is None:
+                    resources.append(f"account:{candidate}")
+            elif key in USER_ID_KEYS:
+                found_user = True
+                resources.append(f"user:{candidate}")
+
+    if accounts_marker is None and not found_account:
+        resources.append(f"account:{app_data.ACCOUNT_ID_DEBIT}")
+    if not found_user:
+        resources.append(f"user:{app_data.SESSION_KEY_USER_IDS[0]}")
+
+    for marker in item.iter_markers("lane"):
+        resources.extend(f"lane:{name}" for name in marker.args)
+    return list(dict.fromkeys(resources))
+
+
+# ===== UNION-FIND =====
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, key: str) -> str:
+        self.parent.setdefault(key, key)
+        root = key
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[key] != root:
+            self.parent[key], key = root, self.parent[key]
+        return root
+
+    def union(self, first: str, second: str):
+        first_root, second_root = self.find(first), self.find(second)
+        if first_root != second_root:
+            self.parent[second_root] = first_root
+
+
+def plan_lanes(items) -> "OrderedDict[str, list]":
+    """
+    Группирует тесты в дорожки: тесты с хотя бы одним общим ресурсом попадают в одну
+
+    Returns:
+        OrderedDict: имя дорожки ('lane0', 'lane1', ...) -> список тестов в порядке сбора
+    """
+    groups = _DisjointSet()
+    for item in items:
+        groups.find(item.nodeid)
+        for resource in item_resources(item):
+            groups.union(item.nodeid, resource)
+
+    lanes = OrderedDict()
+    names = {}
+    for item in items:
+        root = groups.find(item.nodeid)
+        if root not in names:
+            names[root] = f"lane{len(names)}"
+        lanes.setdefault(names[root], []).append(item)
+    return lanes
+
+
+# ===== PYTEST ХУКИ =====
+
+def pytest_addoption(parser):
+    group = parser.getgroup("lanes")
+    group.addoption(
+        "--lanes", action="store_true", default=False,
+        help="Разложить тесты по дорожкам по общим счетам/пользователям (с -n используйте --dist loadgroup)"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "debit_accounts(*ids): счета, с которых тест списывает средства")
+    config.addinivalue_line("markers", "lane(name): тесты с одним именем выполняются в одной дорожке")
+    if not config.getoption("--lanes"):
+        return
+    numprocesses = getattr(config.option, "numprocesses", None)
+    if numprocesses and getattr(config.option, "dist", "no") not in ("loadgroup", "no"):
+        raise pytest.UsageError("--lanes с pytest-xdist работает только с --dist loadgroup")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(session, config, items):
+    """Ставит xdist_group раньше xdist, который по нему дописывает группу к nodeid"""
+    if not config.getoption("--lanes"):
+        return
+    lanes = plan_lanes(items)
+    for lane, lane_items in lanes.items():
+        for item in lane_items:
+            item.add_marker(pytest.mark.xdist_group(name=lane))
+    config.stash[LANES_PLAN_KEY] = lanes
+
+
+def _plan_lines(config, total, lanes, resources=None) -> List[str]:
+    """Строки отчета о раскладке: lanes — имя дорожки -> число тестов"""
+    lines = [f"[lanes] {total} тестов в {len(lanes)} дорожках, самая длинная: {max(lanes.values())}"]
+    if config.option.verbose > 0:
+        for lane, size in lanes.items():
+            details = f", ресурсы: {', '.join(resources[lane])}" if resources else ""
+            lines.append(f"[lanes]   {lane}: {size} тестов{details}")
+    return lines
+
+
+def pytest_report_collectionfinish(config, start_path, items):
+    """Раскладка без xdist (и с --collect-only)"""
+    lanes = config.stash.get(LANES_PLAN_KEY, None)
+    if not lanes:
+        return None
+    resources = {
+        lane: sorted({resource for item in lane_items for resource in item_resources(item)})
+        for lane, lane_items in lanes.items()
+    }
+    return _plan_lines(config, len(items), {lane: len(lane_items) for lane, lane_items in lanes.items()}, resources)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_node_collection_finished(node, ids):
+    """
+    Раскладка под xdist: контроллер сам тесты не собирает, поэтому план восстанавливается
+    по nodeid первого воркера — loadgroup дописывает к ним '@<дорожка>'
+    """
+    config = node.config
+    if not config.getoption("--lanes") or config.stash.get(LANES_REPORTED_KEY, False):
+        return
+    config.stash[LANES_REPORTED_KEY] = True
+    lanes = OrderedDict()
+    for nodeid in ids:
+        lane = nodeid.rpartition("@")[2] if "@" in nodeid else "-"
+        lanes[lane] = lanes.get(lane, 0) + 1
+    if not lanes:
+        return
+    reporter = config.pluginmanager.get_plugin("terminalreporter")
+    if reporter is None:
+        return
+    reporter.ensure_newline()
+    for line in _plan_lines(config, len(ids), lanes):
+        reporter.write_line(line)
@@ -0,0 +1,240 @@
+"""
+Load-test baselines and the regression gate.
+
+A baseline is a saved run report (the JSON of report.LoadReport: per-phase and per-code
+percentiles and histograms, throughput, outcomes) plus a hash of the load-relevant config.
+A new run is compared with a chosen baseline:
+
+    latency       p50/p99 per phase and per operation code may grow by latency_pct
+                  (and at least min_latency_delta_ms, so sub-ms noise is not a regression)
+    distribution  one-sided two-sample Kolmogorov–Smirnov test on the histogram CDFs:
+                  regression when the current run is slower with p < ks_alpha and the
+                  CDF gap D is at least ks_min_d (large runs make tiny shifts significant)
+    throughput    may drop by throughput_drop_pct
+    error rate    may grow by error_rate_increase (absolute share)
+
+Any failed check is a regression; run_load_test.py --compare-baseline exits with 1.
+
+Standalone use with saved reports:
+    python baseline.py save load_report_20250101_120000.json --name release_1_4
+    python baseline.py compare load_report_20250102_120000.json --baseline release_1_4
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from grpc_metrics import LatencyHistogram
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+# Не влияют на нагрузку (секреты, пути вывода, частота прогресса) — в хеш конфига не входят
+VOLATILE_CONFIG_KEYS = {
+    "session_key", "session_id", "otp", "sessions", "report_path", "results_path", "results_format",
+    "live_interval_s", "baseline",
+}
+DEFAULT_TOLERANCES = {
+    "latency_pct": {"p50": 10, "p99": 20},
+    "min_latency_delta_ms": 5,
+    "throughput_drop_pct": 10,
+    "error_rate_increase": 0.005,
+    "ks_alpha": 0.01,
+    "ks_min_d": 0.05,
+}
+
+
+@dataclass
+class Check:
+    metric: str
+    baseline: float
+    current: float
+    limit: str
+    passed: bool
+
+    def format(self):
+        change = (f"{(self.current - self.baseline) / self.baseline:+.1%}" if self.baseline
+                  else f"{self.current - self.baseline:+.3f}")
+        return (f"  {'ok  ' if self.passed else 'FAIL'} {self.metric:<44} {self.baseline:>10.3f} "
+                f"{self.current:>10.3f} {change:>8}  {self.limit}")
+
+
+def config_hash(cfg):
+    """Short hash of the load-relevant part of config.json."""
+    relevant = {key: value for key, value in cfg.items() if key not in VOLATILE_CONFIG_KEYS}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def baseline_path(name, baselines_dir=None):
+    return os.path.join(baselines_dir or BASELINES_DIR, f"{name}.json")
+
+
+def save_baseline(report, name, cfg_hash=None, baselines_dir=None):
+    """
+    Saves a run report (LoadReport.to_dict() plus run info) as baseline name.
+
+    Returns:
+        Path of the baseline file
+    """
+    path = baseline_path(name, baselines_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "name": name,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "config_hash": cfg_hash,
+            "report": report,
+        }, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_baseline(name, baselines_dir=None):
+    path = name if os.path.exists(name) else baseline_path(name, baselines_dir)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ===== СТАТИСТИКА =====
+
+def _cdf_at(points, x):
+    """Share of values <= x for a LatencyHistogram.cdf() step function."""
+    share = 0.0
+    for upper, cumulative in points:
+        if upper > x:
+            break
+        share = cumulative
+    return share
+
+
+def ks_slower(baseline, current):
+    """
+    One-sided two-sample KS test "current is slower than baseline" on histogram CDFs.
+
+    Returns:
+        (D = max(F_baseline - F_current), p-value)
+    """
+    if not baseline.count or not current.count:
+        return 0.0, 1.0
+    base_points, current_points = baseline.cdf(), current.cdf()
+    grid = sorted({upper for upper, _ in base_points} | {upper for upper, _ in current_points})
+    d = max(0.0, max(_cdf_at(base_points, x) - _cdf_at(current_points, x) for x in grid))
+    n, m = baseline.count, current.count
+    p_value = math.exp(-2 * d * d * n * m / (n + m))
+    return d, min(1.0, p_value)
+
+
+# ===== СРАВНЕНИЕ =====
+
+def _latency_checks(title, base_summary, current_summary, tolerances):
+    checks = []
+    for percentile, pct in tolerances["latency_pct"].items():
+        key = f"{percentile}_ms"
+        if key not in base_summary or key not in current_summary or not base_summary.get("count"):
+            continue
+        base, current = base_summary[key], current_summary[key]
+        allowed = max(base * (1 + pct / 100), base + tolerances["min_latency_delta_ms"])
+        checks.append(Check(f"{title} {percentile} ms", base, current, f"<= {allowed:.1f}", current <= allowed))
+    return checks
+
+
+def _ks_check(title, base_raw, current_raw, tolerances):
+    baseline, current = LatencyHistogram.from_dict(base_raw), LatencyHistogram.from_dict(current_raw)
+    if not baseline.count or not current.count:
+        return []
+    d, p_value = ks_slower(baseline, current)
+    passed = not (p_value < tolerances["ks_alpha"] and d >= tolerances["ks_min_d"])
+    return [Check(f"{title} KS D (p={p_value:.2g})", 0.0, d,
+                  f"p >= {tolerances['ks_alpha']:g} or D < {tolerances['ks_min_d']:g}", passed)]
+
+
+def _error_rate(outcomes):
+    total = sum(outcomes.values())
+    return (total - outcomes.get("success", 0)) / total if total else 0.0
+
+
+def compare(current, baseline, tolerances=None):
+    """
+    Checks a run report against a baseline report (both LoadReport.to_dict() form).
+
+    Returns:
+        [Check]; the run regressed if any check failed
+    """
+    merged = dict(DEFAULT_TOLERANCES)
+    merged.update(tolerances or {})
+    tolerances = merged
+    checks = []
+    for phase, base_summary in baseline.get("latency", {}).items():
+        if phase in current.get("latency", {}):
+            checks += _latency_checks(phase, base_summary, current["latency"][phase], tolerances)
+            checks += _ks_check(phase, baseline["histograms"][phase], current["histograms"][phase], tolerances)
+    for code, base_entry in baseline.get("codes", {}).items():
+        current_entry = current.get("codes", {}).get(code)
+        if current_entry is None:
+            continue
+        checks += _latency_checks(f"{code} e2e", base_entry["end_to_end"], current_entry["end_to_end"], tolerances)
+        checks += _ks_check(f"{code} e2e", base_entry["histograms"]["end_to_end"],
+                            current_entry["histograms"]["end_to_end"], tolerances)
+        base_errors, current_errors = _error_rate(base_entry["outcomes"]), _error_rate(current_entry["outcomes"])
+        allowed = base_errors + tolerances["error_rate_increase"]
+        checks.append(Check(f"{code} error rate", base_errors, current_errors, f"<= {allowed:.4f}",
+                            current_errors <= allowed))
+
+    base_throughput, current_throughput = baseline.get("throughput_rps", 0), current.get("throughput_rps", 0)
+    minimum = base_throughput * (1 - tolerances["throughput_drop_pct"] / 100)
+    checks.append(Check("throughput rps", base_throughput, current_throughput, f">= {minimum:.1f}",
+                        current_throughput >= minimum))
+    base_errors, current_errors = _error_rate(baseline.get("outcomes", {})), _error_rate(current.get("outcomes", {}))
+    allowed = base_errors + tolerances["error_rate_increase"]
+    checks.append(Check("error rate", base_errors, current_errors, f"<= {allowed:.4f}", current_errors <= allowed))
+    return checks
+
+
+def print_comparison(checks, baseline, current_hash=None):
+    """Prints the check table; returns True when there is no regression."""
+    print(f"Baseline '{baseline['name']}' ({baseline['created_at']})")
+    if current_hash and baseline.get("config_hash") and current_hash != baseline["config_hash"]:
+        print(f"  ⚠️ Конфиг отличается от базового ({current_hash} != {baseline['config_hash']}): "
+              f"сравнение может быть некорректным")
+    print(f"       {'metric':<44} {'baseline':>10} {'current':>10} {'change':>8}  limit")
+    for check in checks:
+        print(check.format())
+    failed = [check for check in checks if not check.passed]
+    if failed:
+        print(f"  ❌ Регрессия: {len(failed)} из {len(checks)} проверок не прошли")
+    else:
+        print(f"  ✅ Без регрессии ({len(checks)} проверок)")
+    return not failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Save load-test baselines and compare reports against them")
+    parser.add_argument("--config", default=CONFIG_PATH, help="config.json with the 'baseline' section (tolerances)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    save = subparsers.add_parser("save", help="Save a report JSON as a baseline")
+    save.add_argument("report")
+    save.add_argument("--name", required=True)
+    check = subparsers.add_parser("compare", help="Compare a report JSON with a baseline")
+    check.add_argument("report")
+    check.add_argument("--baseline", required=True, help="Baseline name (baselines/<name>.json) or path")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        baseline_cfg = json.load(f).get("baseline") or {}
+    with open(args.report, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    if args.command == "save":
+        print(f"Baseline saved: {save_baseline(report, args.name, report.get('config_hash'), baseline_cfg.get('dir'))}")
+        return 0
+    baseline = load_baseline(args.baseline, baseline_cfg.get("dir"))
+    checks = compare(report, baseline["report"], baseline_cfg.get("tolerances"))
+    return 0 if print_comparison(checks, baseline, report.get("config_hash")) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
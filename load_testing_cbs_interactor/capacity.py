@@ -0,0 +1,130 @@
+"""
+Capacity search: the highest arrival rate that still meets the SLO.
+
+Each probe runs open-loop at one rate: a warm-up stage (not judged) and a measurement
+window. The probe passes when, within the window,
+
+    end-to-end p99 <= slo.p99_ms          (measured from the intended start, so queueing
+                                           in the generator or the server both count)
+    error rate     <= slo.max_error_rate
+
+The rate grows exponentially (start_rps × growth^n) until a probe fails or max_rps is
+reached, then a binary search between the last passing and the first failing rate
+narrows the knee down to resolution_rps.
+"""
+from dataclasses import dataclass, field, asdict
+from typing import Callable, List, Optional
+
+PROBE_STAGE = "probe"
+WARMUP_STAGE = "warmup"
+
+
+@dataclass
+class Slo:
+    p99_ms: float = 1000.0
+    max_error_rate: float = 0.01
+
+    @classmethod
+    def from_config(cls, raw):
+        return cls(**(raw or {}))
+
+
+@dataclass
+class ProbeResult:
+    target_rps: float
+    sent_rps: float
+    count: int
+    error_rate: float
+    p50_ms: float
+    p99_ms: float
+    passed: bool
+    reasons: List[str] = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def evaluate(target_rps, stage, slo: Slo) -> ProbeResult:
+    """Judges the measurement stage of a LoadReport (report.stages[PROBE_STAGE])."""
+    count = sum(stage["outcomes"].values())
+    failed = count - stage["outcomes"]["success"]
+    error_rate = failed / count if count else 1.0
+    histogram = stage["end_to_end"]
+    sent_rps = stage["released"] / stage["duration_s"] if stage["duration_s"] else 0.0
+    reasons = []
+    if histogram.percentile(99) > slo.p99_ms:
+        reasons.append(f"p99 {histogram.percentile(99):.0f} > {slo.p99_ms:g} ms")
+    if error_rate > slo.max_error_rate:
+        reasons.append(f"errors {error_rate:.2%} > {slo.max_error_rate:.2%}")
+    return ProbeResult(
+        target_rps=round(target_rps, 2),
+        sent_rps=round(sent_rps, 2),
+        count=count,
+        error_rate=round(error_rate, 5),
+        p50_ms=round(histogram.percentile(50), 3),
+        p99_ms=round(histogram.percentile(99), 3),
+        passed=not reasons,
+        reasons=reasons,
+    )
+
+
+def search_capacity(probe: Callable[[float], ProbeResult], start_rps, max_rps, growth=2.0, resolution_rps=1.0):
+    """
+    Exponential, then binary search over the arrival rate.
+
+    Args:
+        probe: Runs one probe at the given rate
+        start_rps: First rate tried
+        max_rps: Upper bound of the search
+        growth: Factor between exponential steps
+        resolution_rps: Stop once passing and failing rates are this close
+
+    Returns:
+        (knee_rps or None when even start_rps fails, [ProbeResult in probe order])
+    """
+    if growth <= 1:
+        raise ValueError("growth должен быть > 1")
+    probes = []
+
+    def run(rps):
+        result = probe(rps)
+        probes.append(result)
+        return result.passed
+
+    passing, failing = None, None
+    rps = start_rps
+    while failing is None:
+        if run(rps):
+            passing = rps
+            if rps >= max_rps:
+                break
+            rps = min(rps * growth, max_rps)
+        else:
+            failing = rps
+
+    if failing is not None:
+        low = passing if passing is not None else 0.0
+        high = failing
+        while high - low > resolution_rps:
+            middle = (low + high) / 2
+            if run(middle):
+                low = passing = middle
+            else:
+                high = middle
+    return passing, probes
+
+
+def format_curve(probes: List[ProbeResult], knee: Optional[float]) -> str:
+    """Probe table sorted by rate, with the knee marked."""
+    header = (f"  {'target rps':>10} {'sent rps':>9} {'count':>7} {'errors':>8} {'p50 ms':>9} {'p99 ms':>9}  verdict")
+    lines = [header, "  " + "-" * (len(header) - 2)]
+    for result in sorted(probes, key=lambda r: r.target_rps):
+        verdict = "ok" if result.passed else "FAIL: " + "; ".join(result.reasons)
+        # target_rps округлен в evaluate(), поэтому knee сравнивается так же округленным
+        if knee is not None and result.passed and abs(result.target_rps - round(knee, 2)) < 1e-6:
+            verdict += "  <-- knee"
+        lines.append(
+            f"  {result.target_rps:>10.1f} {result.sent_rps:>9.1f} {result.count:>7} {result.error_rate:>8.2%} "
+            f"{result.p50_ms:>9.1f} {result.p99_ms:>9.1f}  {verdict}"
+        )
+    return "\n".join(lines)
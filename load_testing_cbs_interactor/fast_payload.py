@@ -0,0 +1,99 @@
+"""
+Pre-serialized request bytes for the load generator.
+
+The payload is rendered to JSON once with sentinel values in place of operationId and
+requestId, split at the sentinels and pre-encoded. Per request only the IDs are spliced
+in and the IncomingWebTransfer protobuf frame is assembled by hand:
+
+    field 1 (code):  pre-encoded once
+    field 2 (data):  0x12 + varint(len(json)) + json bytes
+
+The bytes go out through a unary-unary callable without a request serializer, so
+json.dumps, message construction and protobuf serialization leave the hot loop.
+"""
+import json
+import re
+
+import protofile_pb2 as pb2
+
+WEB_TRANSFER_METHOD = "/dmz_api.WebTransferApi/makeWebTransfer"
+
+OPERATION_ID_SLOT = "operationId"
+REQUEST_ID_SLOT = "requestId"
+_SENTINELS = {
+    OPERATION_ID_SLOT: "__LT_SLOT_OPERATION_ID__",
+    REQUEST_ID_SLOT: "__LT_SLOT_REQUEST_ID__",
+}
+_DATA_FIELD_TAG = b"\x12"  # field 2, wire type 2 (length-delimited)
+_NEEDS_ESCAPING = re.compile(rb'["\\\x00-\x1f]')
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _check_id(value: str) -> bytes:
+    """IDs are spliced without JSON escaping, so they must not need any."""
+    encoded = value.encode("ascii")
+    if _NEEDS_ESCAPING.search(encoded):
+        raise ValueError(f"ID needs JSON escaping and cannot be spliced: {value!r}")
+    return encoded
+
+
+class PayloadTemplate:
+    """IncomingWebTransfer for one code with operationId/requestId slots."""
+
+    def __init__(self, code: str, payload: dict):
+        """
+        Args:
+            code: Request code (IncomingWebTransfer.code)
+            payload: Request data; values equal to PayloadTemplate.slot(name) become slots
+        """
+        self.code = code
+        self._prefix = pb2.IncomingWebTransfer(code=code).SerializeToString() + _DATA_FIELD_TAG
+        text = json.dumps(payload)  # Те же настройки, что у json.dumps в пути через pb2: байты совпадают
+        self._parts = []
+        self._slots = []
+        position = 0
+        while True:
+            found = [(text.find(sentinel, position), name) for name, sentinel in _SENTINELS.items()]
+            found = [(index, name) for index, name in found if index >= 0]
+            if not found:
+                break
+            index, name = min(found)
+            self._parts.append(text[position:index].encode("utf-8"))
+            self._slots.append(name)
+            position = index + len(_SENTINELS[name])
+        self._parts.append(text[position:].encode("utf-8"))
+        self._static_length = sum(len(part) for part in self._parts)
+
+    @staticmethod
+    def slot(name: str) -> str:
+        """Placeholder value to put into the payload for slot name."""
+        return _SENTINELS[name]
+
+    def render(self, operation_id: str, request_id: str = "") -> bytes:
+        """Serialized IncomingWebTransfer with the IDs spliced in."""
+        values = {OPERATION_ID_SLOT: _check_id(operation_id), REQUEST_ID_SLOT: _check_id(request_id)}
+        chunks = [self._parts[0]]
+        length = self._static_length
+        for name, part in zip(self._slots, self._parts[1:]):
+            value = values[name]
+            chunks.append(value)
+            chunks.append(part)
+            length += len(value)
+        return self._prefix + _varint(length) + b"".join(chunks)
+
+
+def raw_make_web_transfer(channel):
+    """makeWebTransfer callable that takes pre-serialized request bytes."""
+    return channel.unary_unary(
+        WEB_TRANSFER_METHOD,
+        request_serializer=None,
+        response_deserializer=pb2.OutgoingWebTransfer.FromString,
+    )
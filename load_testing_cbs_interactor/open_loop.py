@@ -0,0 +1,150 @@
+"""
+Open-loop (constant arrival rate) request scheduling.
+
+Requests are released on a fixed timetable computed up front — evenly spaced or as a
+Poisson process — regardless of how fast the server answers. Each request carries its
+intended start time, so latency can be measured from when it *should* have been sent
+and server-side queueing is not hidden (coordinated omission).
+
+Load profiles are sequences of stages with a linear rate (constant when start = end):
+
+    ramp      {"type": "ramp", "from_rps": 0, "to_rps": 100, "duration_s": 60}
+    constant  {"type": "constant", "rps": 50, "duration_s": 60}
+    step      {"type": "step", "start_rps": 10, "step_rps": 10, "steps": 5, "hold_s": 30}
+    spike     {"type": "spike", "rps": 300, "duration_s": 10}
+    soak      {"type": "soak", "rps": 30, "duration_s": 14400}
+
+A step expands into one constant stage per step. Every stage may set "name"; every
+request is tagged with the name of the stage it was released in.
+"""
+import math
+import random
+import time
+from dataclasses import dataclass
+
+ARRIVAL_FIXED = "fixed"
+ARRIVAL_POISSON = "poisson"
+ARRIVALS = (ARRIVAL_FIXED, ARRIVAL_POISSON)
+STAGE_TYPES = ("ramp", "constant", "step", "spike", "soak")
+
+
+@dataclass
+class Stage:
+    """One stage of a load profile: rate goes linearly from start_rps to end_rps."""
+
+    name: str
+    duration_s: float
+    start_rps: float
+    end_rps: float
+
+    def offsets(self, arrival=ARRIVAL_FIXED, rng=None):
+        """
+        Yields send offsets from the start of the stage.
+
+        The n-th request goes out when the expected number of arrivals reaches n (fixed) or
+        a unit-rate Poisson process is stretched by the rate curve (poisson), so both
+        follow the linear rate.
+        """
+        if arrival not in ARRIVALS:
+            raise ValueError(f"Unknown arrival process: {arrival}, expected one of {ARRIVALS}")
+        rng = rng or random.Random()
+        slope = (self.end_rps - self.start_rps) / self.duration_s if self.duration_s else 0.0
+        expected = 0.0
+        while True:
+            if slope:
+                offset = (-self.start_rps + math.sqrt(self.start_rps ** 2 + 2 * slope * expected)) / slope
+            elif self.start_rps > 0:
+                offset = expected / self.start_rps
+            else:
+                return
+            if offset >= self.duration_s:
+                return
+            yield offset
+            expected += rng.expovariate(1.0) if arrival == ARRIVAL_POISSON else 1.0
+
+
+def expand_profile(stages_cfg, rps_scale=1.0):
+    """
+    Stage list from the profile's "stages" config (steps expanded, names filled in).
+
+    rps_scale multiplies every rate but not the generated names, so worker processes that
+    each run a share of the load tag results with the same stage names.
+    """
+    stages = []
+    for number, raw in enumerate(stages_cfg, 1):
+        kind = raw.get("type", "constant")
+        if kind not in STAGE_TYPES:
+            raise ValueError(f"Unknown stage type: {kind}, expected one of {STAGE_TYPES}")
+        if kind == "ramp":
+            name = raw.get("name") or f"s{number} ramp {raw['from_rps']:g}-{raw['to_rps']:g} rps"
+            stages.append(Stage(name, raw["duration_s"], raw["from_rps"] * rps_scale, raw["to_rps"] * rps_scale))
+        elif kind == "step":
+            for step in range(raw["steps"]):
+                rps = raw["start_rps"] + step * raw["step_rps"]
+                name = f"{raw['name']} #{step + 1}" if raw.get("name") else f"s{number}.{step + 1} step {rps:g} rps"
+                stages.append(Stage(name, raw["hold_s"], rps * rps_scale, rps * rps_scale))
+        else:
+            name = raw.get("name") or f"s{number} {kind} {raw['rps']:g} rps"
+            stages.append(Stage(name, raw["duration_s"], raw["rps"] * rps_scale, raw["rps"] * rps_scale))
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Stage names must be unique: {names}")
+    return stages
+
+
+def arrival_offsets(rps, duration_s, arrival=ARRIVAL_FIXED, seed=None):
+    """Yields send offsets in seconds from the start of the window, in increasing order."""
+    return Stage("", duration_s, rps, rps).offsets(arrival, random.Random(seed))
+
+
+def run_open_loop(submit, rps, duration_s, arrival=ARRIVAL_FIXED, seed=None, start=None):
+    """
+    Calls submit(index, intended_start) on schedule; submit must not block.
+
+    Args:
+        submit: Callback that hands the request to workers
+        rps: Target arrival rate (requests per second)
+        duration_s: Length of the window in seconds
+        arrival: "fixed" (evenly spaced) or "poisson" (exponential gaps)
+        seed: Seed for the Poisson process
+        start: time.perf_counter() value the window starts at; defaults to now
+
+    Returns:
+        Number of requests released
+    """
+    start = time.perf_counter() if start is None else start
+    count = 0
+    for offset in arrival_offsets(rps, duration_s, arrival, seed):
+        intended = start + offset
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        submit(count, intended)
+        count += 1
+    return count
+
+
+def run_profile(submit, stages, arrival=ARRIVAL_FIXED, seed=None, start=None):
+    """
+    Runs the stages back to back; calls submit(index, intended_start, stage_name).
+
+    Returns:
+        {stage name: number of requests released}
+    """
+    start = time.perf_counter() if start is None else start
+    rng = random.Random(seed)
+    released = {}
+    count = 0
+    stage_start = start
+    for stage in stages:
+        released[stage.name] = 0
+        for offset in stage.offsets(arrival, rng):
+            intended = stage_start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            submit(count, intended, stage.name)
+            released[stage.name] += 1
+            count += 1
+        stage_start += stage.duration_s
+    return released
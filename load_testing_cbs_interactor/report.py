@@ -0,0 +1,282 @@
+"""
+Latency and throughput report for run_load_test.py.
+
+Every finished request (a compact record from sink.py) is folded into three histograms (grpc_metrics.LatencyHistogram):
+    open        — open request sent → open response
+    confirm     — open response → confirm response (only when the open succeeded)
+    end_to_end  — intended start → done (intended start = send time in closed-loop mode)
+plus outcome counters and per-second completion buckets. The report prints a console
+summary and dumps machine-readable JSON (histograms included, so runs can be merged or
+compared later). Reports of worker processes (--processes) are combined with merge().
+In profile mode every result carries its stage name and is also counted per stage, so
+the stage where latency bends or errors start shows up in the stage table. Results are
+also broken down by operation code (mixed-workload scenarios).
+"""
+import json
+from datetime import datetime
+
+from grpc_metrics import LatencyHistogram
+
+PHASES = ("open", "confirm", "end_to_end")
+PERCENTILES = (50, 90, 99, 99.9)
+MAX_ERROR_SAMPLES = 50
+
+
+def _new_code_entry():
+    return {
+        "outcomes": {"success": 0, "error_response": 0, "exception": 0},
+        "error_codes": {},
+        "open": LatencyHistogram(),
+        "end_to_end": LatencyHistogram(),
+    }
+
+
+class LoadReport:
+    """Phase histograms, outcome counters and per-second throughput of one run."""
+
+    def __init__(self, started_at):
+        """
+        Args:
+            started_at: time.perf_counter() at the start of the run (second 0 of the timeline)
+        """
+        self.started_at = started_at
+        self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+        self.send_lag = LatencyHistogram()  # intended start → sent (open loop)
+        self.outcomes = {"success": 0, "error_response": 0, "exception": 0}
+        self.per_second = {}
+        self.errors = []  # first MAX_ERROR_SAMPLES error descriptions
+        self.released = 0  # requests released by the open-loop scheduler
+        self.stages = {}  # stage name → target rates, released, outcomes, end-to-end histogram
+        self.counters = {}  # run counters summed across processes (e.g. session pool stats)
+        self.codes = {}  # operation code → outcomes, error codes, open and end-to-end histograms
+        self.elapsed_s = 0.0
+
+    def add(self, record):
+        """Folds one compact record (sink.compact_record) into the report."""
+        outcome = record["status"]
+        self.outcomes[outcome] += 1
+        if record["opened"] is not None:
+            self.histograms["open"].record((record["opened"] - record["sent"]) * 1000)
+            if record["open_ok"]:
+                self.histograms["confirm"].record((record["done"] - record["opened"]) * 1000)
+        self.histograms["end_to_end"].record((record["done"] - record["intended"]) * 1000)
+        self.send_lag.record((record["sent"] - record["intended"]) * 1000)
+        if outcome != "success" and len(self.errors) < MAX_ERROR_SAMPLES:
+            self.errors.append(f"Thread {record['thread']} req {record['index']}: {record['error']}")
+
+        code = self.codes.get(record["code"])
+        if code is None:
+            code = self.codes[record["code"]] = _new_code_entry()
+        code["outcomes"][outcome] += 1
+        if record["error_code"]:
+            code["error_codes"][record["error_code"]] = code["error_codes"].get(record["error_code"], 0) + 1
+        if record["opened"] is not None:
+            code["open"].record((record["opened"] - record["sent"]) * 1000)
+        code["end_to_end"].record((record["done"] - record["intended"]) * 1000)
+
+        stage = self.stages.get(record["stage"])
+        if stage is not None:
+            stage["outcomes"][outcome] += 1
+            stage["end_to_end"].record((record["done"] - record["intended"]) * 1000)
+
+        second = max(0, int(record["done"] - self.started_at))
+        bucket = self.per_second.setdefault(second, {"completed": 0, "success": 0})
+        bucket["completed"] += 1
+        if outcome == "success":
+            bucket["success"] += 1
+
+    def add_stage(self, name, start_rps, end_rps, duration_s, released=0):
+        """Registers a profile stage; results tagged with this name are counted in it."""
+        self.stages[name] = {
+            "start_rps": start_rps, "end_rps": end_rps, "duration_s": duration_s, "released": released,
+            "outcomes": {"success": 0, "error_response": 0, "exception": 0},
+            "end_to_end": LatencyHistogram(),
+        }
+
+    def finish(self, finished_at):
+        self.elapsed_s = finished_at - self.started_at
+
+    def merge(self, other):
+        """
+        Folds another report into this one (same timeline: workers start at the same moment).
+
+        Elapsed time is the longest of the two, everything else is summed.
+        """
+        for phase, histogram in self.histograms.items():
+            histogram.merge(other.histograms[phase])
+        self.send_lag.merge(other.send_lag)
+        for outcome, count in other.outcomes.items():
+            self.outcomes[outcome] += count
+        for second, bucket in other.per_second.items():
+            own = self.per_second.setdefault(second, {"completed": 0, "success": 0})
+            own["completed"] += bucket["completed"]
+            own["success"] += bucket["success"]
+        self.errors.extend(other.errors[:MAX_ERROR_SAMPLES - len(self.errors)])
+        self.released += other.released
+        for name, entry in other.codes.items():
+            own = self.codes.setdefault(name, _new_code_entry())
+            for outcome, count in entry["outcomes"].items():
+                own["outcomes"][outcome] += count
+            for error_code, count in entry["error_codes"].items():
+                own["error_codes"][error_code] = own["error_codes"].get(error_code, 0) + count
+            own["open"].merge(entry["open"])
+            own["end_to_end"].merge(entry["end_to_end"])
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, stage in other.stages.items():
+            if name not in self.stages:
+                self.add_stage(name, 0, 0, stage["duration_s"])
+            own = self.stages[name]
+            # Каждый процесс держит свою долю rps, цели и счетчики складываются
+            for key in ("start_rps", "end_rps", "released"):
+                own[key] += stage[key]
+            for outcome, count in stage["outcomes"].items():
+                own["outcomes"][outcome] += count
+            own["end_to_end"].merge(stage["end_to_end"])
+        self.elapsed_s = max(self.elapsed_s, other.elapsed_s)
+        return self
+
+    @property
+    def total(self):
+        return sum(self.outcomes.values())
+
+    def throughput_series(self):
+        """[{second, completed, success}] for every second of the run, including empty ones."""
+        last = max(self.per_second) if self.per_second else -1
+        return [
+            {"second": second, **self.per_second.get(second, {"completed": 0, "success": 0})}
+            for second in range(last + 1)
+        ]
+
+    def to_dict(self):
+        return {
+            "elapsed_s": round(self.elapsed_s, 3),
+            "total": self.total,
+            "outcomes": dict(self.outcomes),
+            "throughput_rps": round(self.total / self.elapsed_s, 2) if self.elapsed_s else 0.0,
+            "latency": {phase: histogram.summary(PERCENTILES) for phase, histogram in self.histograms.items()},
+            "throughput_per_second": self.throughput_series(),
+            "histograms": {phase: histogram.to_dict() for phase, histogram in self.histograms.items()},
+            "send_lag": self.send_lag.to_dict(),
+            "released": self.released,
+            "counters": dict(self.counters),
+            "codes": {
+                name: {
+                    "outcomes": dict(entry["outcomes"]),
+                    "error_codes": dict(entry["error_codes"]),
+                    "open": entry["open"].summary(PERCENTILES),
+                    "end_to_end": entry["end_to_end"].summary(PERCENTILES),
+                    "histograms": {"open": entry["open"].to_dict(), "end_to_end": entry["end_to_end"].to_dict()},
+                }
+                for name, entry in self.codes.items()
+            },
+            "stages": [
+                {
+                    "name": name,
+                    **{key: stage[key] for key in ("start_rps", "end_rps", "duration_s", "released")},
+                    "outcomes": dict(stage["outcomes"]),
+                    "end_to_end": stage["end_to_end"].summary(PERCENTILES),
+                    "histogram": stage["end_to_end"].to_dict(),
+                }
+                for name, stage in self.stages.items()
+            ],
+            "errors": list(self.errors),
+        }
+
+    @classmethod
+    def from_dict(cls, raw):
+        """Rebuilds a report from to_dict() output (e.g. sent back by a worker process)."""
+        report = cls(None)
+        report.elapsed_s = raw["elapsed_s"]
+        report.outcomes.update(raw["outcomes"])
+        report.histograms = {phase: LatencyHistogram.from_dict(raw["histograms"][phase]) for phase in PHASES}
+        report.send_lag = LatencyHistogram.from_dict(raw["send_lag"])
+        report.per_second = {
+            bucket["second"]: {"completed": bucket["completed"], "success": bucket["success"]}
+            for bucket in raw["throughput_per_second"]
+            if bucket["completed"]
+        }
+        report.released = raw.get("released", 0)
+        report.counters = dict(raw.get("counters", {}))
+        for name, entry in raw.get("codes", {}).items():
+            own = report.codes[name] = _new_code_entry()
+            own["outcomes"].update(entry["outcomes"])
+            own["error_codes"].update(entry["error_codes"])
+            own["open"] = LatencyHistogram.from_dict(entry["histograms"]["open"])
+            own["end_to_end"] = LatencyHistogram.from_dict(entry["histograms"]["end_to_end"])
+        for stage in raw.get("stages", []):
+            report.add_stage(stage["name"], stage["start_rps"], stage["end_rps"], stage["duration_s"], stage["released"])
+            report.stages[stage["name"]]["outcomes"].update(stage["outcomes"])
+            report.stages[stage["name"]]["end_to_end"] = LatencyHistogram.from_dict(stage["histogram"])
+        report.errors = list(raw.get("errors", []))
+        return report
+
+    def format_console(self):
+        header = f"  {'phase':<12} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9} {'max ms':>9}"
+        lines = [header, "  " + "-" * (len(header) - 2)]
+        for phase, histogram in self.histograms.items():
+            lines.append(
+                f"  {phase:<12} {histogram.count:>7} "
+                + " ".join(f"{histogram.percentile(percent):>9.1f}" for percent in PERCENTILES)
+                + f" {histogram.max:>9.1f}"
+            )
+        series = [bucket["completed"] for bucket in self.throughput_series()]
+        if series:
+            lines.append(
+                f"  Throughput per second: min {min(series)}, mean {sum(series) / len(series):.1f}, "
+                f"max {max(series)} (overall {self.total / self.elapsed_s if self.elapsed_s else 0:.1f} rps)"
+            )
+        return "\n".join(lines)
+
+    def format_live(self, label=""):
+        """One-line running total for progress output during the run."""
+        end_to_end = self.histograms["end_to_end"]
+        prefix = f"[live {label}]" if label else "[live]"
+        return (f"  {prefix} completed {self.total}, success {self.outcomes['success']}, "
+                f"errors {self.outcomes['error_response'] + self.outcomes['exception']}, "
+                f"e2e p50 {end_to_end.percentile(50):.1f} ms, p99 {end_to_end.percentile(99):.1f} ms")
+
+    def format_codes(self):
+        """Per-operation-code table: share of traffic, errors (top codes) and latency."""
+        header = (f"  {'code':<28} {'count':>7} {'share':>7} {'errors':>7} {'open p99':>9} "
+                  f"{'e2e p50':>9} {'e2e p99':>9}  top errors")
+        lines = [header, "  " + "-" * (len(header) - 2)]
+        total = self.total or 1
+        for name, entry in sorted(self.codes.items(), key=lambda item: -sum(item[1]["outcomes"].values())):
+            count = sum(entry["outcomes"].values())
+            failed = count - entry["outcomes"]["success"]
+            top = sorted(entry["error_codes"].items(), key=lambda item: -item[1])[:3]
+            lines.append(
+                f"  {str(name)[:28]:<28} {count:>7} {100.0 * count / total:>6.1f}% "
+                f"{100.0 * failed / count if count else 0:>6.1f}% {entry['open'].percentile(99):>9.1f} "
+                f"{entry['end_to_end'].percentile(50):>9.1f} {entry['end_to_end'].percentile(99):>9.1f}  "
+                + ", ".join(f"{error_code} x{n}" for error_code, n in top)
+            )
+        return "\n".join(lines)
+
+    def format_stages(self):
+        """Per-stage table: target and released rate, errors and end-to-end latency."""
+        header = (f"  {'stage':<24} {'target rps':>12} {'sent rps':>9} {'count':>7} {'errors':>7} "
+                  f"{'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        lines = [header, "  " + "-" * (len(header) - 2)]
+        for name, stage in self.stages.items():
+            target = (f"{stage['start_rps']:g}" if stage["start_rps"] == stage["end_rps"]
+                      else f"{stage['start_rps']:g}-{stage['end_rps']:g}")
+            count = sum(stage["outcomes"].values())
+            failed = count - stage["outcomes"]["success"]
+            histogram = stage["end_to_end"]
+            lines.append(
+                f"  {name[:24]:<24} {target:>12} {stage['released'] / stage['duration_s'] if stage['duration_s'] else 0:>9.1f} "
+                f"{count:>7} {100.0 * failed / count if count else 0:>6.1f}% "
+                f"{histogram.percentile(50):>9.1f} {histogram.percentile(99):>9.1f} {histogram.max:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def dump_json(self, path=None, extra=None):
+        """Writes the report (plus extra fields, e.g. the run config) and returns the path."""
+        path = path or f"load_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        payload = dict(extra or {})
+        payload.update(self.to_dict())
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        return path
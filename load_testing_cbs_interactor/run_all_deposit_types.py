@@ -1,24 +1,30 @@
 """
 Отправка всех видов депозитов из deposit_cases.json по одному запросу (open + confirm).
-Не нагрузочный тест — один проход по кейсам. Новые кейсы добавляются в deposit_cases.json.
+Не нагрузочный тест — один проход по кейсам: сначала конкурентно открываются все депозиты,
+затем конкурентно подтверждаются, поэтому ответы кейсы ждут одновременно.
+Новые кейсы добавляются в deposit_cases.json.
 """
 import json
 import os
 import sys
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROTO_PATH = os.path.join(REPO_ROOT, "protofiles")
 sys.path.insert(0, PROTO_PATH)
+sys.path.insert(0, REPO_ROOT)
 
 import grpc
 import protofile_pb2 as pb2
 import protofile_pb2_grpc as pb2_grpc
+from grpc_policy import CallPolicy
 
 CASES_PATH = os.path.join(os.path.dirname(__file__), "deposit_cases.json")
 DEFAULT_REQUEST_CODE = "MAKE_TXN_SHOP_OPERATION"
 CODE_CONFIRM_TRANSFER = "CONFIRM_TRANSFER"
+DEFAULT_CONCURRENCY = 10  # Сколько open/confirm запросов держать в полете (ключ "concurrency" в deposit_cases.json)
 
 
 def load_cases():
@@ -31,6 +37,13 @@ def load_cases():
     return cfg
 
 
+def open_channel(cfg, options):
+    """TLS channel to the stand, or plaintext when grpc_credentials is "insecure" (local fake_server.py)."""
+    if cfg.get("grpc_credentials") == "insecure":
+        return grpc.insecure_channel(cfg["grpc_server_url"], options=options)
+    return grpc.secure_channel(cfg["grpc_server_url"], grpc.ssl_channel_credentials(), options=options)
+
+
 def make_metadata(cfg):
     return (
         ("refid", str(uuid.uuid1())),
@@ -40,15 +53,15 @@ def make_metadata(cfg):
     )
 
 
-def run_one_case(cfg, case, index):
+def build_case(cfg, case, index):
     """
-    Один кейс: открытие депозита (MAKE_TXN_SHOP_OPERATION) + подтверждение (CONFIRM_TRANSFER).
-    Возвращает (name, success, response_or_error_text).
+    Payload of the deposit opening (MAKE_TXN_SHOP_OPERATION) for one case.
+    Возвращает (name, operation_id, payload); payload = None, если не задан счет списания.
     """
     name = case.get("name", f"Кейс {index + 1}")
     account_id = case.get("accountDebitId") or cfg.get("default_account_debit_id")
     if not account_id:
-        return (name, False, "Не задан accountDebitId и default_account_debit_id")
+        return (name, None, None)
 
     data = {
         "depositType": case.get("depositType", ""),
@@ -81,36 +94,59 @@ def run_one_case(cfg, case, index):
         "data": data,
         "txnId": None,
     }
+    return (name, operation_id, payload)
+
+
+def send(stub, policy, cfg, code, data_dict):
+    """
+    One makeWebTransfer call; returns None on success, otherwise the error text.
+    """
+    req = pb2.IncomingWebTransfer(code=code, data=json.dumps(data_dict))
+    try:
+        resp = policy.invoke(stub.makeWebTransfer, req, make_metadata(cfg))
+    except Exception as e:
+        return str(e)
+    if not getattr(resp, "success", False):
+        return str(getattr(resp, "error", resp))
+    return None
+
 
-    metadata = make_metadata(cfg)
+def run_cases(cfg, cases, policy):
+    """
+    Все кейсы в две фазы: сначала конкурентно открываются все депозиты, затем конкурентно
+    подтверждаются успешно открытые (не больше cfg["concurrency"] запросов в полете).
+    Возвращает [(name, success, error_text)] в порядке cases.
+    """
     request_code = cfg.get("request_code") or DEFAULT_REQUEST_CODE
+    otp = cfg.get("otp") or "111111"
+    concurrency = max(1, min(cfg.get("concurrency", DEFAULT_CONCURRENCY), len(cases)))
     grpc_opts = cfg.get("grpc_options")
     options = [tuple(o) for o in grpc_opts] if grpc_opts else [("grpc.enable_http_proxy", 0), ("grpc.keepalive_timeout_ms", 10000)]
+    built = [build_case(cfg, case, i) for i, case in enumerate(cases)]
 
-    def do_request(code, data_dict):
-        req = pb2.IncomingWebTransfer(code=code, data=json.dumps(data_dict))
-        with grpc.secure_channel(
-            cfg["grpc_server_url"],
-            grpc.ssl_channel_credentials(),
-            options=options,
-        ) as channel:
-            stub = pb2_grpc.WebTransferApiStub(channel)
-            return stub.makeWebTransfer(req, metadata=metadata)
+    with open_channel(cfg, options) as channel, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        stub = pb2_grpc.WebTransferApiStub(channel)
 
-    try:
-        open_resp = do_request(request_code, payload)
-        if not getattr(open_resp, "success", False):
-            err = getattr(open_resp, "error", open_resp)
-            return (name, False, str(err))
-
-        otp = cfg.get("otp") or "111111"
-        confirm_resp = do_request(CODE_CONFIRM_TRANSFER, {"operationId": operation_id, "otp": otp})
-        if not getattr(confirm_resp, "success", False):
-            err = getattr(confirm_resp, "error", confirm_resp)
-            return (name, False, f"Confirm: {err}")
-        return (name, True, None)
-    except Exception as e:
-        return (name, False, str(e))
+        def open_deposit(item):
+            _, _, payload = item
+            if payload is None:
+                return "Не задан accountDebitId и default_account_debit_id"
+            return send(stub, policy, cfg, request_code, payload)
+
+        def confirm_deposit(item):
+            (_, operation_id, _), open_error = item
+            if open_error is not None:
+                return None
+            error = send(stub, policy, cfg, CODE_CONFIRM_TRANSFER, {"operationId": operation_id, "otp": otp})
+            return f"Confirm: {error}" if error is not None else None
+
+        open_errors = list(executor.map(open_deposit, built))
+        confirm_errors = list(executor.map(confirm_deposit, zip(built, open_errors)))
+
+    return [
+        (name, open_error is None and confirm_error is None, open_error or confirm_error)
+        for (name, _, _), open_error, confirm_error in zip(built, open_errors, confirm_errors)
+    ]
 
 
 def main():
@@ -120,10 +156,11 @@ def main():
     print(f"  session: {cfg['session_key'][:12]}...")
     print()
 
-    results = []
-    for i, case in enumerate(cases):
-        name, ok, err = run_one_case(cfg, case, i)
-        results.append((name, ok, err))
+    # Дедлайны и повторы из секции call_policy (без нее — дедлайн 30 с, без повторов)
+    policy = CallPolicy.from_config(cfg.get("call_policy"))
+
+    results = run_cases(cfg, cases, policy)
+    for name, ok, err in results:
         status = "OK" if ok else "FAIL"
         print(f"  [{status}] {name}")
         if not ok and err:
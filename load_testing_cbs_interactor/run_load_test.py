@@ -2,154 +2,627 @@
 Load testing: deposit opening requests to CBS interactor (gRPC).
 Config and request data are in config.json — no DB, session_key and payload are edited there.
 """
+import argparse
+import itertools
 import json
+from datetime import datetime
+import math
+import multiprocessing
 import os
 import sys
 import time
 import uuid
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 # Parent repo: protofiles and grpc
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROTO_PATH = os.path.join(REPO_ROOT, "protofiles")
 sys.path.insert(0, PROTO_PATH)
+sys.path.insert(0, REPO_ROOT)
 
-import grpc
 import protofile_pb2 as pb2
-import protofile_pb2_grpc as pb2_grpc
+from grpc_policy import CallPolicy
+from fake_server import FakeServer, FakeServerConfig
+from fast_payload import PayloadTemplate, OPERATION_ID_SLOT, REQUEST_ID_SLOT
+from transport import ChannelPool
+from open_loop import run_open_loop, run_profile, expand_profile
+from report import LoadReport
+from sink import ResultSink
+from session_pool import SessionPool, ERROR_INVALID_SESSION_KEY
+from capacity import Slo, evaluate, search_capacity, format_curve, PROBE_STAGE, WARMUP_STAGE
+from workloads import Scenario, DEFAULT_REQUEST_CODE, resolve_scenario_path
+from baseline import config_hash, save_baseline, load_baseline, compare, print_comparison
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
-DEFAULT_REQUEST_CODE = "MAKE_TXN_SHOP_OPERATION"
 CODE_CONFIRM_TRANSFER = "CONFIRM_TRANSFER"
+WORKER_START_DELAY_S = 0.2  # запас между рассылкой времени старта и самим стартом воркеров
+# Сквозной номер запроса в процессе: thread_id/request_index повторяются между воркерами и в open loop
+_REQUEST_SEQ = itertools.count()
 
 
-def load_config():
-    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+def load_config(path=CONFIG_PATH):
+    with open(path, "r", encoding="utf-8") as f:
         cfg = json.load(f)
-    if not cfg.get("session_key"):
+    sessions_cfg = cfg.get("sessions") or {}
+    if not cfg.get("session_key") and sessions_cfg.get("source", "config") == "config" and not sessions_cfg.get("session_keys"):
         raise ValueError(
-            "В config.json заполните session_key (и при необходимости остальные поля запроса)."
+            "В config.json заполните session_key или секцию sessions (и при необходимости остальные поля запроса)."
         )
     return cfg
 
 
-def make_metadata(cfg):
+def make_metadata(cfg, session_key=None):
     return (
         ("refid", str(uuid.uuid1())),
-        ("sessionkey", cfg["session_key"]),
+        ("sessionkey", session_key or cfg["session_key"]),
         ("device-type", cfg["device_type"]),
         ("user-agent-c", cfg["user_agent"]),
     )
 
 
-def make_grpc_deposit_request(cfg, request_index, thread_id):
-    """One gRPC deposit request. Returns (thread_id, request_index, response_or_exception)."""
-    raw = cfg["deposit_request"]
-    data = {k: v for k, v in raw.items() if not (isinstance(k, str) and k.startswith("_"))}
-    operation_id = str(uuid.uuid4())
-    data["operationId"] = operation_id
-    data["requestId"] = f"IB{int(time.time() * 1000)}_{thread_id}_{request_index}"
-    data["txnId"] = None
-    if "depositTypeId" not in data and "depositId" in data:
-        data["depositTypeId"] = data["depositId"]
-
-    product_type = data.get("productType", "makeDepositApplication")
-    payload = {
-        "operationId": operation_id,
-        "productType": product_type,
-        "data": data,
-        "txnId": None,
+def build_payload_templates(cfg, scenario):
+    """
+    Pre-serialized request templates for the preserialized_requests mode:
+    ({workload name: open template}, confirm template).
+    """
+    operation_id = PayloadTemplate.slot(OPERATION_ID_SLOT)
+    request_id = PayloadTemplate.slot(REQUEST_ID_SLOT)
+    otp = cfg.get("otp") or "111111"
+    return (
+        {
+            workload.name: PayloadTemplate(workload.code, workload.build(cfg, operation_id, request_id))
+            for workload in scenario.workloads
+        },
+        PayloadTemplate(CODE_CONFIRM_TRANSFER, {"operationId": operation_id, "otp": otp}),
+    )
+
+
+def _invalid_session(response):
+    return response is not None and not getattr(response, "success", True) and \
+        getattr(getattr(response, "error", None), "code", None) == ERROR_INVALID_SESSION_KEY
+
+
+def make_grpc_deposit_request(cfg, request_index, thread_id, policy, pool, templates=None, intended_start=None,
+                              stage=None, sessions=None, scenario=None):
+    """
+    One gRPC operation (open + confirm): the workload is picked from scenario (weighted),
+    by default the deposit opening from config.json.
+
+    The session comes from sessions (SessionPool, affinity to the calling thread). When the
+    open is rejected with INVALID_SESSION_KEY the session is rotated and the open is sent
+    once more; a rejected confirm only rotates the session for the following requests.
+
+    Returns (thread_id, request_index, response, exception, timings); timings holds
+    time.perf_counter() marks: intended (scheduled start in open-loop mode, else = sent),
+    sent, opened (open response received), open_ok and done, plus the profile stage name,
+    the workload and its operation code.
+    """
+    scenario = scenario or Scenario.from_config(cfg)
+    workload = scenario.pick()
+    sent = time.perf_counter()
+    timings = {
+        "intended": sent if intended_start is None else intended_start,
+        "sent": sent, "opened": None, "open_ok": False, "done": None, "stage": stage,
+        "workload": workload.name, "code": workload.code,
     }
+    operation_id = str(uuid.uuid4())
+    request_id = f"IB{int(time.time() * 1000)}_{cfg.get('worker_index', 0)}_{next(_REQUEST_SEQ)}"
 
-    metadata = make_metadata(cfg)
-    request_code = cfg.get("request_code") or DEFAULT_REQUEST_CODE
+    session = sessions.acquire() if sessions is not None else None
+    metadata = make_metadata(cfg, session.key if session else None)
+    request_code = workload.code
 
-    grpc_opts = cfg.get("grpc_options")
-    if grpc_opts:
-        options = [tuple(o) for o in grpc_opts]
-    else:
-        options = [("grpc.enable_http_proxy", 0), ("grpc.keepalive_timeout_ms", 10000)]
     def do_request(code, data_dict):
         req = pb2.IncomingWebTransfer(code=code, data=json.dumps(data_dict))
-        with grpc.secure_channel(
-            cfg["grpc_server_url"],
-            grpc.ssl_channel_credentials(),
-            options=options,
-        ) as channel:
-            stub = pb2_grpc.WebTransferApiStub(channel)
-            return stub.makeWebTransfer(req, metadata=metadata)
+        return pool.invoke(policy, code, req, metadata)
+
+    def do_raw_request(code, request_bytes):
+        return pool.invoke(policy, code, request_bytes, metadata)
+
+    def do_open():
+        if templates is not None:
+            return do_raw_request(request_code, templates[0][workload.name].render(operation_id, request_id))
+        return do_request(request_code, workload.build(cfg, operation_id, request_id))
 
     try:
-        open_resp = do_request(request_code, payload)
-        if not getattr(open_resp, "success", False):
-            return (thread_id, request_index, open_resp, None)
-
-        otp = cfg.get("otp") or "111111"
-        confirm_payload = {"operationId": operation_id, "otp": otp}
-        confirm_resp = do_request(CODE_CONFIRM_TRANSFER, confirm_payload)
-        return (thread_id, request_index, confirm_resp, None)
+        open_resp = do_open()
+        if session is not None and _invalid_session(open_resp):
+            sessions.invalidate(session)
+            session = sessions.acquire()
+            metadata = make_metadata(cfg, session.key)
+            open_resp = do_open()
+        timings["opened"] = time.perf_counter()
+        timings["open_ok"] = bool(getattr(open_resp, "success", False))
+        if not timings["open_ok"]:
+            result = (thread_id, request_index, open_resp, None, timings)
+        else:
+            if templates is not None:
+                confirm_resp = do_raw_request(CODE_CONFIRM_TRANSFER, templates[1].render(operation_id))
+            else:
+                otp = cfg.get("otp") or "111111"
+                confirm_payload = {"operationId": operation_id, "otp": otp}
+                confirm_resp = do_request(CODE_CONFIRM_TRANSFER, confirm_payload)
+            if session is not None and _invalid_session(confirm_resp):
+                sessions.invalidate(session)
+            result = (thread_id, request_index, confirm_resp, None, timings)
     except Exception as e:
-        return (thread_id, request_index, None, e)
+        result = (thread_id, request_index, None, e, timings)
+    timings["done"] = time.perf_counter()
+    return result
+
 
+def record_deposit_request(sink, *args, **kwargs):
+    """make_grpc_deposit_request whose result goes straight to the sink (nothing is retained)."""
+    sink.record(make_grpc_deposit_request(*args, **kwargs))
 
-def run_thread(cfg, thread_id, results_list, lock):
+
+def run_thread(cfg, thread_id, sink, policy, pool, executor, templates=None, sessions=None, scenario=None):
     num_requests = cfg["num_requests_per_thread"]
     wait_for_response = cfg["wait_for_response"]
 
     if wait_for_response:
         for i in range(num_requests):
-            out = make_grpc_deposit_request(cfg, i, thread_id)
-            with lock:
-                results_list.append(out)
+            record_deposit_request(sink, cfg, i, thread_id, policy, pool, templates,
+                                   sessions=sessions, scenario=scenario)
+    else:
+        # Общий executor на max_in_flight потоков вместо своего пула на num_requests потоков;
+        # завершения ждет executor.shutdown() в run_load
+        for i in range(num_requests):
+            executor.submit(record_deposit_request, sink, cfg, i, thread_id, policy, pool, templates,
+                            sessions=sessions, scenario=scenario)
+
+
+def run_open_loop_mode(cfg, sink, policy, pool, executor, templates=None, sessions=None, scenario=None):
+    """Releases requests at open_loop.rps for open_loop.duration_s regardless of response times."""
+    open_cfg = cfg["open_loop"]
+
+    def submit(index, intended_start):
+        executor.submit(record_deposit_request, sink, cfg, index, 0, policy, pool, templates, intended_start,
+                        sessions=sessions, scenario=scenario)
+
+    released = run_open_loop(
+        submit, open_cfg["rps"], open_cfg["duration_s"],
+        arrival=open_cfg.get("arrival", "fixed"), seed=open_cfg.get("seed"),
+        start=time.perf_counter() + open_cfg.get("start_offset_s", 0.0),
+    )
+    return released
+
+
+def selected_profile(cfg):
+    """The profile named by cfg["profile"] from cfg["profiles"]."""
+    name = cfg.get("profile")
+    profiles = cfg.get("profiles") or {}
+    if name not in profiles:
+        raise ValueError(f"Профиль '{name}' не найден в profiles, доступны: {sorted(profiles)}")
+    return profiles[name]
+
+
+def profile_stages(cfg):
+    profile = selected_profile(cfg)
+    return expand_profile(profile["stages"], profile.get("rps_scale", 1.0))
+
+
+def run_profile_mode(cfg, stages, sink, policy, pool, executor, templates=None, sessions=None, scenario=None):
+    """Runs the profile's stages open-loop; returns {stage name: released}."""
+    profile = selected_profile(cfg)
+
+    def submit(index, intended_start, stage):
+        executor.submit(record_deposit_request, sink, cfg, index, 0, policy, pool, templates, intended_start, stage,
+                        sessions=sessions, scenario=scenario)
+
+    return run_profile(
+        submit, stages, arrival=profile.get("arrival", "fixed"), seed=profile.get("seed"),
+        start=time.perf_counter() + profile.get("start_offset_s", 0.0),
+    )
+
+
+def print_open_loop_summary(cfg, report):
+    """Send lag and latency measured from the intended vs the actual send time."""
+    open_cfg = cfg["open_loop"]
+    released = report.released
+    print(f"  Open loop: target {open_cfg['rps']} rps ({open_cfg.get('arrival', 'fixed')}), "
+          f"released {released} in {open_cfg['duration_s']} s = {released / open_cfg['duration_s']:.1f} rps")
+    for title, histogram in (("send lag", report.send_lag),
+                             ("latency from intended start", report.histograms["end_to_end"]),
+                             ("open from actual send", report.histograms["open"])):
+        print(f"    {title:<28} p50 {histogram.percentile(50):9.1f} ms  p99 {histogram.percentile(99):9.1f} ms  "
+              f"max {histogram.max:9.1f} ms")
+
+
+def run_load(cfg, wait_for_start=None, label="", worker_index=0, processes=1):
+    """
+    Runs the configured load (closed or open loop) in this process.
+
+    Args:
+        cfg: Config (grpc_server_url already points at the target)
+        wait_for_start: Called after the channels are set up; blocks until the common start
+            and returns it as time.perf_counter() (worker processes start together)
+        label: Worker label for live output
+        worker_index, processes: This worker's slice of the session pool
+
+    Returns:
+        LoadReport of this process
+    """
+    load_mode = cfg.get("load_mode", "closed")
+    wait = cfg["wait_for_response"]
+
+    # Дедлайны и повторы из секции call_policy (без нее — дедлайн 30 с, без повторов)
+    policy = CallPolicy.from_config(cfg.get("call_policy"))
+
+    # Смесь операций (сценарий) и заранее сериализованные шаблоны запросов (без json.dumps/protobuf в цикле)
+    scenario = Scenario.from_config(cfg)
+    templates = build_payload_templates(cfg, scenario) if cfg.get("preserialized_requests") else None
+
+    # Сессии: у каждого потока своя, смена при INVALID_SESSION_KEY
+    sessions = SessionPool.from_config(cfg, worker_index, processes)
+
+    # Общие каналы (round-robin) и ограничение числа одновременных RPC
+    pool = ChannelPool.from_config(cfg)
+    executor = None if wait and load_mode == "closed" else ThreadPoolExecutor(max_workers=pool.max_in_flight)
+
+    threads = []
+    t0 = wait_for_start() if wait_for_start is not None else time.perf_counter()
+
+    # Результаты не копятся: компактные записи идут через буферы потоков в поток записи,
+    # который обновляет отчет и пишет results_path
+    report = LoadReport(t0)
+    sink = ResultSink.from_config(cfg, report, label)
+    if load_mode == "open":
+        report.released = run_open_loop_mode(cfg, sink, policy, pool, executor, templates, sessions, scenario)
+    elif load_mode == "profile":
+        # Этапы регистрируются до старта: поток записи раскладывает по ним результаты на лету
+        stages = profile_stages(cfg)
+        for stage in stages:
+            report.add_stage(stage.name, stage.start_rps, stage.end_rps, stage.duration_s)
+        released = run_profile_mode(cfg, stages, sink, policy, pool, executor, templates, sessions, scenario)
+        for name, count in released.items():
+            report.stages[name]["released"] = count
+        report.released = sum(released.values())
     else:
-        with ThreadPoolExecutor(max_workers=num_requests) as executor:
-            futures = [
-                executor.submit(make_grpc_deposit_request, cfg, i, thread_id)
-                for i in range(num_requests)
-            ]
-            for fut in as_completed(futures):
-                with lock:
-                    results_list.append(fut.result())
-
-
-def main():
-    cfg = load_config()
+        for tid in range(cfg["num_threads"]):
+            t = threading.Thread(target=run_thread, args=(cfg, tid, sink, policy, pool, executor, templates, sessions, scenario))
+            threads.append(t)
+            t.start()
+
+        for t in threads:
+            t.join()
+
+    if executor is not None:
+        executor.shutdown()
+    finished_at = time.perf_counter()
+    pool.close()
+    sessions.close()
+
+    sink.close()
+    report.counters.update(sessions.stats())
+    report.finish(finished_at)
+    return report
+
+
+def split_config(cfg, worker_index, processes):
+    """
+    Worker's share of the load: threads (closed loop) or rps (open loop and profile stages),
+    channels and in-flight limit are divided between the processes; each worker writes
+    its own results file (<results_path>.w<N>).
+    """
+    def share(total):
+        return total // processes + (1 if worker_index < total % processes else 0)
+
+    cfg = json.loads(json.dumps(cfg))
+    cfg["worker_index"] = worker_index
+    cfg["num_threads"] = share(cfg["num_threads"])
+    cfg["num_channels"] = max(1, math.ceil(cfg.get("num_channels", 4) / processes))
+    cfg["max_in_flight"] = max(1, math.ceil(cfg.get("max_in_flight", 64) / processes))
+    open_cfg = cfg.get("open_loop")
+    if open_cfg:
+        rps = open_cfg["rps"]
+        open_cfg["rps"] = rps / processes
+        if open_cfg.get("seed") is not None:
+            open_cfg["seed"] += worker_index
+        if open_cfg.get("arrival", "fixed") == "fixed" and rps > 0:
+            # Сдвиг фазы: сумма равномерных расписаний воркеров остается равномерной
+            open_cfg["start_offset_s"] = worker_index / rps
+    for profile in (cfg.get("profiles") or {}).values():
+        profile["rps_scale"] = 1.0 / processes
+        if profile.get("seed") is not None:
+            profile["seed"] += worker_index
+        peak_rps = max((max(stage.start_rps, stage.end_rps) for stage in expand_profile(profile["stages"])), default=0)
+        if profile.get("arrival", "fixed") == "fixed" and peak_rps > 0:
+            # Тот же сдвиг фазы по пиковой скорости: на пике расписания чередуются точно, ниже — без пачек по N
+            profile["start_offset_s"] = worker_index / peak_rps
+    if cfg.get("results_path"):
+        base, ext = os.path.splitext(cfg["results_path"])
+        cfg["results_path"] = f"{base}.w{worker_index}{ext}"
+    return cfg
+
+
+def _worker_main(cfg, worker_index, processes, conn):
+    """Worker process: own channels and in-flight limit, report goes back through the pipe."""
+    try:
+        cfg = split_config(cfg, worker_index, processes)
+
+        def wait_for_start():
+            conn.send(("ready", None))
+            start_at = conn.recv()
+            time.sleep(max(0.0, start_at - time.time()))
+            return time.perf_counter()
+
+        report = run_load(cfg, wait_for_start, label=f"w{worker_index}",
+                          worker_index=worker_index, processes=processes)
+        conn.send(("report", report.to_dict()))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _receive(conn, worker_index, expected):
+    try:
+        kind, payload = conn.recv()
+    except EOFError:
+        raise RuntimeError(f"Worker process {worker_index} exited unexpectedly")
+    if kind == "error":
+        raise RuntimeError(f"Worker process {worker_index} failed: {payload}")
+    if kind != expected:
+        raise RuntimeError(f"Worker process {worker_index}: expected {expected}, got {kind}")
+    return payload
+
+
+def run_processes(cfg, processes):
+    """
+    Runs the load in N worker processes and merges their reports.
+
+    Workers are spawned (not forked: the parent may already hold gRPC state), set up their
+    channels, report ready and start together at a common wall-clock moment, so their
+    per-second buckets line up.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    workers = []
+    for index in range(processes):
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, args=(cfg, index, processes, child_conn), daemon=True)
+        process.start()
+        child_conn.close()
+        workers.append((process, parent_conn))
+
+    try:
+        for index, (_, conn) in enumerate(workers):
+            _receive(conn, index, "ready")
+        start_at = time.time() + WORKER_START_DELAY_S
+        for _, conn in workers:
+            conn.send(start_at)
+
+        report = None
+        for index, (_, conn) in enumerate(workers):
+            worker_report = LoadReport.from_dict(_receive(conn, index, "report"))
+            report = worker_report if report is None else report.merge(worker_report)
+        return report
+    finally:
+        for process, conn in workers:
+            conn.close()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+def probe_config(cfg, rps):
+    """Config of one capacity probe: warm-up and measurement window at rps, as a profile."""
+    capacity = cfg.get("capacity") or {}
+    cfg = json.loads(json.dumps(cfg))
+    stages = []
+    if capacity.get("warmup_s", 5):
+        stages.append({"type": "constant", "name": WARMUP_STAGE, "rps": rps, "duration_s": capacity.get("warmup_s", 5)})
+    stages.append({"type": "constant", "name": PROBE_STAGE, "rps": rps, "duration_s": capacity.get("window_s", 30)})
+    cfg["load_mode"] = "profile"
+    cfg["profile"] = "_capacity_probe"
+    cfg["profiles"] = {"_capacity_probe": {
+        "arrival": capacity.get("arrival", "poisson"), "seed": capacity.get("seed"), "stages": stages,
+    }}
+    cfg["results_path"] = None
+    cfg["live_interval_s"] = 0
+    return cfg
+
+
+def run_capacity_search(cfg, processes):
+    """Searches the highest rate within the SLO; returns (knee rps or None, probes)."""
+    capacity = cfg.get("capacity") or {}
+    slo = Slo.from_config(capacity.get("slo"))
+    cooldown_s = capacity.get("cooldown_s", 2)
+
+    def probe(rps):
+        probe_cfg = probe_config(cfg, rps)
+        report = run_processes(probe_cfg, processes) if processes > 1 else run_load(probe_cfg)
+        result = evaluate(rps, report.stages[PROBE_STAGE], slo)
+        print(f"  probe {rps:9.1f} rps: p99 {result.p99_ms:9.1f} ms, errors {result.error_rate:7.2%}, "
+              f"sent {result.sent_rps:9.1f} rps -> {'ok' if result.passed else 'FAIL (' + '; '.join(result.reasons) + ')'}")
+        time.sleep(cooldown_s)
+        return result
+
+    return search_capacity(
+        probe, capacity.get("start_rps", 10), capacity.get("max_rps", 2000),
+        growth=capacity.get("growth", 2.0), resolution_rps=capacity.get("resolution_rps", 5),
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test: deposit opening requests to CBS interactor")
+    parser.add_argument("--config", default=CONFIG_PATH, help="Path to config.json")
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="Worker processes, each with its own channels and in-flight limit (default: config 'processes' or 1)",
+    )
+    parser.add_argument("--profile", default=None, help="Run a load profile from config 'profiles' (sets load_mode=profile)")
+    parser.add_argument("--scenario", default=None, help="Mixed-workload scenario file (path or name in scenarios/)")
+    parser.add_argument("--capacity", action="store_true", help="Search the max rate within the SLO (sets load_mode=capacity)")
+    parser.add_argument("--save-baseline", default=None, metavar="NAME", help="Save this run as baseline NAME")
+    parser.add_argument(
+        "--compare-baseline", default=None, metavar="NAME",
+        help="Compare this run with baseline NAME (name in baselines/ or path); exit code 1 on regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cfg = load_config(args.config)
+    if args.scenario:
+        cfg["scenario"] = args.scenario
+    if args.profile:
+        cfg["load_mode"] = "profile"
+        cfg["profile"] = args.profile
+    if args.capacity:
+        cfg["load_mode"] = "capacity"
+    processes = args.processes or cfg.get("processes") or 1
     num_threads = cfg["num_threads"]
     num_per_thread = cfg["num_requests_per_thread"]
     wait = cfg["wait_for_response"]
+    load_mode = cfg.get("load_mode", "closed")
+    open_loop = load_mode == "open"
+    if load_mode not in ("closed", "open", "profile", "capacity"):
+        raise ValueError(f"Неизвестный load_mode: {load_mode}, ожидается closed, open, profile или capacity")
+    if processes < 1:
+        raise ValueError("--processes должен быть >= 1")
+    if load_mode == "capacity" and (args.save_baseline or args.compare_baseline):
+        raise ValueError("Базовые прогоны не поддерживаются для load_mode=capacity")
+    if load_mode == "closed" and num_threads < processes:
+        raise ValueError(f"num_threads ({num_threads}) меньше числа процессов ({processes}): часть воркеров останется без нагрузки")
 
     request_code = cfg.get("request_code") or DEFAULT_REQUEST_CODE
-    print(f"Load test: deposit opening (code={request_code})")
-    print(f"  Threads: {num_threads}, requests per thread: {num_per_thread}, wait_for_response: {wait}")
-    print(f"  Total requests: {num_threads * num_per_thread}")
-    print()
+    # До подстановки адреса fake-сервера и абсолютного пути сценария — иначе хеш менялся бы от запуска к запуску
+    cfg_hash = config_hash(dict(cfg, processes=processes))
+    if cfg.get("scenario"):
+        cfg["scenario"] = resolve_scenario_path(cfg["scenario"])
+    scenario = Scenario.from_config(cfg)
+    if cfg.get("scenario"):
+        print(f"Load test: scenario '{scenario.name}' ({os.path.basename(cfg['scenario'])})")
+        for workload in scenario.workloads:
+            print(f"  {workload.name:<24} {workload.code:<28} {scenario.shares()[workload.name]:6.1%}")
+    else:
+        print(f"Load test: deposit opening (code={request_code})")
+    if open_loop:
+        open_cfg = cfg["open_loop"]
+        print(f"  Open loop: {open_cfg['rps']} rps for {open_cfg['duration_s']} s, arrival: {open_cfg.get('arrival', 'fixed')}")
+    elif load_mode == "profile":
+        profile = selected_profile(cfg)
+        stages = profile_stages(cfg)
+        print(f"  Profile '{cfg['profile']}': {len(stages)} stages, {sum(s.duration_s for s in stages):g} s, "
+              f"arrival: {profile.get('arrival', 'fixed')}")
+        for stage in stages:
+            print(f"    {stage.name}: {stage.duration_s:g} s")
+    elif load_mode == "capacity":
+        capacity = cfg.get("capacity") or {}
+        slo = Slo.from_config(capacity.get("slo"))
+        print(f"  Capacity search: {capacity.get('start_rps', 10)}..{capacity.get('max_rps', 2000)} rps, "
+              f"x{capacity.get('growth', 2.0)} then binary to {capacity.get('resolution_rps', 5)} rps, "
+              f"probe {capacity.get('warmup_s', 5)} s warm-up + {capacity.get('window_s', 30)} s window")
+        print(f"  SLO: p99 <= {slo.p99_ms:g} ms, errors <= {slo.max_error_rate:.2%}")
+    else:
+        print(f"  Threads: {num_threads}, requests per thread: {num_per_thread}, wait_for_response: {wait}")
+        print(f"  Total requests: {num_threads * num_per_thread}")
 
-    results = []
-    lock = threading.Lock()
-    threads = []
-    t0 = time.perf_counter()
+    # Офлайн прогон: fake-сервер в этом (родительском) процессе вместо стенда
+    fake_server = None
+    fake_cfg = cfg.get("fake_server") or {}
+    if fake_cfg.get("enabled"):
+        fake_server = FakeServer(FakeServerConfig.from_dict(fake_cfg.get("config"))).start()
+        cfg["grpc_server_url"] = fake_server.address
+        cfg["grpc_credentials"] = "insecure"
+
+    num_channels = max(1, cfg.get("num_channels", 4))
+    max_in_flight = max(1, cfg.get("max_in_flight", 64))
+    if processes > 1:
+        print(f"  Processes: {processes}, per process: channels {math.ceil(num_channels / processes)}, "
+              f"max in flight {math.ceil(max_in_flight / processes)}")
+    else:
+        print(f"  Channels: {num_channels}, max in flight: {max_in_flight}")
+    print()
 
-    for tid in range(num_threads):
-        t = threading.Thread(target=run_thread, args=(cfg, tid, results, lock))
-        threads.append(t)
-        t.start()
+    try:
+        if load_mode == "capacity":
+            knee, probes = run_capacity_search(cfg, processes)
+        elif processes > 1:
+            report = run_processes(cfg, processes)
+        else:
+            report = run_load(cfg)
+    finally:
+        if fake_server is not None:
+            fake_server.stop()
 
-    for t in threads:
-        t.join()
+    if load_mode == "capacity":
+        print_capacity_result(cfg, knee, probes, processes)
+        return 0
 
-    elapsed = time.perf_counter() - t0
-    ok = sum(1 for r in results if len(r) >= 4 and r[3] is None and r[2] and getattr(r[2], "success", False))
-    err_resp = sum(1 for r in results if len(r) >= 4 and r[3] is None and r[2] and not getattr(r[2], "success", True))
-    exc = sum(1 for r in results if len(r) >= 4 and r[3] is not None)
+    ok, err_resp, exc = (report.outcomes[key] for key in ("success", "error_response", "exception"))
 
-    print(f"Done in {elapsed:.2f} s")
+    print(f"Done in {report.elapsed_s:.2f} s")
     print(f"  Success: {ok}, Error response: {err_resp}, Exception: {exc}")
-    if results and (err_resp or exc):
-        for r in results:
-            if len(r) >= 4 and (r[3] or (r[2] and not getattr(r[2], "success", True))):
-                print(f"    Thread {r[0]} req {r[1]}: {r[3] or getattr(r[2], 'error', r[2])}")
+    print(report.format_console())
+    if open_loop:
+        print_open_loop_summary(cfg, report)
+    if report.stages:
+        print(report.format_stages())
+    if len(report.codes) > 1:
+        print(report.format_codes())
+    report_path = report.dump_json(cfg.get("report_path"), extra={
+        "request_code": request_code,
+        "scenario": cfg.get("scenario"),
+        "load_mode": load_mode,
+        "open_loop": cfg.get("open_loop") if open_loop else None,
+        "profile": cfg.get("profile") if load_mode == "profile" else None,
+        "num_threads": num_threads if load_mode == "closed" else None,
+        "num_requests_per_thread": num_per_thread if load_mode == "closed" else None,
+        "processes": processes,
+        "num_channels": num_channels,
+        "max_in_flight": max_in_flight,
+        "preserialized_requests": bool(cfg.get("preserialized_requests")),
+        "config_hash": cfg_hash,
+    })
+    if report.counters:
+        print("  " + ", ".join(f"{name}: {value}" for name, value in report.counters.items()))
+    print(f"  Report saved: {report_path}")
+    for line in report.errors:
+        print(f"    {line}")
+    return check_baseline(cfg, report, cfg_hash, args.save_baseline, args.compare_baseline)
+
+
+def check_baseline(cfg, report, cfg_hash, save_name=None, compare_name=None):
+    """Saves the run as a baseline and/or gates it against one; returns the process exit code."""
+    baseline_cfg = cfg.get("baseline") or {}
+    current = report.to_dict()
+    exit_code = 0
+    if compare_name:
+        baseline = load_baseline(compare_name, baseline_cfg.get("dir"))
+        print()
+        checks = compare(current, baseline["report"], baseline_cfg.get("tolerances"))
+        if not print_comparison(checks, baseline, cfg_hash):
+            exit_code = 1
+    if save_name:
+        print(f"  Baseline saved: {save_baseline(current, save_name, cfg_hash, baseline_cfg.get('dir'))}")
+    return exit_code
+
+
+def print_capacity_result(cfg, knee, probes, processes):
+    capacity = cfg.get("capacity") or {}
+    print()
+    print(format_curve(probes, knee))
+    if knee is None:
+        print(f"  Knee: SLO not met even at {capacity.get('start_rps', 10)} rps")
+    elif knee >= capacity.get("max_rps", 2000):
+        print(f"  Knee: >= {knee:.1f} rps (max_rps reached without breaking the SLO)")
+    else:
+        print(f"  Knee: {knee:.1f} rps (max sustainable rate within the SLO)")
+    path = cfg.get("report_path") or f"capacity_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "knee_rps": knee,
+            "capacity": capacity,
+            "scenario": cfg.get("scenario"),
+            "processes": processes,
+            "probes": [result.to_dict() for result in probes],
+        }, f, ensure_ascii=False, indent=2)
+    print(f"  Report saved: {path}")
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
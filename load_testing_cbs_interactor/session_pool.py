@@ -0,0 +1,214 @@
+"""
+Pool of sessions for the load generator.
+
+Instead of one session_key for every request, requests are spread over a pool taken from
+the "sessions" section of config.json:
+
+    config    {"source": "config", "session_keys": ["...", "..."]}  (default: [session_key])
+    database  {"source": "database", "user_ids": [134, 1], "limit_per_user": 5}
+              valid keys from the sessions table (DataCollector.get_valid_session_keys)
+    login     {"source": "login", "logins": [{"username": "...", "password": "...", "otp": "111111"}]}
+              minted via WebAuthApi.authenticate + confirmSecondFactor
+
+Affinity: a worker thread keeps its session until the server answers INVALID_SESSION_KEY;
+the session is then dropped from the pool, replaced if the source can (fresh key from the
+database, new login with the same credentials) and the thread moves on to another one.
+With --processes every worker process gets a disjoint slice of the pool.
+"""
+import itertools
+import threading
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import protofile_pb2 as pb2
+import protofile_pb2_grpc as pb2_grpc
+
+from transport import create_channel, grpc_options_from_config
+
+ERROR_INVALID_SESSION_KEY = "INVALID_SESSION_KEY"
+SOURCES = ("config", "database", "login")
+
+
+@dataclass
+class Session:
+    key: str
+    session_id: Optional[str] = None
+    user_id: Optional[int] = None
+    login: Optional[dict] = field(default=None, repr=False)  # Credentials the session was minted with
+
+
+class SessionPool:
+    """Sessions with per-thread affinity and rotation on INVALID_SESSION_KEY."""
+
+    def __init__(self, sessions: List[Session], replenish: Optional[Callable[[Session], Optional[Session]]] = None,
+                 on_close: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            sessions: Initial sessions of this process
+            replenish: Returns a replacement for an invalidated session (or None); may block
+            on_close: Releases the source's resources (login channel)
+        """
+        if not sessions:
+            raise ValueError("Пул сессий пуст: проверьте секцию sessions в config.json")
+        self._active = list(sessions)
+        self._replenish = replenish
+        self._on_close = on_close
+        self._lock = threading.Lock()
+        self._replenished = threading.Condition(self._lock)
+        self._pending = 0  # Replacements being minted outside the lock
+        self._local = threading.local()
+        self._slots = itertools.count()
+        self._invalidated = set()
+        self.total = len(sessions)
+
+    def acquire(self) -> Session:
+        """Session of the calling thread (the same one until it is invalidated)."""
+        session = getattr(self._local, "session", None)
+        if session is not None and session.key not in self._invalidated:
+            return session
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = self._local.slot = next(self._slots)
+        with self._lock:
+            while not self._active and self._pending:
+                self._replenished.wait()
+            if not self._active:
+                raise RuntimeError("Все сессии пула получили INVALID_SESSION_KEY")
+            session = self._active[slot % len(self._active)]
+        self._local.session = session
+        return session
+
+    def invalidate(self, session: Session):
+        """Drops a session the server rejected and adds its replacement, if the source has one."""
+        with self._lock:
+            if session.key in self._invalidated:
+                return
+            self._invalidated.add(session.key)
+            self._active = [s for s in self._active if s.key != session.key]
+            if self._replenish is not None:
+                self._pending += 1
+        # Логин или запрос в БД — вне блокировки, чтобы не держать acquire() других потоков
+        replacement = None
+        if self._replenish is not None:
+            try:
+                replacement = self._replenish(session)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if replacement is not None:
+                        self._active.append(replacement)
+                        self.total += 1
+                    self._replenished.notify_all()
+        print(f"[sessions] INVALID_SESSION_KEY для {session.key[:10]}..., "
+              f"замена: {replacement.key[:10] + '...' if replacement else 'нет'}, активных: {len(self._active)}")
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_total": self.total,
+                "sessions_active": len(self._active),
+                "sessions_invalidated": len(self._invalidated),
+            }
+
+    @classmethod
+    def from_config(cls, cfg, worker_index=0, processes=1) -> "SessionPool":
+        sessions_cfg = cfg.get("sessions") or {}
+        source = sessions_cfg.get("source", "config")
+        if source not in SOURCES:
+            raise ValueError(f"Неизвестный источник сессий: {source}, ожидается один из {SOURCES}")
+        if source == "database":
+            return _database_pool(sessions_cfg, worker_index, processes)
+        if source == "login":
+            return _login_pool(cfg, sessions_cfg, worker_index, processes)
+        keys = sessions_cfg.get("session_keys") or [cfg["session_key"]]
+        return cls([Session(key) for key in _worker_slice(keys, worker_index, processes)])
+
+
+def _worker_slice(items, worker_index, processes):
+    """Disjoint share of items for a worker process; everything when there are fewer items than processes."""
+    share = items[worker_index::processes]
+    if not share:
+        print(f"[sessions] ⚠️ Сессий ({len(items)}) меньше, чем процессов ({processes}): процесс {worker_index} "
+              f"использует общие сессии")
+        return list(items)
+    return share
+
+
+# ===== ИСТОЧНИК: БД =====
+
+def _database_pool(sessions_cfg, worker_index, processes) -> SessionPool:
+    from database_collector import DatabaseConfig, DataCollector
+
+    collector = DataCollector(DatabaseConfig())
+    user_ids = sessions_cfg.get("user_ids") or [134]
+    limit_per_user = sessions_cfg.get("limit_per_user", 5)
+    rows = collector.get_valid_session_keys(user_ids, limit_per_user)
+    seen = {row["session_key"] for row in rows}
+
+    def replenish(_invalidated: Session) -> Optional[Session]:
+        # Только ключи, появившиеся после старта; между процессами делятся по crc32
+        for row in collector.get_valid_session_keys(user_ids, limit_per_user):
+            key = row["session_key"]
+            if key not in seen and zlib.crc32(key.encode("utf-8")) % processes == worker_index:
+                seen.add(key)
+                return Session(key, user_id=row["user_id"])
+        return None
+
+    sessions = [Session(row["session_key"], user_id=row["user_id"]) for row in rows]
+    return SessionPool(_worker_slice(sessions, worker_index, processes), replenish)
+
+
+# ===== ИСТОЧНИК: ЛОГИН =====
+
+def login(stub, credentials: dict, device_type: str, user_agent: str) -> Session:
+    """authenticate (+ confirmSecondFactor when credentials have an otp) → new session."""
+    metadata = (("refid", str(uuid.uuid1())), ("device-type", device_type), ("user-agent-c", user_agent))
+    response = stub.authenticate(
+        pb2.LoginRequest(username=credentials["username"], password=credentials["password"]),
+        metadata=metadata, timeout=30,
+    )
+    if not response.success:
+        raise RuntimeError(f"authenticate {credentials['username']}: {response.error.code} {response.error.data}")
+    data = response.data
+    if credentials.get("otp"):
+        response = stub.confirmSecondFactor(
+            pb2.ConfirmSecondFactorRequest(otp=credentials["otp"]),
+            metadata=metadata + (("sessionkey", data.sessionKey),), timeout=30,
+        )
+        if not response.success:
+            raise RuntimeError(f"confirmSecondFactor {credentials['username']}: {response.error.code} {response.error.data}")
+        data = response.data
+    return Session(data.sessionKey, session_id=data.sessionId or None, login=credentials)
+
+
+def _login_pool(cfg, sessions_cfg, worker_index, processes) -> SessionPool:
+    logins = sessions_cfg.get("logins") or []
+    own = logins[worker_index::processes]
+    if not own:
+        # Повторный логин того же пользователя может закрыть его сессию в другом процессе
+        raise ValueError(f"Для source=login нужно не меньше logins ({len(logins)}), чем процессов ({processes})")
+    channel = create_channel(cfg["grpc_server_url"], cfg.get("grpc_credentials", "ssl"), grpc_options_from_config(cfg))
+    stub = pb2_grpc.WebAuthApiStub(channel)
+
+    def mint(credentials):
+        return login(stub, credentials, cfg["device_type"], cfg["user_agent"])
+
+    def replenish(invalidated: Session) -> Optional[Session]:
+        try:
+            return mint(invalidated.login)
+        except Exception as e:
+            print(f"[sessions] Не удалось перелогиниться {invalidated.login['username']}: {e}")
+            return None
+
+    try:
+        sessions = [mint(credentials) for credentials in own]
+    except Exception:
+        channel.close()
+        raise
+    return SessionPool(sessions, replenish, on_close=channel.close)
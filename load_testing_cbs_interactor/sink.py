@@ -0,0 +1,233 @@
+"""
+Streaming result sink for the load generator.
+
+Results are not kept: each finished request is turned into a compact record (timestamps,
+code, status, error code) right in the worker thread and appended to that thread's own
+buffer, so the hot path takes no shared lock and protobuf responses are dropped at once.
+Full buffers (or ones older than flush_interval_s) are handed over through a SimpleQueue
+to a single writer thread, which:
+
+    - folds every record into the live LoadReport (only the writer touches it);
+    - appends it to results_path as JSONL or CSV (optional);
+    - prints a live line every live_interval_s.
+"""
+import csv
+import json
+import queue
+import threading
+import time
+
+import grpc
+
+STATUS_SUCCESS = "success"
+STATUS_ERROR_RESPONSE = "error_response"
+STATUS_EXCEPTION = "exception"
+FORMATS = ("jsonl", "csv")
+ROW_FIELDS = (
+    "thread", "index", "stage", "workload", "code", "status", "error_code",
+    "start_ms", "send_lag_ms", "open_ms", "confirm_ms", "e2e_ms",
+)
+
+
+def classify(result):
+    """'success', 'error_response' or 'exception' for a make_grpc_deposit_request result."""
+    response, exception = result[2], result[3]
+    if exception is not None:
+        return STATUS_EXCEPTION
+    if response is not None and getattr(response, "success", False):
+        return STATUS_SUCCESS
+    return STATUS_ERROR_RESPONSE
+
+
+def _error_code(response, exception):
+    if exception is not None:
+        if isinstance(exception, grpc.RpcError) and callable(getattr(exception, "code", None)):
+            return exception.code().name
+        return type(exception).__name__
+    error = getattr(response, "error", None)
+    return getattr(error, "code", None) or None
+
+
+def compact_record(result):
+    """
+    Compact record of a make_grpc_deposit_request result; the response is not kept.
+
+    code is the operation code of the workload (the open request), whichever step failed.
+
+    Times stay as time.perf_counter() marks, the sink turns them into offsets from the start.
+    """
+    thread_id, request_index, response, exception, timings = result
+    status = classify(result)
+    record = {
+        "thread": thread_id,
+        "index": request_index,
+        "stage": timings.get("stage"),
+        "workload": timings.get("workload"),
+        "code": timings.get("code"),
+        "status": status,
+        "error_code": None,
+        "error": None,
+        "intended": timings["intended"],
+        "sent": timings["sent"],
+        "opened": timings["opened"],
+        "open_ok": timings["open_ok"],
+        "done": timings["done"],
+    }
+    if status != STATUS_SUCCESS:
+        record["error_code"] = _error_code(response, exception)
+        detail = exception if exception is not None else getattr(response, "error", response)
+        record["error"] = " ".join(str(detail).split())
+    return record
+
+
+def _ms(later, earlier):
+    return None if later is None or earlier is None else round((later - earlier) * 1000, 3)
+
+
+def to_row(record, started_at):
+    """Flat row for the results file: offsets and latencies in milliseconds."""
+    return {
+        "thread": record["thread"],
+        "index": record["index"],
+        "stage": record["stage"],
+        "workload": record["workload"],
+        "code": record["code"],
+        "status": record["status"],
+        "error_code": record["error_code"],
+        "start_ms": _ms(record["intended"], started_at),
+        "send_lag_ms": _ms(record["sent"], record["intended"]),
+        "open_ms": _ms(record["opened"], record["sent"]),
+        "confirm_ms": _ms(record["done"], record["opened"]) if record["open_ok"] else None,
+        "e2e_ms": _ms(record["done"], record["intended"]),
+    }
+
+
+class _ThreadBuffer:
+    """Records of one worker thread; only that thread appends, so no lock is needed."""
+
+    def __init__(self):
+        self.records = []
+        self.flushed_at = time.monotonic()
+
+
+class ResultSink:
+    """Per-thread buffers → queue → writer thread (live report + results file)."""
+
+    def __init__(self, report, path=None, fmt="jsonl", flush_every=256,
+                 flush_interval_s=0.5, live_interval_s=5.0, label=""):
+        """
+        Args:
+            report: LoadReport updated live by the writer thread
+            path: Results file (None — aggregates only)
+            fmt: "jsonl" or "csv"
+            flush_every: Buffer size that triggers a hand-over to the writer
+            flush_interval_s: Buffer age that triggers a hand-over
+            live_interval_s: How often the writer prints live aggregates (0 — never)
+            label: Prefix of live lines (worker process number)
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown results format: {fmt}, expected one of {FORMATS}")
+        self.report = report
+        self.path = path
+        self.fmt = fmt
+        self.flush_every = max(1, flush_every)
+        self.flush_interval_s = flush_interval_s
+        self.live_interval_s = live_interval_s
+        self.label = label
+        self._local = threading.local()
+        self._buffers = []
+        self._buffers_lock = threading.Lock()  # only taken once per thread, when its buffer is created
+        self._queue = queue.SimpleQueue()
+        self._error = None
+        # Файл открывается здесь: ошибка пути видна сразу, а не только в close()
+        self._out = self._csv = None
+        if path:
+            self._out = open(path, "w", encoding="utf-8", newline="")
+            if fmt == "csv":
+                self._csv = csv.DictWriter(self._out, fieldnames=ROW_FIELDS)
+                self._csv.writeheader()
+        self._writer = threading.Thread(target=self._write_loop, name="result-sink", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_config(cls, cfg, report, label=""):
+        return cls(
+            report,
+            path=cfg.get("results_path"),
+            fmt=cfg.get("results_format", "jsonl"),
+            live_interval_s=cfg.get("live_interval_s", 5.0),
+            label=label,
+        )
+
+    def _buffer(self):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = _ThreadBuffer()
+            with self._buffers_lock:
+                self._buffers.append(buffer)
+        return buffer
+
+    def record(self, result):
+        """Called by the worker thread that produced result; the response is dropped here."""
+        buffer = self._buffer()
+        buffer.records.append(compact_record(result))
+        now = time.monotonic()
+        if len(buffer.records) >= self.flush_every or now - buffer.flushed_at >= self.flush_interval_s:
+            self._queue.put(buffer.records)
+            buffer.records = []
+            buffer.flushed_at = now
+
+    def close(self):
+        """Hands over what is left (all workers must be done) and waits for the writer."""
+        with self._buffers_lock:
+            buffers = list(self._buffers)
+        for buffer in buffers:
+            if buffer.records:
+                self._queue.put(buffer.records)
+                buffer.records = []
+        self._queue.put(None)
+        self._writer.join()
+        if self._error is not None:
+            raise RuntimeError(f"Result sink failed: {self._error}") from self._error
+
+    def _write_loop(self):
+        last_live = time.monotonic()
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    break
+                # Очередь разбирается до конца даже после ошибки, иначе она растет без ограничений
+                for record in batch:
+                    self.report.add(record)
+                if self._out is not None:
+                    self._write(batch)
+                now = time.monotonic()
+                if self.live_interval_s and now - last_live >= self.live_interval_s:
+                    last_live = now
+                    print(self.report.format_live(self.label))
+        except Exception as e:
+            self._error = e
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if self._out is not None:
+                self._out.close()
+
+    def _write(self, batch):
+        """Appends a batch to the results file; on failure stops writing but keeps aggregating."""
+        try:
+            for record in batch:
+                row = to_row(record, self.report.started_at)
+                if self._csv is not None:
+                    self._csv.writerow(row)
+                else:
+                    self._out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        except Exception as e:
+            self._error = e
+            print(f"[sink] ⚠️ Запись в {self.path} остановлена: {e}; агрегаты продолжают считаться")
+            out, self._out, self._csv = self._out, None, None
+            try:
+                out.close()
+            except Exception:
+                pass
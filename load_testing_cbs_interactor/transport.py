@@ -0,0 +1,77 @@
+"""
+Shared gRPC transport for the load generator.
+
+A fixed pool of channels is created once and round-robined across all workers, instead of
+a TLS handshake per call. Each channel uses its own subchannel pool
+('grpc.use_local_subchannel_pool'), so the pool really opens N HTTP/2 connections and is
+not capped by one connection's concurrent-stream limit. A semaphore bounds the number of
+RPCs in flight across the whole run (max_in_flight).
+"""
+import itertools
+import threading
+
+import grpc
+import protofile_pb2_grpc as pb2_grpc
+
+from fast_payload import raw_make_web_transfer
+
+DEFAULT_GRPC_OPTIONS = [("grpc.enable_http_proxy", 0), ("grpc.keepalive_timeout_ms", 10000)]
+
+
+def grpc_options_from_config(cfg):
+    grpc_opts = cfg.get("grpc_options")
+    if grpc_opts:
+        return [tuple(o) for o in grpc_opts]
+    return list(DEFAULT_GRPC_OPTIONS)
+
+
+def create_channel(target, credentials, options):
+    """TLS channel to the stand, or plaintext when credentials is "insecure" (local fake_server.py)."""
+    if credentials == "insecure":
+        return grpc.insecure_channel(target, options=options)
+    return grpc.secure_channel(target, grpc.ssl_channel_credentials(), options=options)
+
+
+class ChannelPool:
+    """N long-lived channels with cached stubs, picked round-robin, plus an in-flight limit."""
+
+    def __init__(self, target, options, credentials="ssl", size=4, max_in_flight=64):
+        options = [option for option in options if option[0] != "grpc.use_local_subchannel_pool"]
+        options.append(("grpc.use_local_subchannel_pool", 1))
+        self.size = max(1, size)
+        self.max_in_flight = max(1, max_in_flight)
+        self._channels = [create_channel(target, credentials, options) for _ in range(self.size)]
+        self._stubs = [pb2_grpc.WebTransferApiStub(channel).makeWebTransfer for channel in self._channels]
+        self._raw = [raw_make_web_transfer(channel) for channel in self._channels]
+        self._next = itertools.count()
+        self._next_lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            cfg["grpc_server_url"],
+            grpc_options_from_config(cfg),
+            credentials=cfg.get("grpc_credentials", "ssl"),
+            size=cfg.get("num_channels", 4),
+            max_in_flight=cfg.get("max_in_flight", 64),
+        )
+
+    def _index(self):
+        with self._next_lock:
+            return next(self._next) % self.size
+
+    def invoke(self, policy, code, request, metadata):
+        """
+        Sends one makeWebTransfer through the next channel under the in-flight limit.
+
+        request is an IncomingWebTransfer or pre-serialized bytes (fast_payload).
+        """
+        index = self._index()
+        method = self._raw[index] if isinstance(request, bytes) else self._stubs[index]
+        with self._in_flight:
+            return policy.invoke(method, request, metadata, code=code)
+
+    def close(self):
+        for channel in self._channels:
+            channel.close()
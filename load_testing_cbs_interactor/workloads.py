@@ -0,0 +1,274 @@
+"""
+Weighted mixed-workload scenarios for the load generator.
+
+Each workload builds the open request of one operation type, mirroring the payloads of
+the functional tests in tests/ and the constants in data.py:
+
+    bank_client_transfer   MAKE_BANK_CLIENT_TRANSFER   tests/test_transfer.py
+    own_accounts_transfer  MAKE_OWN_ACCOUNTS_TRANSFER  tests/test_currency_exchange.py
+    kib_payment            MAKE_GENERIC_PAYMENT_V2     tests/test_kib_payment.py
+    o_dengi_payment        MAKE_GENERIC_PAYMENT_V2     tests/test_o_dengi_payment.py
+    aiyl_bank_payment      MAKE_GENERIC_PAYMENT_V2     tests/test_aiyl_bank_payment.py
+    qr_payment             MAKE_QR_PAYMENT             tests/test_qr_payment.py
+    statement_request      MAKE_TXN_SHOP_OPERATION     tests/test_statement_request.py
+    deposit_creation       MAKE_DEPOSIT                tests/test_deposit_creation.py
+    deposit                request_code from config.json + deposit_request (the original load)
+
+A scenario file (scenarios/*.json) lists workloads with weights and optional top-level
+payload overrides:
+
+    {"name": "production_mix", "seed": null,
+     "workloads": [{"workload": "bank_client_transfer", "weight": 30},
+                   {"workload": "qr_payment", "weight": 10, "overrides": {"amount": "50"}}]}
+
+Every request picks a workload at random in proportion to the weights; all of them are
+confirmed with CONFIRM_TRANSFER.
+"""
+import bisect
+import itertools
+import json
+import os
+import random
+
+from data import (
+    CODE_CREATE_TRANSFER, CODE_MAKE_OWN_ACCOUNTS_TRANSFER, CODE_MAKE_GENERIC_PAYMENT_V2,
+    CODE_MAKE_QR_PAYMENT, CODE_MAKE_TXN_SHOP_OPERATION, CODE_MAKE_DEPOSIT,
+    ACCOUNT_ID_DEBIT, ACCOUNT_CREDIT, ACCOUNT_CREDIT_PROP_TYPE, TRANSFER_AMOUNT, PAYMENT_PURPOSE,
+    EXCHANGE_ACCOUNT_ID_DEBIT, EXCHANGE_ACCOUNT_ID_CREDIT, AMOUNT_SMALL, AMOUNT_100,
+    KIB_PROP_VALUE, KIB_SERVICE_ID, KIB_SERVICE_PROVIDER_ID,
+    O_DENGI_PROP_VALUE, O_DENGI_SERVICE_ID, O_DENGI_SERVICE_PROVIDER_ID,
+    AIYL_BANK_PROP_VALUE, AIYL_BANK_SERVICE_ID, AIYL_BANK_SERVICE_PROVIDER_ID,
+    QR_ACCOUNT_CREDIT_PROP_VALUE, QR_PAYMENT_PURPOSE, QR_PAYMENT, QR_ACCOUNT_CHANGEABLE,
+    QR_SERVICE_NAME, QR_SERVICE_ID, QR_CLIENT_TYPE, QR_VERSION, QR_TYPE,
+    QR_MERCHANT_PROVIDER_ID, QR_ACCOUNT, QR_MCC, QR_CCY, QR_TRANSACTION_ID, QR_CONTROL_SUM,
+    STATEMENT_LANGUAGE, DELIVERY_TYPE, PHONE_NUMBER, BRANCH_CODE, PRODUCT_TYPE_STATEMENT,
+    DEPOSIT_TYPE, DEPOSIT_ID, DEPOSIT_MAIN_INT_TYPE, DEPOSIT_AMOUNT, DEPOSIT_CCY, DEPOSIT_RATE,
+    DEPOSIT_TERM, PRODUCT_TYPE_DEPOSIT,
+)
+
+SCENARIOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+DEFAULT_REQUEST_CODE = "MAKE_TXN_SHOP_OPERATION"
+
+
+# ===== ПОСТРОИТЕЛИ ЗАПРОСОВ =====
+
+def build_deposit_payload(cfg, operation_id, request_id):
+    """Deposit opening payload from cfg["deposit_request"] with the given IDs."""
+    raw = cfg["deposit_request"]
+    data = {k: v for k, v in raw.items() if not (isinstance(k, str) and k.startswith("_"))}
+    data["operationId"] = operation_id
+    data["requestId"] = request_id
+    data["txnId"] = None
+    if "depositTypeId" not in data and "depositId" in data:
+        data["depositTypeId"] = data["depositId"]
+
+    product_type = data.get("productType", "makeDepositApplication")
+    return {
+        "operationId": operation_id,
+        "productType": product_type,
+        "data": data,
+        "txnId": None,
+    }
+
+
+def build_bank_client_transfer(cfg, operation_id, request_id):
+    return {
+        "operationId": operation_id,
+        "accountIdDebit": ACCOUNT_ID_DEBIT,
+        "accountCreditPropValue": ACCOUNT_CREDIT,
+        "accountCreditPropType": ACCOUNT_CREDIT_PROP_TYPE,
+        "paymentPurpose": PAYMENT_PURPOSE,
+        "amountDebit": TRANSFER_AMOUNT,
+    }
+
+
+def build_own_accounts_transfer(cfg, operation_id, request_id):
+    return {
+        "operationId": operation_id,
+        "accountIdDebit": EXCHANGE_ACCOUNT_ID_DEBIT,
+        "accountIdCredit": EXCHANGE_ACCOUNT_ID_CREDIT,
+        "amountDebit": AMOUNT_SMALL,
+    }
+
+
+def _generic_payment_builder(prop_value, service_id, service_provider_id):
+    def build(cfg, operation_id, request_id):
+        return {
+            "operationId": operation_id,
+            "propValue": prop_value,
+            "accountIdDebit": ACCOUNT_ID_DEBIT,
+            "amountCredit": AMOUNT_100,
+            "serviceId": service_id,
+            "serviceProviderId": service_provider_id,
+        }
+    return build
+
+
+def build_qr_payment(cfg, operation_id, request_id):
+    return {
+        "operationId": operation_id,
+        "accountIdDebit": ACCOUNT_ID_DEBIT,
+        "accountCreditPropValue": QR_ACCOUNT_CREDIT_PROP_VALUE,
+        "accountCreditPropType": ACCOUNT_CREDIT_PROP_TYPE,
+        "paymentPurpose": QR_PAYMENT_PURPOSE,
+        "amount": AMOUNT_100,
+        "qrPayment": QR_PAYMENT,
+        "qrAccountChangeable": QR_ACCOUNT_CHANGEABLE,
+        "qrServiceName": QR_SERVICE_NAME,
+        "qrServiceId": QR_SERVICE_ID,
+        "clientType": QR_CLIENT_TYPE,
+        "qrVersion": QR_VERSION,
+        "qrType": QR_TYPE,
+        "qrMerchantProviderId": QR_MERCHANT_PROVIDER_ID,
+        "qrAccount": QR_ACCOUNT,
+        "qrMcc": QR_MCC,
+        "qrCcy": QR_CCY,
+        "qrTransactionId": QR_TRANSACTION_ID,
+        "qrControlSum": QR_CONTROL_SUM,
+        "valueDate": None,
+        "knp": None,
+        "theirRefNo": None,
+        "valueTime": None,
+        "txnId": None,
+        "qrComment": None,
+        "qrMerchantId": None,
+    }
+
+
+def build_statement_request(cfg, operation_id, request_id):
+    return {
+        "operationId": operation_id,
+        "productType": PRODUCT_TYPE_STATEMENT,
+        "data": {
+            "statementLanguage": STATEMENT_LANGUAGE,
+            "statementRequestFee": None,
+            "deliveryType": DELIVERY_TYPE,
+            "deliveryFee": None,
+            "deliveryAddress": None,
+            "phoneNumber": PHONE_NUMBER,
+            "branchCode": BRANCH_CODE,
+            "accountDebitId": ACCOUNT_ID_DEBIT,
+            "accountDebitIds": [ACCOUNT_ID_DEBIT],
+            "loanStatementType": None,
+            "productType": PRODUCT_TYPE_STATEMENT,
+            "requestId": request_id,
+            "accountIdDebit": ACCOUNT_ID_DEBIT,
+            "operationId": operation_id,
+            "txnId": None,
+        },
+        "txnId": None,
+    }
+
+
+def build_deposit_creation(cfg, operation_id, request_id):
+    return {
+        "depositType": DEPOSIT_TYPE,
+        "depositId": DEPOSIT_ID,
+        "mainIntType": DEPOSIT_MAIN_INT_TYPE,
+        "amount": DEPOSIT_AMOUNT,
+        "ccy": DEPOSIT_CCY,
+        "rate": DEPOSIT_RATE,
+        "accountDebitId": ACCOUNT_ID_DEBIT,
+        "termOfDeposit": DEPOSIT_TERM,
+        "childName": "",
+        "childBirthdate": "",
+        "files": [],
+        "productType": PRODUCT_TYPE_DEPOSIT,
+        "requestId": request_id,
+        "accountIdDebit": ACCOUNT_ID_DEBIT,
+        "amountDebit": DEPOSIT_AMOUNT,
+        "operationId": operation_id,
+        "txnId": None,
+    }
+
+
+# Имя нагрузки -> (код операции или None — request_code из config.json, построитель)
+WORKLOADS = {
+    "bank_client_transfer": (CODE_CREATE_TRANSFER, build_bank_client_transfer),
+    "own_accounts_transfer": (CODE_MAKE_OWN_ACCOUNTS_TRANSFER, build_own_accounts_transfer),
+    "kib_payment": (CODE_MAKE_GENERIC_PAYMENT_V2, _generic_payment_builder(
+        KIB_PROP_VALUE, KIB_SERVICE_ID, KIB_SERVICE_PROVIDER_ID)),
+    "o_dengi_payment": (CODE_MAKE_GENERIC_PAYMENT_V2, _generic_payment_builder(
+        O_DENGI_PROP_VALUE, O_DENGI_SERVICE_ID, O_DENGI_SERVICE_PROVIDER_ID)),
+    "aiyl_bank_payment": (CODE_MAKE_GENERIC_PAYMENT_V2, _generic_payment_builder(
+        AIYL_BANK_PROP_VALUE, AIYL_BANK_SERVICE_ID, AIYL_BANK_SERVICE_PROVIDER_ID)),
+    "qr_payment": (CODE_MAKE_QR_PAYMENT, build_qr_payment),
+    "statement_request": (CODE_MAKE_TXN_SHOP_OPERATION, build_statement_request),
+    "deposit_creation": (CODE_MAKE_DEPOSIT, build_deposit_creation),
+    "deposit": (None, build_deposit_payload),
+}
+
+
+# ===== СЦЕНАРИЙ =====
+
+class Workload:
+    """One weighted entry of a scenario."""
+
+    def __init__(self, name, weight=1.0, overrides=None, request_code=None):
+        if name not in WORKLOADS:
+            raise ValueError(f"Неизвестная нагрузка: {name}, доступны: {sorted(WORKLOADS)}")
+        if weight <= 0:
+            raise ValueError(f"Вес нагрузки {name} должен быть > 0")
+        code, self._builder = WORKLOADS[name]
+        self.name = name
+        self.code = code or request_code or DEFAULT_REQUEST_CODE
+        self.weight = weight
+        self.overrides = dict(overrides or {})
+
+    def build(self, cfg, operation_id, request_id):
+        payload = self._builder(cfg, operation_id, request_id)
+        payload.update(self.overrides)
+        return payload
+
+
+class Scenario:
+    """Weighted mix of workloads; pick() chooses the workload of the next request."""
+
+    def __init__(self, name, workloads, seed=None):
+        if not workloads:
+            raise ValueError(f"В сценарии {name} нет нагрузок")
+        names = [workload.name for workload in workloads]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Нагрузки в сценарии {name} повторяются: {names}")
+        self.name = name
+        self.workloads = list(workloads)
+        self._cumulative = list(itertools.accumulate(workload.weight for workload in self.workloads))
+        self._rng = random.Random(seed)
+
+    def pick(self):
+        if len(self.workloads) == 1:
+            return self.workloads[0]
+        point = self._rng.random() * self._cumulative[-1]
+        return self.workloads[bisect.bisect_right(self._cumulative, point)]
+
+    def shares(self):
+        """{workload name: share of requests}"""
+        total = self._cumulative[-1]
+        return {workload.name: workload.weight / total for workload in self.workloads}
+
+    @classmethod
+    def from_dict(cls, raw, request_code=None):
+        workloads = [
+            Workload(entry["workload"], entry.get("weight", 1.0), entry.get("overrides"), request_code)
+            for entry in raw.get("workloads", [])
+        ]
+        return cls(raw.get("name", "scenario"), workloads, raw.get("seed"))
+
+    @classmethod
+    def from_config(cls, cfg):
+        """Scenario from cfg["scenario"] (file path), or the original single deposit workload."""
+        request_code = cfg.get("request_code") or DEFAULT_REQUEST_CODE
+        path = cfg.get("scenario")
+        if not path:
+            return cls("deposit", [Workload("deposit", request_code=request_code)])
+        with open(resolve_scenario_path(path), "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f), request_code)
+
+
+def resolve_scenario_path(path):
+    """Path as given, or a name in scenarios/ with or without ".json" (e.g. "production_mix")."""
+    if os.path.exists(path) or os.path.isabs(path):
+        return os.path.abspath(path)
+    if not os.path.splitext(path)[1]:
+        path += ".json"
+    return os.path.join(SCENARIOS_DIR, path)
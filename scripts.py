@@ -1,7 +1,7 @@
 import uuid
 import grpc
 import json
-from conftest import webTransferApi_pb2, webTransferApi_pb2_grpc
+from conftest import webTransferApi_pb2, webTransferApi_pb2_grpc, CALL_POLICY
 from data import (
     GRPC_SERVER_URL, GRPC_OPTIONS,
     CODE_CREATE_TRANSFER, CODE_CONFIRM_TRANSFER,
@@ -58,7 +58,7 @@ class CreateTransferRequest:
                 options=GRPC_OPTIONS
         ) as channel:
             client = webTransferApi_pb2_grpc.WebTransferApiStub(channel)
-            response = client.makeWebTransfer(request, metadata=metadata)
+            response = CALL_POLICY.invoke(client.makeWebTransfer, request, metadata)
             print(f"Ответ: {response}")
             return response
 
@@ -106,7 +106,7 @@ class ConfirmTransferRequest:
                 options=GRPC_OPTIONS
         ) as channel:
             client = webTransferApi_pb2_grpc.WebTransferApiStub(channel)
-            response = client.makeWebTransfer(request, metadata=metadata)
+            response = CALL_POLICY.invoke(client.makeWebTransfer, request, metadata)
             print(f"Ответ: {response}")
             return response
 
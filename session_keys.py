@@ -0,0 +1,178 @@
+"""
+Провайдер session_key для pytest-сессии.
+
+Ключ ищется в БД один раз и кешируется на SESSION_KEY_TTL секунд. Повторный поиск
+выполняется только по истечении TTL или после invalidate() — когда сервер ответил
+INVALID_SESSION_KEY. Инвалидированные ключи при следующем поиске пропускаются.
+
+С lease_manager (pytest-xdist) провайдер берет только ключи, арендованные этим воркером,
+поэтому параллельные воркеры работают в разных сессиях.
+"""
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from database_collector import DataCollector
+from session_leases import SessionLeaseManager
+
+
+class SessionKeyProvider:
+    """Потокобезопасный TTL-кеш валидного session_key"""
+
+    def __init__(self, collector_factory: Callable[[], DataCollector], user_ids: List[int],
+                 max_offset: int, ttl: float, lease_manager: Optional[SessionLeaseManager] = None):
+        """
+        Args:
+            collector_factory: Функция, создающая DataCollector (вызывается один раз, лениво)
+            user_ids: Список user_id для поиска ключа в порядке приоритета
+            max_offset: Сколько последних ключей проверять для каждого user_id
+            ttl: Время жизни закешированного ключа в секундах
+            lease_manager: Аренды ключей между воркерами xdist; None — без аренды
+        """
+        self._collector_factory = collector_factory
+        self._collector = None
+        self.user_ids = list(user_ids)
+        self.max_offset = max_offset
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._session_key = None
+        self._user_id = None
+        self._expires_at = 0.0
+        self._invalidated = set()
+        self.lease_manager = lease_manager
+
+    @property
+    def session_key(self) -> Optional[str]:
+        """Текущий закешированный ключ (без обращения к БД)"""
+        return self._session_key
+
+    def _get_collector(self) -> DataCollector:
+        if self._collector is None:
+            self._collector = self._collector_factory()
+        return self._collector
+
+    def _resolve(self) -> Optional[str]:
+        collector = self._get_collector()
+        # Один запрос на все user_id вместо user_ids × max_offset отдельных SELECT
+        rows = [
+            row for row in collector.get_valid_session_keys(self.user_ids, self.max_offset)
+            if row['session_key'] not in self._invalidated
+        ]
+        row = rows[0] if rows else None
+        if self.lease_manager is not None and rows:
+            rows.sort(key=lambda item: item['session_key'] != self._session_key)  # Сначала продлеваем свой ключ
+            # Первый ключ, который удалось арендовать (свой арендованный ключ продлевается)
+            row = next((row for row in rows if self.lease_manager.try_acquire(row['session_key'])), None)
+            if row is None:
+                print(f"[session_key_provider] ⚠️  Все {len(rows)} ключей арендованы другими воркерами, ключ будет общим")
+                row = rows[0]
+        if row is not None:
+            session_key = row['session_key']
+            print(f"[session_key_provider] ✅ Найден session_key для user_id={row['user_id']}, offset={row['offset']}: {session_key[:10]}...")
+            self._user_id = row['user_id']
+            return session_key
+        print(f"[session_key_provider] ⚠️  Не найден валидный session_key для user_ids={self.user_ids} с offset до {self.max_offset}")
+        return None
+
+    def get(self) -> Optional[str]:
+        """
+        Возвращает валидный session_key, обращаясь к БД только при пустом или просроченном кеше
+
+        Returns:
+            str: Сессионный ключ или None если не найден
+        """
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._session_key
+            session_key = self._resolve()
+            if self.lease_manager is not None and self._session_key and session_key != self._session_key:
+                self.lease_manager.release(self._session_key)
+            # Промах тоже кешируется на TTL, чтобы не опрашивать БД перед каждым тестом
+            self._session_key = session_key
+            self._expires_at = time.monotonic() + self.ttl
+            return session_key
+
+    def use_static_key(self, session_key: str):
+        """Закрепляет ключ без обращения к БД (режим replay кассеты)"""
+        with self._lock:
+            self._session_key = session_key
+            self._expires_at = float("inf")
+
+    def release(self):
+        """Снимает аренду текущего ключа (teardown сессии)"""
+        with self._lock:
+            if self.lease_manager is not None:
+                self.lease_manager.release_all()
+
+    def invalidate(self, session_key: Optional[str] = None):
+        """
+        Сбрасывает кеш после ответа INVALID_SESSION_KEY
+
+        Args:
+            session_key: Отвергнутый сервером ключ; если он уже заменен другим, кеш не трогается
+        """
+        with self._lock:
+            if session_key is not None:
+                self._invalidated.add(session_key)
+                if session_key != self._session_key:
+                    return
+            # Аренда отвергнутого ключа не снимается до конца сессии: другие воркеры его не возьмут
+            print(f"[session_key_provider] Сброс session_key для user_id={self._user_id}")
+            self._session_key = None
+            self._expires_at = 0.0
+
+
+class RankedSessionKeyCache:
+    """Кеш ранжированных session_key по user_id: один запрос в БД на набор пользователей"""
+
+    def __init__(self, collector_factory: Callable[[], DataCollector], limit_per_user: int):
+        """
+        Args:
+            collector_factory: Функция, создающая DataCollector (вызывается один раз, лениво)
+            limit_per_user: Сколько последних ключей хранить для каждого user_id
+        """
+        self._collector_factory = collector_factory
+        self._collector = None
+        self.limit_per_user = limit_per_user
+        self._lock = threading.Lock()
+        self._keys: Dict[int, List[str]] = {}
+        self._static_key = None
+
+    def prefetch(self, user_ids: Iterable[int]):
+        """Загружает ключи для всех еще не закешированных user_id одним запросом"""
+        with self._lock:
+            if self._static_key:
+                return
+            missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in self._keys]
+            if not missing:
+                return
+            if self._collector is None:
+                self._collector = self._collector_factory()
+            rows = self._collector.get_valid_session_keys(missing, self.limit_per_user)
+            for user_id in missing:
+                self._keys[user_id] = []
+            for row in rows:
+                self._keys[row['user_id']].append(row['session_key'])
+
+    def keys_for(self, user_id: int) -> List[str]:
+        """
+        Возвращает ключи пользователя от самого нового к самому старому
+
+        Returns:
+            List[str]: Ключи (индекс в списке соответствует offset)
+        """
+        self.prefetch([user_id])
+        with self._lock:
+            if self._static_key:
+                return [self._static_key]
+            return list(self._keys[user_id])
+
+    def use_static_key(self, session_key: str):
+        """Отдает один и тот же ключ для любого user_id без обращения к БД (режим replay кассеты)"""
+        with self._lock:
+            self._static_key = session_key
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает закешированные ключи пользователя, следующий keys_for перечитает БД"""
+        with self._lock:
+            self._keys.pop(user_id, None)
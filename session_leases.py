@@ -0,0 +1,176 @@
+"""
+Аренда (lease) session_key для параллельных прогонов pytest-xdist.
+
+Каждый воркер (PYTEST_XDIST_WORKER: gw0, gw1, ...) берет в аренду собственный ключ из
+таблицы sessions, чтобы воркеры не делили одну сессию и не инвалидировали ее друг другу.
+Аренда — файл в общем каталоге. Проверка, создание и перехват аренды выполняются под
+fcntl.flock на файле-замке ключа, поэтому два воркера не могут одновременно перехватить
+одну аренду; сам файл пишется во временный и подменяется через os.replace, так что
+читатели не видят его наполовину записанным. Аренда продлевается повторным acquire того
+же ключа и снимается, когда провайдер переходит на другой ключ, и в конце сессии; ключ,
+получивший INVALID_SESSION_KEY, остается арендованным, чтобы его не взял другой воркер.
+Аренды упавших процессов (pid не жив или истек TTL) считаются просроченными и перехватываются.
+"""
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: без межпроцессного замка, только подмена файла и перечитывание
+    fcntl = None
+
+DEFAULT_LEASE_DIR = os.path.join(tempfile.gettempdir(), "backend_api_tests_session_leases")
+EMPTY_LEASE_GRACE = 5.0  # Сколько секунд пустой/битый файл аренды считается еще записываемым
+
+
+def current_worker_id() -> str:
+    """ID воркера xdist ('gw0', ...) или 'main' для обычного прогона"""
+    return os.environ.get("PYTEST_XDIST_WORKER", "main")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SessionLeaseManager:
+    """Файловые аренды session_key, общие для всех процессов на машине"""
+
+    def __init__(self, lease_dir: Optional[str] = None, ttl: float = 900.0, worker_id: Optional[str] = None):
+        """
+        Args:
+            lease_dir: Каталог файлов аренды (общий для всех воркеров)
+            ttl: Через сколько секунд без продления аренда считается брошенной
+            worker_id: Владелец аренды; по умолчанию current_worker_id()
+        """
+        self.lease_dir = lease_dir or DEFAULT_LEASE_DIR
+        self.ttl = ttl
+        self.worker_id = worker_id or current_worker_id()
+        self.pid = os.getpid()
+        self.host = socket.gethostname()
+        self._lock = threading.Lock()
+        self._held = set()
+        os.makedirs(self.lease_dir, exist_ok=True)
+
+    def _path(self, session_key: str) -> str:
+        digest = hashlib.sha1(session_key.encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.lease_dir, f"{digest}.lease")
+
+    def _record(self, session_key: str) -> dict:
+        return {
+            "worker": self.worker_id,
+            "pid": self.pid,
+            "host": self.host,
+            "key": session_key[:10],
+            "expires_at": time.time() + self.ttl,
+        }
+
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_own(self, lease: Optional[dict]) -> bool:
+        return bool(lease) and lease.get("pid") == self.pid and lease.get("host") == self.host
+
+    def _is_stale(self, path: str, lease: Optional[dict]) -> bool:
+        if not lease:
+            # Пустой/битый файл: процесс упал между созданием и записью — но только если
+            # файл не моложе EMPTY_LEASE_GRACE, иначе его, возможно, еще пишут
+            try:
+                return time.time() - os.path.getmtime(path) > EMPTY_LEASE_GRACE
+            except FileNotFoundError:
+                return True
+        if lease.get("expires_at", 0) < time.time():
+            return True
+        return lease.get("host") == self.host and not _pid_alive(lease.get("pid", -1))
+
+    @contextmanager
+    def _key_lock(self, path: str):
+        """Межпроцессный замок ключа: flock на отдельном файле, который никогда не удаляется"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, path: str, session_key: str):
+        """Атомарно записывает аренду: временный файл в том же каталоге + os.replace"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.lease_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._record(session_key), f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def try_acquire(self, session_key: str) -> bool:
+        """
+        Берет ключ в аренду (или продлевает свою аренду)
+
+        Returns:
+            bool: True, если ключ теперь арендован этим процессом
+        """
+        path = self._path(session_key)
+        with self._lock, self._key_lock(path):
+            if os.path.exists(path):
+                lease = self._read(path)
+                if not self._is_own(lease):
+                    if not self._is_stale(path, lease):
+                        return False
+                    print(f"[session_leases] Перехват брошенной аренды {session_key[:10]}... (владелец: {lease})")
+            self._write(path, session_key)
+            # Без flock (Windows) подмену мог сделать и другой процесс: владелец — тот, чья запись в файле
+            if not self._is_own(self._read(path)):
+                return False
+            self._held.add(session_key)
+            return True
+
+    def acquire_first(self, session_keys: Iterable[str]) -> Optional[str]:
+        """Арендует первый свободный ключ из session_keys (в порядке приоритета)"""
+        for session_key in session_keys:
+            if self.try_acquire(session_key):
+                return session_key
+        return None
+
+    def release(self, session_key: str):
+        """Снимает аренду ключа, если она принадлежит этому процессу"""
+        path = self._path(session_key)
+        with self._lock, self._key_lock(path):
+            self._held.discard(session_key)
+            if self._is_own(self._read(path)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def release_all(self):
+        """Снимает все аренды процесса (teardown сессии)"""
+        for session_key in list(self._held):
+            self.release(session_key)
+
+    @property
+    def held(self) -> set:
+        return set(self._held)
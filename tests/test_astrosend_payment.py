@@ -1,6 +1,5 @@
 import uuid
-import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_MONEY_TRANSFER,
     ACCOUNT_ID_DEBIT, ASTROSEND_AMOUNT_CREDIT,
@@ -43,16 +42,13 @@ def test_astrosend_payment_flow():
     assert_success(create_response, "Создание платежа Astrosend")
     print("✅ Создание платежа Astrosend успешно!")
     
-    print("\nОжидание 2 секунд...")
-    time.sleep(2)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ПЛАТЕЖА ASTROSEND ===
     print("\n=== ШАГ 2: Подтверждение платежа Astrosend ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение платежа Astrosend")
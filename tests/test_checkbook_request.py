@@ -1,6 +1,6 @@
 import uuid
 import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_TXN_SHOP_OPERATION,
     ACCOUNT_ID_DEBIT, DELIVERY_TYPE, BRANCH_CODE, PHONE_NUMBER,
@@ -56,16 +56,13 @@ def test_checkbook_request_flow():
     assert_success(create_response, "Создание запроса на чековую книжку")
     print("✅ Создание запроса на чековую книжку успешно!")
     
-    print("\nОжидание 3 секунд...")
-    time.sleep(3)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ЗАПРОСА НА ЧЕКОВУЮ КНИЖКУ ===
     print("\n=== ШАГ 2: Подтверждение запроса на чековую книжку ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение запроса на чековую книжку")
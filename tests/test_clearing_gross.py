@@ -1,6 +1,5 @@
 import uuid
-import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_OTHER_BANK_TRANSFER,
     ACCOUNT_ID_DEBIT, TRANSFER_CLEARING_GROSS, VALUE_DATE,
@@ -46,16 +45,13 @@ def test_clearing_gross_transfer_flow():
     assert_success(create_response, "Создание клиринг/гросс перевода")
     print("✅ Создание клиринг/гросс перевода успешно!")
     
-    print("\nОжидание 5 секунд...")
-    time.sleep(5)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ КЛИРИНГ/ГРОСС ПЕРЕВОДА ===
     print("\n=== ШАГ 2: Подтверждение клиринг/гросс перевода ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение клиринг/гросс перевода")
@@ -1,12 +1,14 @@
 import uuid
-import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+import pytest
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_OWN_ACCOUNTS_TRANSFER,
     EXCHANGE_ACCOUNT_ID_DEBIT, EXCHANGE_ACCOUNT_ID_CREDIT, AMOUNT_SMALL
 )
 
 
+# Обмен списывает с одного своего счета и зачисляет на другой — оба заняты на время теста
+@pytest.mark.debit_accounts(EXCHANGE_ACCOUNT_ID_DEBIT, EXCHANGE_ACCOUNT_ID_CREDIT)
 def test_currency_exchange_flow():
     """Тест-кейс: Создание и подтверждение обмена валют между своими счетами"""
     
@@ -34,16 +36,13 @@ def test_currency_exchange_flow():
     assert_success(create_response, "Создание обмена валют")
     print("✅ Создание обмена валют успешно!")
     
-    print("\nОжидание 5 секунд...")
-    time.sleep(5)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ОБМЕНА ВАЛЮТ ===
     print("\n=== ШАГ 2: Подтверждение обмена валют ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение обмена валют")
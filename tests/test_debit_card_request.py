@@ -1,6 +1,6 @@
 import uuid
 import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_TXN_SHOP_OPERATION,
     ACCOUNT_ID_DEBIT, ACCOUNT_CLASS_GROUP_ID, CARD_CCY,
@@ -53,16 +53,13 @@ def test_debit_card_request_flow():
     assert_success(create_response, "Создание запроса на дебетовую карту")
     print("✅ Создание запроса на дебетовую карту успешно!")
     
-    print("\nОжидание 3 секунд...")
-    time.sleep(3)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ЗАПРОСА НА ДЕБЕТОВУЮ КАРТУ ===
     print("\n=== ШАГ 2: Подтверждение запроса на дебетовую карту ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение запроса на дебетовую карту")
@@ -1,6 +1,6 @@
 import uuid
 import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_DEPOSIT,
     ACCOUNT_ID_DEBIT, DEPOSIT_TYPE, DEPOSIT_ID, DEPOSIT_MAIN_INT_TYPE,
@@ -51,16 +51,13 @@ def test_deposit_creation_flow():
     assert_success(create_response, "Создание депозита")
     print("✅ Создание депозита успешно!")
     
-    print("\nОжидание 3 секунд...")
-    time.sleep(3)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ДЕПОЗИТА ===
     print("\n=== ШАГ 2: Подтверждение депозита ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение депозита")
@@ -9,6 +9,8 @@ from data import CODE_DIGITAL_LOAN_APPLY, CODE_DIGITAL_LOAN_CHECK_SERVICE, ACCOU
 
 # ===== ТЕСТОВЫЕ ДАННЫЕ =====
 # Массив дат рождения для тестирования
+# Без пакетного прогона: заявка — один вызов без подтверждения, и все заявки идут по одному
+# кредитному счету, поэтому параллельно они конкурировали бы друг с другом
 BIRTH_DATES = [
     "1990-01-15",  # 34 года
     "1985-05-20",  # 39 лет
@@ -29,6 +31,9 @@ PASSPORT_BACK_BASE64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR4
 SELFIE_BASE64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
 # ============================
 
+# Все заявки идут по одному кредитному счету и не списывают с ACCOUNT_ID_DEBIT
+pytestmark = pytest.mark.debit_accounts(LOAN_ACCOUNT_ID)
+
 
 @pytest.mark.parametrize("birth_date", BIRTH_DATES)
 def test_digital_loan_apply_with_birth_date(birth_date):
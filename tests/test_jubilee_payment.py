@@ -1,6 +1,5 @@
 import uuid
-import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_GENERIC_PAYMENT_V2,
     ACCOUNT_ID_DEBIT, JUBILEE_PROP_VALUE, AMOUNT_100,
@@ -38,16 +37,13 @@ def test_jubilee_payment_flow():
     assert_success(create_response, "Создание платежа Jubilee")
     print("✅ Создание платежа Jubilee успешно!")
     
-    print("\nОжидание 5 секунд...")
-    time.sleep(5)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ПЛАТЕЖА JUBILEE ===
     print("\n=== ШАГ 2: Подтверждение платежа Jubilee ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение платежа Jubilee")
@@ -1,12 +1,10 @@
 import uuid
 import json
-import time
 import pytest
 from datetime import datetime
 
-from conftest import make_grpc_request, assert_success
-from data import CODE_MAKE_SHOP_OPERATION, CODE_CONFIRM_TRANSFER
-from database_collector import DatabaseConfig, DataCollector
+from conftest import make_grpc_request, confirm_when_ready, assert_success, RANKED_SESSION_KEYS
+from data import CODE_MAKE_SHOP_OPERATION
 
 
 PARTIAL_REPAYMENT_TEST_DATA = [
@@ -40,12 +38,11 @@ PARTIAL_REPAYMENT_TEST_DATA = [
 
 
 def _get_session_key(user_id: int) -> str:
-    config = DatabaseConfig()
-    collector = DataCollector(config)
-    session_key = collector.get_valid_session_key(user_id=user_id)
-    if not session_key:
+    RANKED_SESSION_KEYS.prefetch(test_data["user_id"] for test_data in PARTIAL_REPAYMENT_TEST_DATA)
+    session_keys = RANKED_SESSION_KEYS.keys_for(user_id)
+    if not session_keys:
         pytest.skip(f"Нет валидного session_key для user_id={user_id}")
-    return session_key
+    return session_keys[0]
 
 
 def _build_metadata(session_key: str, device_type: str, user_agent: str):
@@ -58,11 +55,7 @@ def _build_metadata(session_key: str, device_type: str, user_agent: str):
 
 
 def _confirm_operation(operation_id: str, metadata: tuple, otp: str = "111111"):
-    confirm_payload = {
-        "operationId": operation_id,
-        "otp": otp,
-    }
-    response = make_grpc_request(CODE_CONFIRM_TRANSFER, confirm_payload, metadata)
+    response = confirm_when_ready(operation_id, metadata, otp=otp)
     assert_success(response, "Подтверждение частичного погашения кредита")
     return response
 
@@ -112,9 +105,6 @@ def test_partial_early_loan_repayment(test_data):
         except (ValueError, TypeError) as err:
             pytest.fail(f"Не удалось распарсить тело ответа: {err}")
 
-    # Небольшая пауза перед подтверждением
-    time.sleep(2)
-
     print("Подтверждаем операцию OTP...")
     confirm_response = _confirm_operation(operation_id, metadata)
     print(f"Ответ на подтверждение: {confirm_response}")
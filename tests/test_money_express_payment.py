@@ -3,74 +3,102 @@ import time
 import pytest
 import json
 from datetime import datetime
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import assert_success, RANKED_SESSION_KEYS, is_offline
+from batch_flows import create_all, confirm_all, selected_params
 from data import CODE_MAKE_MONEY_EXPRESS
 from database_collector import DatabaseConfig, DataCollector
 
+# Все кейсы модуля выполняются одной пакетной фикстурой — держим их в одной дорожке
+pytestmark = pytest.mark.lane("money_express_batch")
 
-# === ГЛОБАЛЬНЫЙ СПИСОК ДЛЯ СБОРА PROCESSING_ID ===
-PROCESSING_IDS_COLLECTION = []
 
+# === ГЛОБАЛЬНЫЙ СПИСОК ОПЕРАЦИЙ ДЛЯ ПАКЕТНОГО ПОЛУЧЕНИЯ PROCESSING_ID ===
+# Тесты только регистрируют operation_id, processing_id резолвятся пачками в конце модуля
+PENDING_OPERATIONS = []
 
-def get_processing_id_by_operation_id(operation_id: str) -> str:
+PROCESSING_ID_BATCH_SIZE = 100  # Сколько operation_id в одном запросе
+PROCESSING_ID_MAX_ATTEMPTS = 5  # Попытки для строк, которые еще не появились в transactions
+PROCESSING_ID_RETRY_DELAY = 1.0  # Начальная пауза между попытками (сек), удваивается
+
+# Один DataCollector на модуль: соединения берутся из общего пула
+DB_COLLECTOR = DataCollector(DatabaseConfig())
+
+
+def resolve_processing_ids(operations: list):
     """
-    Получает processing_id из БД по operation_id
+    Резолвит processing_id для операций пачками по PROCESSING_ID_BATCH_SIZE
+    
+    Операции, для которых строка еще не появилась, перезапрашиваются с растущей паузой
+    до PROCESSING_ID_MAX_ATTEMPTS раз.
     
     Args:
-        operation_id: Уникальный идентификатор операции
+        operations: Список словарей с ключами test_name, operation_id
         
-    Returns:
-        str: processing_id или None если не найден
+    Yields:
+        (operation, processing_id или None) по мере готовности каждой пачки
     """
-    try:
-        config = DatabaseConfig()
-        collector = DataCollector(config)
+    for start in range(0, len(operations), PROCESSING_ID_BATCH_SIZE):
+        pending = {op["operation_id"]: op for op in operations[start:start + PROCESSING_ID_BATCH_SIZE]}
+        delay = PROCESSING_ID_RETRY_DELAY
         
-        with collector.connect() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT pay_ref_1 
-                    FROM transactions 
-                    WHERE operation_id = %s
-                """, (operation_id,))
-                result = cur.fetchone()
-                
-                if result:
-                    processing_id = result[0]
-                    print(f"✅ Найден processing_id: {processing_id} для operation_id: {operation_id}")
-                    return processing_id
-                else:
-                    print(f"❌ Не найден processing_id для operation_id: {operation_id}")
-                    return None
-                    
-    except Exception as e:
-        print(f"❌ Ошибка получения processing_id: {e}")
-        return None
+        for attempt in range(1, PROCESSING_ID_MAX_ATTEMPTS + 1):
+            try:
+                found = DB_COLLECTOR.get_processing_ids_by_operation_ids(list(pending))
+            except Exception as e:
+                print(f"❌ Ошибка получения processing_id (попытка {attempt}): {e}")
+                found = {}
+            
+            for operation_id, processing_id in found.items():
+                operation = pending.pop(operation_id, None)
+                if operation is not None:
+                    yield operation, processing_id
+            
+            if not pending or attempt == PROCESSING_ID_MAX_ATTEMPTS:
+                break
+            print(f"⏳ Нет processing_id для {len(pending)} операций, повтор через {delay} сек...")
+            time.sleep(delay)
+            delay *= 2
+        
+        for operation in pending.values():
+            yield operation, None
 
 
 def save_processing_ids_to_file():
-    """Сохраняет все собранные processing_id в JSON файл"""
-    if not PROCESSING_IDS_COLLECTION:
+    """Резолвит processing_id для всех зарегистрированных операций и потоково пишет их в JSON файл"""
+    if not PENDING_OPERATIONS:
         print("⚠️ Нет processing_id для сохранения")
         return
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"money_express_processing_ids_{timestamp}.json"
     
-    data = {
-        "timestamp": datetime.now().isoformat(),
-        "total_count": len(PROCESSING_IDS_COLLECTION),
-        "processing_ids": PROCESSING_IDS_COLLECTION
-    }
-    
+    saved = 0
     try:
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"✅ Сохранено {len(PROCESSING_IDS_COLLECTION)} processing_id в файл: {filename}")
+            f.write('{\n  "timestamp": %s,\n  "processing_ids": [' % json.dumps(datetime.now().isoformat()))
+            for operation, processing_id in resolve_processing_ids(PENDING_OPERATIONS):
+                if not processing_id:
+                    print(f"⚠️ {operation['test_name']} - processing_id не найден для operation_id: {operation['operation_id']}")
+                    continue
+                record = dict(operation, processing_id=processing_id)
+                f.write((",\n    " if saved else "\n    ") + json.dumps(record, ensure_ascii=False))
+                saved += 1
+            f.write('\n  ],\n  "total_count": %d\n}\n' % saved)
+        print(f"✅ Сохранено {saved} из {len(PENDING_OPERATIONS)} processing_id в файл: {filename}")
     except Exception as e:
         print(f"❌ Ошибка сохранения файла: {e}")
 
 
+@pytest.fixture(scope="module", autouse=True)
+def _processing_ids_batch():
+    """После всех тестов модуля резолвит processing_id одним пакетом и сохраняет их в файл"""
+    yield
+    if is_offline():
+        return  # Без стенда (replay кассеты, fake-сервер) БД недоступна
+    print(f"\n=== ФИНАЛЬНЫЙ ЭТАП: Сохранение processing_id ===")
+    save_processing_ids_to_file()
+
+
 # === МАССИВ ХАРДКОДНЫХ ДАННЫХ ДЛЯ MONEY EXPRESS ===
 MONEY_EXPRESS_TEST_DATA = [ 
     {
@@ -256,37 +284,8 @@ MONEY_EXPRESS_TEST_DATA = [
 ]
 
 
-@pytest.mark.parametrize("test_data", MONEY_EXPRESS_TEST_DATA)
-def test_money_express_payment_flow(test_data):
-    """Параметризованный тест-кейс: Создание и подтверждение платежа через Money Express"""
-    
-    # === ИЗВЛЕЧЕНИЕ ДАННЫХ ИЗ ПАРАМЕТРА ===
-    test_name = test_data["test_name"]
-    account_id_debit = test_data["account_id_debit"]
-    recipient_name = test_data["recipient_name"]
-    account_credit_prop_value = test_data["account_credit_prop_value"]
-    account_credit_prop_type = test_data["account_credit_prop_type"]
-    amount_debit = test_data["amount_debit"]
-    payment_purpose = test_data["payment_purpose"]
-    user_id = test_data["user_id"]
-    device_type = test_data["device_type"]
-    user_agent = test_data["user_agent"]
-    
-    # === ПОЛУЧЕНИЕ СЕССИОННОГО КЛЮЧА ДЛЯ КОНКРЕТНОГО ПОЛЬЗОВАТЕЛЯ ===
-    print(f"\n=== Получение сессионного ключа для user_id={user_id} ===")
-    try:
-        config = DatabaseConfig()
-        collector = DataCollector(config)
-        session_key = collector.get_valid_session_key(user_id=user_id)
-        if not session_key:
-            print(f"❌ Не найден валидный session_key для user_id={user_id}")
-            pytest.skip(f"Нет валидного session_key для user_id={user_id}")
-        print(f"✅ Получен session_key: {session_key[:10]}...")
-    except Exception as e:
-        print(f"❌ Ошибка получения session_key: {e}")
-        pytest.skip(f"Ошибка получения session_key для user_id={user_id}: {e}")
-    
-    # === СОЗДАНИЕ МЕТАДАННЫХ С ПОЛЬЗОВАТЕЛЬСКИМ СЕССИОННЫМ КЛЮЧОМ ===
+def _build_metadata(session_key: str, device_type: str, user_agent: str):
+    """Метаданные с пользовательским сессионным ключом; refid новый на каждый вызов"""
     def create_custom_metadata():
         return (
             ('refid', str(uuid.uuid1())),
@@ -294,89 +293,94 @@ def test_money_express_payment_flow(test_data):
             ('device-type', device_type),
             ('user-agent-c', user_agent),
         )
+    return create_custom_metadata
+
+
+@pytest.fixture(scope="module")
+def money_express_batch_results(request):
+    """
+    Один пакетный прогон на выбранные кейсы MONEY_EXPRESS_TEST_DATA: сначала все
+    MAKE_MONEY_EXPRESS, затем все CONFIRM_TRANSFER с общим ожиданием готовности.
+    Невыбранные кейсы не отправляются.
     
-    # === ФУНКЦИЯ ПОДТВЕРЖДЕНИЯ С ПОЛЬЗОВАТЕЛЬСКИМИ МЕТАДАННЫМИ ===
-    def confirm_operation_custom(operation_id: str, otp: str = "123456"):
-        """Подтверждение операции через OTP с пользовательскими метаданными"""
-        metadata = create_custom_metadata()
-        
-        confirm_data = {
-            "operationId": operation_id,
-            "otp": otp
-        }
-        
-        return make_grpc_request("CONFIRM_TRANSFER", confirm_data, metadata)
-    
-    # === ШАГ 1: СОЗДАНИЕ ПЛАТЕЖА MONEY EXPRESS ===
-    print(f"\n=== ШАГ 1: {test_name} - Создание платежа Money Express ===")
-    
-    operation_id = str(uuid.uuid1())
+    Returns:
+        dict: test_name -> FlowResult (None, если для пользователя нет session_key)
+    """
+    selected = selected_params(request)
+    cases = []
+    by_name = {}
     
-    payment_data = {
-        "operationId": operation_id,
-        "accountIdDebit": account_id_debit,
-        "recipientName": recipient_name,
-        "accountCreditPropValue": account_credit_prop_value,
-        "accountCreditPropType": account_credit_prop_type,
-        "amountDebit": amount_debit,
-        "paymentPurpose": payment_purpose
-    }
+    # === ПОЛУЧЕНИЕ СЕССИОННЫХ КЛЮЧЕЙ ДЛЯ ВСЕХ ПОЛЬЗОВАТЕЛЕЙ ПАКЕТА ===
+    RANKED_SESSION_KEYS.prefetch(test_data["user_id"] for test_data in selected)
+    for test_data in selected:
+        session_keys = RANKED_SESSION_KEYS.keys_for(test_data["user_id"])
+        if not session_keys:
+            print(f"❌ Не найден валидный session_key для user_id={test_data['user_id']}")
+            by_name[test_data["test_name"]] = None
+            continue
+        cases.append({
+            "name": test_data["test_name"],
+            "code": CODE_MAKE_MONEY_EXPRESS,
+            "data": {
+                "operationId": str(uuid.uuid1()),
+                "accountIdDebit": test_data["account_id_debit"],
+                "recipientName": test_data["recipient_name"],
+                "accountCreditPropValue": test_data["account_credit_prop_value"],
+                "accountCreditPropType": test_data["account_credit_prop_type"],
+                "amountDebit": test_data["amount_debit"],
+                "paymentPurpose": test_data["payment_purpose"]
+            },
+            "metadata": _build_metadata(session_keys[0], test_data["device_type"], test_data["user_agent"]),
+            "otp": "123456",
+        })
     
-    print(f"Test: {test_name}")
-    print(f"Operation ID: {operation_id}")
-    print(f"Получатель: {recipient_name}")
-    print(f"Номер карты: {account_credit_prop_value}")
-    print(f"Сумма: {amount_debit} KGS")
-    print(f"Данные: {payment_data}")
+    print(f"\n=== Пакетное создание платежей Money Express: {len(cases)} кейсов ===")
+    results = create_all(cases)
+    print(f"=== Пакетное подтверждение платежей Money Express ===")
+    confirm_all(cases, results)
     
-    # Используем helper функции из conftest с пользовательскими метаданными
-    create_response = make_grpc_request(CODE_MAKE_MONEY_EXPRESS, payment_data, create_custom_metadata())
-    print(f"Ответ: {create_response}")
+    by_name.update((result.name, result) for result in results)
+    return by_name
+
+
+@pytest.mark.parametrize("test_data", MONEY_EXPRESS_TEST_DATA)
+def test_money_express_payment_flow(test_data, money_express_batch_results):
+    """Параметризованный тест-кейс: Создание и подтверждение платежа через Money Express (из пакетного прогона)"""
     
-    # Используем общую проверку успешности
-    assert_success(create_response, f"{test_name} - Создание платежа Money Express")
-    print(f"✅ {test_name} - Создание платежа Money Express успешно!")
+    test_name = test_data["test_name"]
+    result = money_express_batch_results[test_name]
+    if result is None:
+        pytest.skip(f"Нет валидного session_key для user_id={test_data['user_id']}")
     
-    print("\nОжидание 2 секунд...")
-    time.sleep(2)
+    print(f"\n=== {test_name} ===")
+    print(f"Operation ID: {result.operation_id}")
+    print(f"Получатель: {test_data['recipient_name']}")
+    print(f"Номер карты: {test_data['account_credit_prop_value']}")
+    print(f"Сумма: {test_data['amount_debit']} KGS")
+    if result.error is not None:
+        raise result.error
     
+    # === ШАГ 1: СОЗДАНИЕ ПЛАТЕЖА MONEY EXPRESS ===
+    print(f"Ответ: {result.create_response}")
+    assert_success(result.create_response, f"{test_name} - Создание платежа Money Express")
+    print(f"✅ {test_name} - Создание платежа Money Express успешно! ({result.create_seconds:.2f} сек)")
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ПЛАТЕЖА MONEY EXPRESS ===
-    print(f"\n=== ШАГ 2: {test_name} - Подтверждение платежа Money Express ===")
+    print(f"Ответ: {result.confirm_response}")
+    assert_success(result.confirm_response, f"{test_name} - Подтверждение платежа Money Express")
+    print(f"✅ {test_name} - Подтверждение платежа Money Express успешно! ({result.confirm_seconds:.2f} сек)")
     
-    # Используем пользовательскую функцию подтверждения
-    confirm_response = confirm_operation_custom(operation_id)
-    print(f"Ответ: {confirm_response}")
-    
-    # Проверка успешности
-    assert_success(confirm_response, f"{test_name} - Подтверждение платежа Money Express")
-    print(f"✅ {test_name} - Подтверждение платежа Money Express успешно!")
-    
-    # === ШАГ 3: ПОЛУЧЕНИЕ PROCESSING_ID ИЗ БД ===
-    print(f"\n=== ШАГ 3: {test_name} - Получение processing_id из БД ===")
-    
-    processing_id = get_processing_id_by_operation_id(operation_id)
-    if processing_id:
-        # Добавляем в глобальную коллекцию
-        PROCESSING_IDS_COLLECTION.append({
-            "test_name": test_name,
-            "operation_id": operation_id,
-            "processing_id": processing_id,
-            "timestamp": datetime.now().isoformat()
-        })
-        print(f"✅ {test_name} - processing_id добавлен в коллекцию")
-    else:
-        print(f"⚠️ {test_name} - processing_id не найден")
+    # === ШАГ 3: РЕГИСТРАЦИЯ ОПЕРАЦИИ ДЛЯ ПАКЕТНОГО ПОЛУЧЕНИЯ PROCESSING_ID ===
+    PENDING_OPERATIONS.append({
+        "test_name": test_name,
+        "operation_id": result.operation_id,
+        "timestamp": datetime.now().isoformat()
+    })
+    print(f"✅ {test_name} - operation_id добавлен в очередь на получение processing_id")
     
     print(f"\n=== ✅ {test_name} - Тест пройден успешно ===")
 
 
-def pytest_sessionfinish(session, exitstatus):
-    """Вызывается после завершения всех тестов - сохраняет processing_id в файл"""
-    print(f"\n=== ФИНАЛЬНЫЙ ЭТАП: Сохранение processing_id ===")
-    save_processing_ids_to_file()
-
-
 if __name__ == "__main__":
     # Запуск тестов
     import pytest
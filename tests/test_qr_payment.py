@@ -1,6 +1,5 @@
 import uuid
-import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_QR_PAYMENT,
     ACCOUNT_ID_DEBIT, QR_ACCOUNT_CREDIT_PROP_VALUE, ACCOUNT_CREDIT_PROP_TYPE,
@@ -63,16 +62,13 @@ def test_qr_payment_flow():
     assert_success(create_response, "Создание QR платежа")
     print("✅ Создание QR платежа успешно!")
     
-    print("\nОжидание 5 секунд...")
-    time.sleep(5)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ QR ПЛАТЕЖА ===
     print("\n=== ШАГ 2: Подтверждение QR платежа ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение QR платежа")
@@ -1,6 +1,6 @@
 import uuid
 import time
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import make_grpc_request, create_metadata, confirm_when_ready, assert_success
 from data import (
     CODE_MAKE_TXN_SHOP_OPERATION,
     ACCOUNT_ID_DEBIT, STATEMENT_LANGUAGE, DELIVERY_TYPE, PHONE_NUMBER, BRANCH_CODE,
@@ -52,16 +52,13 @@ def test_statement_request_flow():
     assert_success(create_response, "Создание запроса на выписку")
     print("✅ Создание запроса на выписку успешно!")
     
-    print("\nОжидание 2 секунд...")
-    time.sleep(2)
-    
     
     # === ШАГ 2: ПОДТВЕРЖДЕНИЕ ЗАПРОСА НА ВЫПИСКУ ===
     print("\n=== ШАГ 2: Подтверждение запроса на выписку ===")
     
     print(f"Operation ID: {operation_id}")
     
-    confirm_response = confirm_operation(operation_id)
+    confirm_response = confirm_when_ready(operation_id)
     print(f"Ответ: {confirm_response}")
     
     assert_success(confirm_response, "Подтверждение запроса на выписку")
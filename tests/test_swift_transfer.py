@@ -1,9 +1,12 @@
 import uuid
-import time
 import pytest
-from conftest import make_grpc_request, create_metadata, confirm_operation, assert_success
+from conftest import create_metadata, assert_success, RANKED_SESSION_KEYS
+from batch_flows import create_all, confirm_all, selected_params
+import data as app_data
 from data import CODE_MAKE_SWIFT_TRANSFER, ACCOUNT_ID_DEBIT, OTP_CODE
-from database_collector import DatabaseConfig, DataCollector
+
+# Все кейсы модуля выполняются одной пакетной фикстурой — держим их в одной дорожке
+pytestmark = pytest.mark.lane("swift_batch")
 
 
 # === МАССИВ ТЕСТОВЫХ ДАННЫХ ДЛЯ SWIFT ПЕРЕВОДОВ ===
@@ -577,33 +580,10 @@ SWIFT_TEST_DATA = [
 ]
 
 
-def _get_session_key(user_id: int, offset: int = 0) -> str:
-    """Получает сессионный ключ из БД с возможностью указать смещение"""
-    config = DatabaseConfig()
-    collector = DataCollector(config)
-    session_key = collector.get_valid_session_key(user_id=user_id, offset=offset)
-    if not session_key:
-        pytest.skip(f"Нет валидного session_key для user_id={user_id} с offset={offset}")
-    print(f"[_get_session_key] Получен session_key из БД для user_id={user_id}, offset={offset}: {session_key[:20]}...")
-    return session_key
-
-
-def _get_session_key_with_retry(user_id: int, max_retries: int = 10) -> str:
-    """Получает сессионный ключ из БД с автоматическим retry при ошибке INVALID_SESSION_KEY"""
-    config = DatabaseConfig()
-    collector = DataCollector(config)
-    
-    for offset in range(max_retries):
-        session_key = collector.get_valid_session_key(user_id=user_id, offset=offset)
-        if not session_key:
-            if offset == 0:
-                pytest.skip(f"Нет валидного session_key для user_id={user_id}")
-            break  # Больше нет ключей
-        
-        print(f"[_get_session_key_with_retry] Пробуем session_key с offset={offset}: {session_key[:20]}...")
-        return session_key
-    
-    pytest.skip(f"Не удалось найти валидный session_key для user_id={user_id} после {max_retries} попыток")
+def _get_session_keys(user_id: int) -> list:
+    """Ранжированные ключи пользователя; ключи всех user_id из SWIFT_TEST_DATA грузятся одним запросом"""
+    RANKED_SESSION_KEYS.prefetch(test_data["user_id"] for test_data in SWIFT_TEST_DATA)
+    return RANKED_SESSION_KEYS.keys_for(user_id)
 
 
 def _build_metadata(session_key: str, device_type: str, user_agent: str):
@@ -616,36 +596,8 @@ def _build_metadata(session_key: str, device_type: str, user_agent: str):
     )
 
 
-def _confirm_operation(operation_id: str, metadata: tuple, otp: str = OTP_CODE):
-    """Подтверждение операции через OTP"""
-    confirm_payload = {
-        "operationId": operation_id,
-        "otp": otp,
-    }
-    response = make_grpc_request("CONFIRM_TRANSFER", confirm_payload, metadata)
-    assert_success(response, "Подтверждение SWIFT перевода")
-    return response
-
-
-@pytest.mark.parametrize("test_data", SWIFT_TEST_DATA)
-def test_swift_transfer_flow(test_data):
-    """Параметризованный тест-кейс: Создание и подтверждение SWIFT перевода"""
-    
-    test_name = test_data["test_name"]
-    user_id = test_data["user_id"]
-    
-    print(f"\n=== {test_name} ===")
-    print(f"Получаем session_key для user_id={user_id}")
-    
-    # Получаем первый ключ (offset=0)
-    session_key = _get_session_key(user_id=user_id, offset=0)
-    print(f"[test] Используем session_key с offset=0: {session_key[:20]}...")
-    
-    metadata = _build_metadata(session_key, test_data["device_type"], test_data["user_agent"])
-    print(f"[test] Метаданные созданы, sessionkey в metadata: {dict(metadata).get('sessionkey', 'NOT FOUND')[:20] if isinstance(metadata, (list, tuple)) else 'N/A'}...")
-    
-    operation_id = str(uuid.uuid1())
-    
+def _build_transfer_data(test_data: dict, operation_id: str) -> dict:
+    """Тело запроса MAKE_SWIFT_TRANSFER для кейса из SWIFT_TEST_DATA"""
     transfer_data = {
         "operationId": operation_id,
         "accountIdDebit": test_data["account_id_debit"],
@@ -692,74 +644,95 @@ def test_swift_transfer_flow(test_data):
     if test_data.get("correspondent_acc_no"):
         transfer_data["corAccNo"] = test_data["correspondent_acc_no"]
     
-    print(f"Operation ID: {operation_id}")
-    print(f"Валюта: {test_data['transfer_ccy']}")
-    print(f"Сумма: {test_data['amount_debit']} {test_data['transfer_ccy']}")
-    print(f"Получатель: {test_data['recipient_name']}")
-    print(f"Тип комиссии: {test_data['commission_type']}")
-    if test_data.get("branch_code"):
-        print(f"Код филиала: {test_data['branch_code']}")
-    if test_data.get("correspondent_bank"):
-        print(f"Корреспондентский банк: {test_data['correspondent_bank']}")
+    return transfer_data
+
+
+@pytest.fixture(scope="module")
+def swift_batch_results(request):
+    """
+    Один пакетный прогон на выбранные кейсы SWIFT_TEST_DATA: сначала все MAKE_SWIFT_TRANSFER,
+    затем все CONFIRM_TRANSFER с общим ожиданием готовности. Невыбранные кейсы не отправляются.
+    При INVALID_SESSION_KEY создание повторяется со следующим ключом пользователя (до 10 ключей).
     
-    # Пробуем запрос, при ошибке INVALID_SESSION_KEY пробуем следующий ключ
-    create_response = None
+    Returns:
+        dict: test_name -> FlowResult (None, если для пользователя нет session_key)
+    """
     max_retries = 10
-    current_key_offset = 0
+    cases, offsets = [], []
+    by_name = {}
+    
+    for test_data in selected_params(request):
+        session_keys = _get_session_keys(test_data["user_id"])
+        if not session_keys:
+            by_name[test_data["test_name"]] = None
+            continue
+        cases.append({
+            "name": test_data["test_name"],
+            "code": CODE_MAKE_SWIFT_TRANSFER,
+            "data": _build_transfer_data(test_data, str(uuid.uuid1())),
+            "metadata": _build_metadata(session_keys[0], test_data["device_type"], test_data["user_agent"]),
+            "otp": OTP_CODE,
+        })
+        offsets.append(0)
     
-    for retry_attempt in range(max_retries):
-        try:
-            create_response = make_grpc_request(CODE_MAKE_SWIFT_TRANSFER, transfer_data, metadata)
-            print(f"Ответ: {create_response}")
+    print(f"\n=== Пакетное создание SWIFT переводов: {len(cases)} кейсов ===")
+    results = create_all(cases)
     
-            # Проверяем, не ошибка ли INVALID_SESSION_KEY
-            if hasattr(create_response, 'error') and create_response.error and hasattr(create_response.error, 'code'):
-                if create_response.error.code == "INVALID_SESSION_KEY":
-                    if retry_attempt < max_retries - 1:
-                        print(f"[test] Получена ошибка INVALID_SESSION_KEY, пробуем следующий ключ (offset={current_key_offset + 1})...")
-                        # Получаем следующий ключ
-                        current_key_offset += 1
-                        session_key = _get_session_key(user_id=user_id, offset=current_key_offset)
-                        metadata = _build_metadata(session_key, test_data["device_type"], test_data["user_agent"])
-                        print(f"[test] Используем новый session_key: {session_key[:20]}...")
-                        continue
-                    else:
-                        # Последняя попытка, выбрасываем ошибку
-                        assert_success(create_response, f"{test_name} - Создание SWIFT перевода")
-            
-            # Если не INVALID_SESSION_KEY, проверяем успешность
-            assert_success(create_response, f"{test_name} - Создание SWIFT перевода")
-            break  # Успешно, выходим из цикла
-            
-        except AssertionError as e:
-            # Проверяем, не ошибка ли INVALID_SESSION_KEY в сообщении
-            error_msg = str(e)
-            if "INVALID_SESSION_KEY" in error_msg and retry_attempt < max_retries - 1:
-                print(f"[test] Получена ошибка INVALID_SESSION_KEY в assert, пробуем следующий ключ (offset={current_key_offset + 1})...")
-                # Получаем следующий ключ
-                current_key_offset += 1
-                session_key = _get_session_key(user_id=user_id, offset=current_key_offset)
-                metadata = _build_metadata(session_key, test_data["device_type"], test_data["user_agent"])
-                print(f"[test] Используем новый session_key: {session_key[:20]}...")
+    # Повтор создания со следующим ключом для кейсов с INVALID_SESSION_KEY
+    for _ in range(max_retries - 1):
+        retry = []
+        for index, (case, result) in enumerate(zip(cases, results)):
+            response = result.create_response
+            if result.error is not None or response is None or response.error.code != app_data.ERROR_INVALID_SESSION_KEY:
+                continue
+            test_data = next(item for item in SWIFT_TEST_DATA if item["test_name"] == case["name"])
+            session_keys = _get_session_keys(test_data["user_id"])
+            if offsets[index] + 1 >= min(len(session_keys), max_retries):
                 continue
-            else:
-                raise  # Другая ошибка или последняя попытка
+            offsets[index] += 1
+            print(f"[test] {case['name']}: INVALID_SESSION_KEY, пробуем следующий ключ (offset={offsets[index]})...")
+            case["metadata"] = _build_metadata(session_keys[offsets[index]], test_data["device_type"], test_data["user_agent"])
+            retry.append(index)
+        if not retry:
+            break
+        create_all([cases[index] for index in retry], results=[results[index] for index in retry])
     
-    print(f"✅ {test_name} - Создание SWIFT перевода успешно!")
+    print(f"=== Пакетное подтверждение SWIFT переводов ===")
+    confirm_all(cases, results)
     
-    print("\nОжидание 5 секунд...")
-    time.sleep(5)
+    by_name.update((result.name, result) for result in results)
+    return by_name
+
+
+@pytest.mark.parametrize("test_data", SWIFT_TEST_DATA)
+def test_swift_transfer_flow(test_data, swift_batch_results):
+    """Параметризованный тест-кейс: Создание и подтверждение SWIFT перевода (из пакетного прогона)"""
+    
+    test_name = test_data["test_name"]
+    result = swift_batch_results[test_name]
+    if result is None:
+        pytest.skip(f"Нет валидного session_key для user_id={test_data['user_id']}")
+    
+    print(f"\n=== {test_name} ===")
+    print(f"Operation ID: {result.operation_id}")
+    print(f"Валюта: {test_data['transfer_ccy']}")
+    print(f"Сумма: {test_data['amount_debit']} {test_data['transfer_ccy']}")
+    print(f"Получатель: {test_data['recipient_name']}")
+    print(f"Тип комиссии: {test_data['commission_type']}")
+    if result.error is not None:
+        raise result.error
     
-    print(f"\n=== {test_name} - Подтверждение SWIFT перевода ===")
-    confirm_response = _confirm_operation(operation_id, metadata)
-    print(f"Ответ: {confirm_response}")
+    print(f"Ответ: {result.create_response}")
+    assert_success(result.create_response, f"{test_name} - Создание SWIFT перевода")
+    print(f"✅ {test_name} - Создание SWIFT перевода успешно! ({result.create_seconds:.2f} сек)")
     
-    assert_success(confirm_response, f"{test_name} - Подтверждение SWIFT перевода")
-    print(f"✅ {test_name} - Подтверждение SWIFT перевода успешно!")
+    print(f"Ответ: {result.confirm_response}")
+    assert_success(result.confirm_response, f"{test_name} - Подтверждение SWIFT перевода")
+    print(f"✅ {test_name} - Подтверждение SWIFT перевода успешно! ({result.confirm_seconds:.2f} сек)")
     
     print(f"\n=== ✅ {test_name} - Тест пройден успешно ===")
 
 
 if __name__ == "__main__":
     import pytest
-    pytest.main([__file__, "-v"])
\ No newline at end of file
+    pytest.main([__file__, "-v"])
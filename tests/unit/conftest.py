@@ -0,0 +1,8 @@
+"""
+Unit-тесты без стенда: модули нагрузочного теста импортируются напрямую
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             'load_testing_cbs_interactor'))
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from baseline import compare, ks_slower
+from grpc_metrics import LatencyHistogram
+
+pytestmark = pytest.mark.unit
+
+
+def _histogram(median_ms, count=2000, seed=1):
+    rng = random.Random(seed)
+    histogram = LatencyHistogram()
+    for _ in range(count):
+        histogram.record(rng.lognormvariate(0, 0.3) * median_ms)
+    return histogram
+
+
+def _report(median_ms, throughput_rps=100.0, errors=0, seed=1):
+    """Минимальный отчет в форме LoadReport.to_dict(): одна фаза и один код операции"""
+    histogram = _histogram(median_ms, seed=seed)
+    outcomes = {"success": histogram.count - errors, "error": errors}
+    return {
+        "outcomes": outcomes,
+        "throughput_rps": throughput_rps,
+        "latency": {"end_to_end": histogram.summary((50, 99))},
+        "histograms": {"end_to_end": histogram.to_dict()},
+        "codes": {
+            "MAKE_SWIFT_TRANSFER": {
+                "outcomes": outcomes,
+                "end_to_end": histogram.summary((50, 99)),
+                "histograms": {"end_to_end": histogram.to_dict()},
+            },
+        },
+    }
+
+
+def test_ks_slower_detects_shift_only_towards_slower():
+    """Тест-кейс: KS односторонний — замедление значимо, ускорение и то же распределение нет"""
+    baseline = _histogram(20, seed=1)
+
+    d, p_value = ks_slower(baseline, _histogram(20, seed=2))
+    assert d < 0.05 and p_value > 0.01
+
+    d, p_value = ks_slower(baseline, _histogram(30, seed=2))
+    assert d > 0.3 and p_value < 1e-6
+
+    assert ks_slower(baseline, _histogram(10, seed=2)) == (0.0, 1.0)
+    assert ks_slower(LatencyHistogram(), baseline) == (0.0, 1.0)
+
+
+def test_compare_passes_for_equivalent_run():
+    """Тест-кейс: прогон с тем же распределением и пропускной способностью — без регрессии"""
+    checks = compare(_report(20, seed=2), _report(20, seed=1))
+    assert checks and all(check.passed for check in checks), [check.format() for check in checks if not check.passed]
+
+
+def test_compare_flags_latency_throughput_and_errors():
+    """Тест-кейс: рост задержек, падение пропускной способности и рост ошибок — регрессия"""
+    current = _report(30, throughput_rps=80.0, errors=100, seed=2)
+    failed = {check.metric for check in compare(current, _report(20, seed=1)) if not check.passed}
+
+    assert {"end_to_end p50 ms", "end_to_end p99 ms", "throughput rps", "error rate",
+            "MAKE_SWIFT_TRANSFER e2e p50 ms", "MAKE_SWIFT_TRANSFER error rate"} <= failed
+    assert any(metric.startswith("end_to_end KS D") for metric in failed)
+
+
+def test_compare_respects_min_latency_delta():
+    """Тест-кейс: рост p50 меньше min_latency_delta_ms не считается регрессией даже при большом проценте"""
+    tolerances = {"latency_pct": {"p50": 10}, "min_latency_delta_ms": 5, "ks_min_d": 1.1}
+    checks = compare(_report(2.0, seed=2), _report(1.0, seed=1), tolerances)
+    assert all(check.passed for check in checks if "p50" in check.metric)
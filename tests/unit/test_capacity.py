@@ -0,0 +1,63 @@
+import pytest
+
+from capacity import ProbeResult, Slo, evaluate, format_curve, search_capacity
+from grpc_metrics import LatencyHistogram
+
+pytestmark = pytest.mark.unit
+
+
+def _probe_with_limit(limit_rps):
+    """Синтетический стенд: SLO выдерживается до limit_rps включительно"""
+    def probe(rps):
+        passed = rps <= limit_rps
+        return ProbeResult(target_rps=round(rps, 2), sent_rps=round(rps, 2), count=100, error_rate=0.0,
+                           p50_ms=10.0, p99_ms=50.0 if passed else 5000.0, passed=passed,
+                           reasons=[] if passed else ["p99 5000 > 1000 ms"])
+    return probe
+
+
+def test_exponential_then_binary_search():
+    """Тест-кейс: рост x2 до первого провала, затем бинарный поиск до resolution_rps"""
+    knee, probes = search_capacity(_probe_with_limit(137), start_rps=10, max_rps=2000, growth=2.0, resolution_rps=5)
+
+    assert [probe.target_rps for probe in probes[:6]] == [10, 20, 40, 80, 160, 120]
+    assert 137 - 5 <= knee <= 137
+    assert all(probe.passed == (probe.target_rps <= 137) for probe in probes)
+
+
+def test_capacity_is_capped_by_max_rps():
+    """Тест-кейс: если SLO держится на max_rps, колено — max_rps"""
+    knee, probes = search_capacity(_probe_with_limit(10 ** 6), start_rps=10, max_rps=100, growth=3.0)
+    assert knee == 100
+    assert [probe.target_rps for probe in probes] == [10, 30, 90, 100]
+
+
+def test_no_capacity_when_start_rate_fails():
+    """Тест-кейс: провал уже на start_rps — колена нет, поиск идет вниз от start_rps"""
+    knee, probes = search_capacity(_probe_with_limit(0), start_rps=10, max_rps=100, resolution_rps=2)
+    assert knee is None
+    assert not any(probe.passed for probe in probes)
+    assert probes[-1].target_rps <= 2
+
+
+def test_growth_must_exceed_one():
+    """Тест-кейс: growth <= 1 не дает поиску расти"""
+    with pytest.raises(ValueError):
+        search_capacity(_probe_with_limit(10), start_rps=1, max_rps=10, growth=1.0)
+
+
+def test_evaluate_and_format_curve():
+    """Тест-кейс: evaluate проверяет p99 и долю ошибок, format_curve отмечает колено"""
+    fast, slow = LatencyHistogram(), LatencyHistogram()
+    for _ in range(100):
+        fast.record(20.0)
+        slow.record(2000.0)
+    slo = Slo(p99_ms=1000, max_error_rate=0.01)
+    passing = evaluate(13.125, {"outcomes": {"success": 100}, "end_to_end": fast, "released": 300, "duration_s": 30}, slo)
+    failing = evaluate(30, {"outcomes": {"success": 90, "error": 10}, "end_to_end": slow, "released": 900,
+                            "duration_s": 30}, slo)
+
+    assert passing.passed and passing.sent_rps == 10.0
+    assert not failing.passed and len(failing.reasons) == 2
+    lines = format_curve([failing, passing], knee=13.125).splitlines()
+    assert "<-- knee" in lines[2] and "FAIL" in lines[3]
@@ -0,0 +1,32 @@
+import json
+import uuid
+
+import pytest
+
+from conftest import webTransferApi_pb2
+from fast_payload import PayloadTemplate, OPERATION_ID_SLOT, REQUEST_ID_SLOT
+
+pytestmark = pytest.mark.unit
+
+
+def test_payload_template_matches_protobuf_path_for_cyrillic():
+    """Тест-кейс: заранее сериализованный запрос побайтно совпадает с IncomingWebTransfer + json.dumps"""
+    payload = {
+        "operationId": None,
+        "childName": "Айбек Асанов",
+        "paymentPurpose": "Оплата «депозита» №1",
+        "data": {"requestId": None, "amount": "10000"},
+    }
+    operation_id = str(uuid.uuid4())
+    request_id = "IB1700000000000_0_1"
+
+    template_payload = json.loads(json.dumps(payload))
+    template_payload["operationId"] = PayloadTemplate.slot(OPERATION_ID_SLOT)
+    template_payload["data"]["requestId"] = PayloadTemplate.slot(REQUEST_ID_SLOT)
+    template = PayloadTemplate("MAKE_DEPOSIT", template_payload)
+
+    payload["operationId"] = operation_id
+    payload["data"]["requestId"] = request_id
+    expected = webTransferApi_pb2.IncomingWebTransfer(code="MAKE_DEPOSIT", data=json.dumps(payload)).SerializeToString()
+
+    assert template.render(operation_id, request_id) == expected
@@ -0,0 +1,58 @@
+import json
+import uuid
+
+import pytest
+
+from conftest import webTransferApi_pb2
+from grpc_cassette import Cassette, CassetteMissError, MODE_RECORD, MODE_REPLAY, normalize
+
+pytestmark = pytest.mark.unit
+
+
+def test_normalize_replaces_generated_ids_consistently():
+    """Тест-кейс: одинаковые operationId получают один плейсхолдер, остальные поля не меняются"""
+    operation_id, request_id = str(uuid.uuid4()), "IB1700000000000_0_1"
+    data = {
+        "operationId": operation_id,
+        "amount": "100",
+        "data": {"requestId": request_id, "operationId": operation_id},
+        "items": [{"operationId": "other"}],
+    }
+
+    normalized, substitutions = normalize(data)
+
+    assert normalized == {
+        "operationId": "<operationId:0>",
+        "amount": "100",
+        "data": {"requestId": "<requestId:1>", "operationId": "<operationId:0>"},
+        "items": [{"operationId": "<operationId:2>"}],
+    }
+    assert substitutions == {"<operationId:0>": operation_id, "<requestId:1>": request_id,
+                             "<operationId:2>": "other"}
+
+
+def test_record_then_replay_with_new_ids(tmp_path):
+    """Тест-кейс: ответ, записанный для одного operationId, воспроизводится для нового"""
+    path = str(tmp_path / "cassette.jsonl")
+    recorded_id, replayed_id = str(uuid.uuid4()), str(uuid.uuid4())
+
+    cassette = Cassette(path, MODE_RECORD)
+    response = webTransferApi_pb2.OutgoingWebTransfer(success=True, data=json.dumps({"operationId": recorded_id}))
+    cassette.record("WebTransferApi", "MAKE_SWIFT_TRANSFER", {"operationId": recorded_id, "amount": "1"}, response)
+    failed = webTransferApi_pb2.OutgoingWebTransfer(success=False)
+    failed.error.code = "INVALID_OTP"
+    failed.error.data = f"OTP for {recorded_id} is invalid"
+    cassette.record("WebTransferApi", "CONFIRM_TRANSFER", {"operationId": recorded_id, "otp": "1"}, failed)
+    cassette.close()
+
+    cassette = Cassette(path, MODE_REPLAY)
+    replayed = cassette.replay("WebTransferApi", "MAKE_SWIFT_TRANSFER", {"operationId": replayed_id, "amount": "1"},
+                               webTransferApi_pb2.OutgoingWebTransfer)
+    assert replayed.success and json.loads(replayed.data) == {"operationId": replayed_id}
+    replayed = cassette.replay("WebTransferApi", "CONFIRM_TRANSFER", {"operationId": replayed_id, "otp": "1"},
+                               webTransferApi_pb2.OutgoingWebTransfer)
+    assert replayed.error.code == "INVALID_OTP" and replayed.error.data == f"OTP for {replayed_id} is invalid"
+
+    with pytest.raises(CassetteMissError):
+        cassette.replay("WebTransferApi", "MAKE_SWIFT_TRANSFER", {"operationId": replayed_id, "amount": "1"},
+                        webTransferApi_pb2.OutgoingWebTransfer)
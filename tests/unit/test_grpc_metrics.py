@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from grpc_metrics import LatencyHistogram, LatencyRecorder
+
+pytestmark = pytest.mark.unit
+
+
+def _exact_percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, int(-(-len(ordered) * percent // 100)) - 1)]
+
+
+def test_percentiles_within_one_percent():
+    """Тест-кейс: перцентили гистограммы отличаются от точных не больше чем на 1%"""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    for percent in (50, 90, 99, 99.9):
+        assert histogram.percentile(percent) == pytest.approx(_exact_percentile(values, percent), rel=0.01)
+    assert histogram.percentile(100) == pytest.approx(max(values), abs=0.001)
+    assert histogram.min == pytest.approx(min(values), abs=0.001)
+    assert histogram.count == len(values)
+
+
+def test_empty_histogram():
+    """Тест-кейс: пустая гистограмма отдает нули"""
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.summary() == {"count": 0, "min_ms": 0.0, "mean_ms": 0.0,
+                                   "p50_ms": 0.0, "p90_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+
+def test_merge_equals_recording_everything():
+    """Тест-кейс: слияние гистограмм равно одной гистограмме по всем значениям, в том числе через to_dict"""
+    rng = random.Random(11)
+    first, second, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for index in range(5000):
+        value = rng.uniform(0.05, 2000)
+        (first if index % 3 else second).record(value)
+        combined.record(value)
+
+    merged = LatencyHistogram.from_dict(first.to_dict())
+    merged.merge(LatencyHistogram.from_dict(second.to_dict()))
+
+    assert merged.to_dict() == combined.to_dict()
+    assert merged.summary() == combined.summary()
+
+
+def test_recorder_merges_worker_data():
+    """Тест-кейс: LatencyRecorder сливает данные воркера по ключу (service, code, status)"""
+    controller, worker = LatencyRecorder(), LatencyRecorder()
+    controller.record("WebTransferApi", "MAKE_SWIFT_TRANSFER", "OK", 10.0)
+    worker.record("WebTransferApi", "MAKE_SWIFT_TRANSFER", "OK", 30.0)
+    worker.record("WebTransferApi", "CONFIRM_TRANSFER", "UNAVAILABLE", 5.0)
+
+    controller.merge_dict(worker.to_dict())
+
+    rows = {(row["code"], row["status"]): row for row in controller.rows()}
+    assert len(controller) == 3
+    assert rows[("MAKE_SWIFT_TRANSFER", "OK")]["count"] == 2
+    assert rows[("MAKE_SWIFT_TRANSFER", "OK")]["max_ms"] == 30.0
+    assert rows[("CONFIRM_TRANSFER", "UNAVAILABLE")]["count"] == 1
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import grpc
+import pytest
+
+from grpc_policy import CallPolicy, RetryBudget
+
+pytestmark = pytest.mark.unit
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, status):
+        self._status = status
+
+    def code(self):
+        return self._status
+
+
+class FlakyMethod:
+    """Unary-метод стаба: первые failures вызовов падают с UNAVAILABLE"""
+
+    def __init__(self, failures, status=grpc.StatusCode.UNAVAILABLE):
+        self.failures = failures
+        self.status = status
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request, metadata=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            failed = self.calls <= self.failures
+        if failed:
+            raise FakeRpcError(self.status)
+        return "ok"
+
+
+def _request(code):
+    return SimpleNamespace(code=code)
+
+
+def test_idempotent_code_is_retried():
+    """Тест-кейс: идемпотентный код повторяется при UNAVAILABLE до успеха"""
+    policy = CallPolicy(idempotent_codes=["GET_STATEMENT"], max_attempts=3, backoff_initial=0)
+    method = FlakyMethod(failures=2)
+    assert policy.invoke(method, _request("GET_STATEMENT"), ()) == "ok"
+    assert method.calls == 3
+
+
+def test_non_idempotent_and_non_retryable_are_not_retried():
+    """Тест-кейс: MAKE_* и статусы кроме UNAVAILABLE/DEADLINE_EXCEEDED не повторяются"""
+    policy = CallPolicy(idempotent_codes=["GET_STATEMENT"], max_attempts=3, backoff_initial=0)
+    method = FlakyMethod(failures=1)
+    with pytest.raises(grpc.RpcError):
+        policy.invoke(method, _request("MAKE_SWIFT_TRANSFER"), ())
+    assert method.calls == 1
+
+    method = FlakyMethod(failures=1, status=grpc.StatusCode.INVALID_ARGUMENT)
+    with pytest.raises(grpc.RpcError):
+        policy.invoke(method, _request("GET_STATEMENT"), ())
+    assert method.calls == 1
+
+
+def test_retry_budget_is_shared_between_calls():
+    """Тест-кейс: общий бюджет повторов исчерпывается и дальше вызовы не повторяются"""
+    budget = RetryBudget(2)
+    policy = CallPolicy(idempotent_codes=["GET_STATEMENT"], max_attempts=5, backoff_initial=0, retry_budget=budget)
+
+    assert policy.invoke(FlakyMethod(failures=2), _request("GET_STATEMENT"), ()) == "ok"
+    assert budget.used == 2
+    method = FlakyMethod(failures=1)
+    with pytest.raises(grpc.RpcError):
+        policy.invoke(method, _request("GET_STATEMENT"), ())
+    assert method.calls == 1
+
+
+def test_async_retry_uses_the_same_policy():
+    """Тест-кейс: invoke_async повторяет идемпотентный код так же, как invoke"""
+    policy = CallPolicy(idempotent_codes=["GET_STATEMENT"], max_attempts=3, backoff_initial=0)
+    method = FlakyMethod(failures=2)
+
+    async def call(request, metadata=None, timeout=None):
+        return method(request, metadata=metadata, timeout=timeout)
+
+    assert asyncio.run(policy.invoke_async(call, _request("GET_STATEMENT"), ())) == "ok"
+    assert method.calls == 3
+
+
+def test_hedged_call_returns_first_response():
+    """Тест-кейс: медленный первый запрос — хедж через hedge_delay отвечает раньше"""
+    delays = [0.3, 0.0]
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    def call(request, metadata=None, timeout=None):
+        delay = delays.pop(0)
+        time.sleep(delay)
+        return f"answered after {delay}"
+
+    method = SimpleNamespace(future=lambda request, metadata=None, timeout=None:
+                             executor.submit(call, request, metadata, timeout))
+    budget = RetryBudget(1)
+    policy = CallPolicy(hedged_codes=["GET_BALANCE"], hedge_delay=0.02, retry_budget=budget)
+
+    started = time.monotonic()
+    assert policy.invoke(method, _request("GET_BALANCE"), ()) == "answered after 0.0"
+    assert time.monotonic() - started < 0.2
+    assert budget.used == 1
+    executor.shutdown(wait=True)
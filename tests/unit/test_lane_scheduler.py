@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import data as app_data
+from lane_scheduler import item_resources, plan_lanes
+
+pytestmark = pytest.mark.unit
+
+DEFAULT_USER = f"user:{app_data.SESSION_KEY_USER_IDS[0]}"
+DEFAULT_ACCOUNT = f"account:{app_data.ACCOUNT_ID_DEBIT}"
+
+
+class FakeItem:
+    """Минимальный pytest.Item: nodeid, параметры и маркеры"""
+
+    def __init__(self, nodeid, params=None, markers=None):
+        self.nodeid = nodeid
+        if params is not None:
+            self.callspec = SimpleNamespace(params=params)
+        self._markers = [getattr(pytest.mark, name)(*args).mark for name, args in (markers or [])]
+
+    def get_closest_marker(self, name):
+        return next((marker for marker in self._markers if marker.name == name), None)
+
+    def iter_markers(self, name):
+        return (marker for marker in self._markers if marker.name == name)
+
+
+def test_resources_from_test_data_params():
+    """Тест-кейс: счет и пользователь берутся из словаря test_data"""
+    item = FakeItem("t::a[0]", {"test_data": {"account_id_debit": 17575, "user_id": 3360}})
+    assert item_resources(item) == ["account:17575", "user:3360"]
+
+
+def test_shared_session_gets_default_user_and_account():
+    """Тест-кейс: без user_id и счета в параметрах — общий session_key и ACCOUNT_ID_DEBIT"""
+    assert item_resources(FakeItem("t::b")) == [DEFAULT_ACCOUNT, DEFAULT_USER]
+
+
+def test_debit_accounts_marker_overrides_params():
+    """Тест-кейс: маркер debit_accounts задает счета явно, пустой — без счетов"""
+    item = FakeItem("t::c[0]", {"account_id_debit": 1}, [("debit_accounts", (425,))])
+    assert item_resources(item) == ["account:425", DEFAULT_USER]
+    assert item_resources(FakeItem("t::d", markers=[("debit_accounts", ())])) == [DEFAULT_USER]
+
+
+def test_unit_tests_have_no_resources():
+    """Тест-кейс: unit-тесты не занимают ни счетов, ни пользователей"""
+    assert item_resources(FakeItem("t::e", markers=[("unit", ())])) == []
+
+
+def test_plan_lanes_groups_tests_by_shared_resources():
+    """Тест-кейс: тесты с общим ресурсом — в одной дорожке, независимые — в разных"""
+    first = FakeItem("t::a", {"test_data": {"account_id_debit": 1, "user_id": 10}})
+    second = FakeItem("t::b", {"test_data": {"account_id_debit": 2, "user_id": 10}})
+    third = FakeItem("t::c", {"test_data": {"account_id_debit": 3, "user_id": 30}})
+    fourth = FakeItem("t::d", {"test_data": {"account_id_debit": 4, "user_id": 40}}, [("lane", ("batch",))])
+    fifth = FakeItem("t::e", {"test_data": {"account_id_debit": 5, "user_id": 50}}, [("lane", ("batch",))])
+    unit = FakeItem("t::f", markers=[("unit", ())])
+
+    lanes = plan_lanes([first, second, third, fourth, fifth, unit])
+
+    assert [[item.nodeid for item in items] for items in lanes.values()] == [
+        ["t::a", "t::b"], ["t::c"], ["t::d", "t::e"], ["t::f"],
+    ]
+    assert list(lanes) == ["lane0", "lane1", "lane2", "lane3"]
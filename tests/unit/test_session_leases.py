@@ -0,0 +1,86 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from session_leases import SessionLeaseManager, EMPTY_LEASE_GRACE
+
+pytestmark = pytest.mark.unit
+
+DEAD_PID = 2 ** 22 + 1  # Больше предельного pid_max в Linux: такого процесса нет
+
+
+def _write_lease(manager, session_key, **fields):
+    lease = {"worker": "gw9", "pid": os.getpid(), "host": manager.host, "expires_at": time.time() + 60}
+    lease.update(fields)
+    with open(manager._path(session_key), "w", encoding="utf-8") as f:
+        json.dump(lease, f)
+
+
+def _take_over(lease_dir, barrier, results):
+    manager = SessionLeaseManager(lease_dir, ttl=60, worker_id=f"gw{os.getpid()}")
+    barrier.wait()
+    results.put(manager.try_acquire("shared_key"))
+    time.sleep(0.5)  # Держим pid живым, пока остальные пробуют перехват
+
+
+def test_acquire_is_exclusive_and_renewable(tmp_path):
+    """Тест-кейс: ключ арендует один процесс, владелец продлевает аренду, после release ключ свободен"""
+    owner = SessionLeaseManager(str(tmp_path), ttl=60, worker_id="gw0")
+    assert owner.try_acquire("key_1")
+    assert owner.try_acquire("key_1")
+
+    _write_lease(owner, "key_2", pid=os.getppid())
+    assert not owner.try_acquire("key_2")
+    assert owner.acquire_first(["key_2", "key_1"]) == "key_1"
+
+    owner.release_all()
+    assert owner.held == set()
+    assert not os.path.exists(owner._path("key_1"))
+    assert os.path.exists(owner._path("key_2"))  # Чужая аренда не снимается
+
+
+@pytest.mark.parametrize("fields", [{"pid": DEAD_PID}, {"pid": os.getppid(), "expires_at": 0}],
+                         ids=["dead_pid", "expired"])
+def test_stale_lease_is_taken_over(tmp_path, fields):
+    """Тест-кейс: аренда упавшего процесса или с истекшим TTL перехватывается"""
+    manager = SessionLeaseManager(str(tmp_path), ttl=60, worker_id="gw0")
+    _write_lease(manager, "key", **fields)
+    assert manager.try_acquire("key")
+    with open(manager._path("key"), "r", encoding="utf-8") as f:
+        assert json.load(f)["worker"] == "gw0"
+
+
+def test_empty_lease_is_stale_only_after_grace(tmp_path):
+    """Тест-кейс: пустой файл, который, возможно, еще пишется, не перехватывается"""
+    manager = SessionLeaseManager(str(tmp_path), ttl=60, worker_id="gw0")
+    path = manager._path("key")
+    open(path, "w").close()
+    assert not manager.try_acquire("key")
+
+    old = time.time() - EMPTY_LEASE_GRACE - 1
+    os.utime(path, (old, old))
+    assert manager.try_acquire("key")
+
+
+def test_concurrent_takeover_has_single_winner(tmp_path):
+    """Тест-кейс: несколько процессов одновременно перехватывают брошенную аренду — ключ получает один"""
+    manager = SessionLeaseManager(str(tmp_path), ttl=60)
+    _write_lease(manager, "shared_key", pid=DEAD_PID)
+
+    processes_count = 6
+    barrier = multiprocessing.Barrier(processes_count)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_take_over, args=(str(tmp_path), barrier, results))
+        for _ in range(processes_count)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=10) for _ in processes]
+    for process in processes:
+        process.join()
+
+    assert outcomes.count(True) == 1